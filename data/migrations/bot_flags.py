@@ -0,0 +1,11 @@
+"""
+GIN index on bots.flags so bots can be listed by flag (``flags @> ARRAY[flag]``)
+without a full table scan
+
+Safe to apply more than once
+"""
+
+
+async def apply(postgres, redis, logger):
+    logger.info("Creating bots_flags_idx")
+    await postgres.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS bots_flags_idx ON bots USING gin (flags)")
@@ -0,0 +1,21 @@
+"""
+Indexes for the Lynx bot actions console: the queue/review query (by state)
+and the typeahead search (/bot-actions/search) by id prefix and username prefix.
+The search indexes use the C collation so they serve both the prefix LIKE and
+the ORDER BY of the keyset pagination
+
+Safe to apply more than once
+"""
+
+# CONCURRENTLY can't run in a transaction so these are one statement each
+INDEXES = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS bots_state_created_idx ON bots (state, created_at)",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS bots_id_sort_idx ON bots ((bot_id::text COLLATE "C"))""",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS bots_username_sort_idx ON bots ((lower(coalesce(username_cached, '')) COLLATE "C"), bot_id)""",
+)
+
+
+async def apply(postgres, redis, logger):
+    for index in INDEXES:
+        logger.info(index)
+        await postgres.execute(index)
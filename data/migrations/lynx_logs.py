@@ -0,0 +1,74 @@
+"""
+Indexes lynx_logs for the paginated request log viewer (/requests) and adds
+lynx_logs_daily (requests and errors per user per day) kept up to date by a
+statement level trigger, so each batch written by the audit log writer updates
+it in one statement
+
+Safe to apply more than once
+"""
+
+SCHEMA = """
+ALTER TABLE lynx_logs ADD COLUMN IF NOT EXISTS id bigserial;
+UPDATE lynx_logs SET request_time = to_timestamp(0) WHERE request_time IS NULL;
+ALTER TABLE lynx_logs ALTER COLUMN request_time SET NOT NULL;
+
+CREATE TABLE IF NOT EXISTS lynx_logs_daily (
+    day date not null,
+    user_id bigint not null,
+    requests bigint not null default 0,
+    errors bigint not null default 0,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE OR REPLACE FUNCTION lynx_logs_daily_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO lynx_logs_daily (day, user_id, requests, errors)
+    SELECT (request_time AT TIME ZONE 'UTC')::date, user_id, COUNT(*), COUNT(*) FILTER (WHERE status_code >= 400)
+    FROM new_rows
+    GROUP BY 1, 2
+    ON CONFLICT (day, user_id) DO UPDATE SET
+        requests = lynx_logs_daily.requests + EXCLUDED.requests,
+        errors = lynx_logs_daily.errors + EXCLUDED.errors;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Inserts wait on the lock so none are missed (or counted twice) by the backfill
+TRIGGER = """
+LOCK TABLE lynx_logs IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS lynx_logs_daily_update ON lynx_logs;
+CREATE TRIGGER lynx_logs_daily_update AFTER INSERT ON lynx_logs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION lynx_logs_daily_update();
+
+DELETE FROM lynx_logs_daily;
+INSERT INTO lynx_logs_daily (day, user_id, requests, errors)
+SELECT (request_time AT TIME ZONE 'UTC')::date, user_id, COUNT(*), COUNT(*) FILTER (WHERE status_code >= 400)
+FROM lynx_logs
+GROUP BY 1, 2;
+"""
+
+# CONCURRENTLY can't run in a transaction so these are one statement each
+INDEXES = (
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS lynx_logs_id_idx ON lynx_logs (id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS lynx_logs_time_idx ON lynx_logs (request_time DESC, id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS lynx_logs_user_time_idx ON lynx_logs (user_id, request_time DESC, id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS lynx_logs_errors_idx ON lynx_logs (request_time DESC, id DESC) WHERE status_code >= 400",
+)
+
+
+async def apply(postgres, redis, logger):
+    async with postgres.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(SCHEMA)
+        logger.info("Added lynx_logs.id and lynx_logs_daily")
+
+        async with conn.transaction():
+            await conn.execute(TRIGGER)
+        logger.info("Backfilled lynx_logs_daily")
+
+        for index in INDEXES:
+            logger.info(index)
+            await conn.execute(index)
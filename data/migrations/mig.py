@@ -1,17 +1,25 @@
-from modules.models import enums
+from modules.models.enum_lookup import member
 import json
 import time
+from collections import defaultdict
 
-async def apply(postgres, redis, logger):
-    verifiers = await postgres.fetch("SELECT bot_id, verifier, state FROM bots")
-    for verifier in verifiers:
-        if not verifier["verifier"]:
-            continue
-        user = verifier["verifier"]
-        state = enums.BotState(verifier["state"])
-        check = await postgres.fetchval("SELECT bot_logs[$1] FROM users WHERE user_id = $2", str(state.value), user)
-        if not check:
-            print(f"{user} does not have a bot log for {state} yet. Creating one...")
-            await postgres.execute("UPDATE users SET bot_logs = bot_logs || $1 WHERE user_id = $2", json.dumps({str(state.value): [{"id": str(verifier["bot_id"]), "ts": time.time()}]}), user)
-        else:
-            await postgres.execute("UPDATE users SET bot_logs[$1] = bot_logs[$1] || $2 WHERE user_id = $3", str(state.value), json.dumps([{"id": str(verifier["bot_id"]), "ts": time.time()}]), user)
+async def apply(postgres, redis, logger, migrator):
+    async def _handle(conn, bots):
+        # One update per user and state, appending all of their bots at once
+        logs = defaultdict(list)
+        for bot in bots:
+            state = member("BotState", bot["state"])
+            logs[(bot["verifier"], str(state.value))].append({"id": str(bot["bot_id"]), "ts": time.time()})
+
+        await conn.executemany(
+            "UPDATE users SET bot_logs = bot_logs || jsonb_build_object($1::text, COALESCE(bot_logs->$1, '[]'::jsonb) || $2::jsonb) WHERE user_id = $3",
+            [(state, json.dumps(entries), user) for (user, state), entries in logs.items()]
+        )
+
+    await migrator.run(
+        "SELECT bot_id, verifier, state FROM bots WHERE verifier IS NOT NULL AND verifier <> 0 AND bot_id > $1::bigint ORDER BY bot_id",
+        key="bot_id",
+        start="0",
+        handle=_handle,
+        count="SELECT COUNT(*) FROM bots WHERE verifier IS NOT NULL AND verifier <> 0",
+    )
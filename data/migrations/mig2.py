@@ -2,19 +2,35 @@ from modules.models import enums
 import orjson
 import datetime
 
-async def apply(postgres, redis, logger):
-    users = await postgres.fetch("SELECT user_id, bot_logs FROM users")
-    for user in users:
-        logs = orjson.loads(user["bot_logs"])
-        for state, val in logs.items():
-            if int(state) == enums.BotState.approved.value: action = enums.UserBotAction.approve
-            elif int(state) == enums.BotState.denied.value: action = enums.UserBotAction.deny
-            elif int(state) == enums.BotState.under_review.value: action = enums.UserBotAction.claim 
-            elif int(state) == enums.BotState.certified.value: action = enums.UserBotAction.certify
-            else: action = None
+actions = {
+    enums.BotState.approved.value: enums.UserBotAction.approve,
+    enums.BotState.denied.value: enums.UserBotAction.deny,
+    enums.BotState.under_review.value: enums.UserBotAction.claim,
+    enums.BotState.certified.value: enums.UserBotAction.certify,
+}
 
-            if not action:
-                print("continue")
-                continue
-            for bot in val:
-                await postgres.execute("INSERT INTO user_bot_logs (user_id, bot_id, action_time, action) VALUES ($1, $2, $3, $4)", int(user["user_id"]), int(bot["id"]), datetime.datetime.fromtimestamp(bot["ts"]), action)
+async def apply(postgres, redis, logger, migrator):
+    async def _handle(conn, users):
+        records = []
+        for user in users:
+            logs = orjson.loads(user["bot_logs"])
+            for state, val in logs.items():
+                action = actions.get(int(state))
+                if not action:
+                    continue
+                for bot in val:
+                    records.append((int(user["user_id"]), int(bot["id"]), datetime.datetime.fromtimestamp(bot["ts"]), action.value))
+
+        await conn.copy_records_to_table(
+            "user_bot_logs",
+            records=records,
+            columns=["user_id", "bot_id", "action_time", "action"],
+        )
+
+    await migrator.run(
+        "SELECT user_id, bot_logs FROM users WHERE user_id > $1::bigint ORDER BY user_id",
+        key="user_id",
+        start="0",
+        handle=_handle,
+        count="SELECT COUNT(*) FROM users",
+    )
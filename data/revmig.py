@@ -1,9 +1,14 @@
-import asyncpg
+async def apply(postgres, redis, logger, migrator):
+    async def _handle(conn, reviews):
+        await conn.executemany(
+            "UPDATE reviews SET parent_id = $1 WHERE id = $2",
+            [(review["id"], reply_id) for review in reviews for reply_id in review["replies"]]
+        )
 
-async def apply(postgres, redis, logger):
-    reviews = await postgres.fetch("SELECT id, replies FROM reviews")
-    for review in reviews:
-        if review["replies"]:
-            for reply_id in review["replies"]:
-                await postgres.execute("UPDATE reviews SET parent_id = $1 WHERE id = $2",review["id"], reply_id)
-                print(review, reply_id)
+    await migrator.run(
+        "SELECT id, replies FROM reviews WHERE cardinality(replies) > 0 AND id > $1::uuid ORDER BY id",
+        key="id",
+        start="00000000-0000-0000-0000-000000000000",
+        handle=_handle,
+        count="SELECT COUNT(*) FROM reviews WHERE cardinality(replies) > 0",
+    )
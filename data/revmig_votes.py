@@ -1,19 +1,20 @@
-import asyncpg
+async def apply(postgres, redis, logger, migrator):
+    async def _handle(conn, reviews):
+        records = []
+        for review in reviews:
+            records += [(review["id"], upvote, True) for upvote in review["review_upvotes"]]
+            records += [(review["id"], downvote, False) for downvote in review["review_downvotes"]]
 
-async def apply(postgres, redis, logger):
-    reviews = await postgres.fetch("SELECT id, review_upvotes, review_downvotes FROM reviews")
-    for review in reviews:
-        for upvote in review["review_upvotes"]:
-            print(upvote)
-            await postgres.execute(
-                "INSERT INTO review_votes (id, user_id, upvote) VALUES ($1, $2, true)",
-                review["id"],
-                upvote
-            )
-        for downvote in review["review_downvotes"]:
-            print(downvote)
-            await postgres.execute(
-                "INSERT INTO review_votes (id, user_id, upvote) VALUES ($1, $2, false)",
-                review["id"],
-                downvote
-            )
\ No newline at end of file
+        await conn.copy_records_to_table(
+            "review_votes",
+            records=records,
+            columns=["id", "user_id", "upvote"],
+        )
+
+    await migrator.run(
+        "SELECT id, review_upvotes, review_downvotes FROM reviews WHERE id > $1::uuid ORDER BY id",
+        key="id",
+        start="00000000-0000-0000-0000-000000000000",
+        handle=_handle,
+        count="SELECT COUNT(*) FROM reviews",
+    )
@@ -91,6 +91,11 @@ CREATE TABLE bots (
     di_text text
 );
 
+CREATE INDEX bots_state_created_idx ON bots (state, created_at);
+CREATE INDEX bots_id_sort_idx ON bots ((bot_id::text COLLATE "C"));
+CREATE INDEX bots_username_sort_idx ON bots ((lower(coalesce(username_cached, '')) COLLATE "C"), bot_id);
+CREATE INDEX bots_flags_idx ON bots USING gin (flags);
+
 CREATE TABLE resources (
     id uuid primary key DEFAULT uuid_generate_v4(),
     target_id BIGINT NOT NULL,
@@ -331,13 +336,45 @@ CREATE TABLE lynx_apps (
 );
 
 CREATE TABLE lynx_logs (
+    id bigserial,
     user_id bigint not null,
     method text not null,
     url text not null,
     status_code integer not null,
-    request_time timestamptz default NOW()
+    request_time timestamptz not null default NOW()
+);
+
+CREATE UNIQUE INDEX lynx_logs_id_idx ON lynx_logs (id);
+CREATE INDEX lynx_logs_time_idx ON lynx_logs (request_time DESC, id DESC);
+CREATE INDEX lynx_logs_user_time_idx ON lynx_logs (user_id, request_time DESC, id DESC);
+CREATE INDEX lynx_logs_errors_idx ON lynx_logs (request_time DESC, id DESC) WHERE status_code >= 400;
+
+-- Kept up to date by lynx_logs_daily_update
+CREATE TABLE lynx_logs_daily (
+    day date not null,
+    user_id bigint not null,
+    requests bigint not null default 0,
+    errors bigint not null default 0,
+    PRIMARY KEY (day, user_id)
 );
 
+CREATE OR REPLACE FUNCTION lynx_logs_daily_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO lynx_logs_daily (day, user_id, requests, errors)
+    SELECT (request_time AT TIME ZONE 'UTC')::date, user_id, COUNT(*), COUNT(*) FILTER (WHERE status_code >= 400)
+    FROM new_rows
+    GROUP BY 1, 2
+    ON CONFLICT (day, user_id) DO UPDATE SET
+        requests = lynx_logs_daily.requests + EXCLUDED.requests,
+        errors = lynx_logs_daily.errors + EXCLUDED.errors;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER lynx_logs_daily_update AFTER INSERT ON lynx_logs
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION lynx_logs_daily_update();
+
 CREATE TABLE lynx_notifications (
     acked_users bigint[] not null default '{}',
     message text not null,
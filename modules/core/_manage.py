@@ -3,6 +3,7 @@
 import asyncio
 import datetime
 import importlib
+import inspect
 import io
 import multiprocessing
 import os
@@ -15,7 +16,7 @@ import uuid
 import warnings
 from getpass import getpass
 from pathlib import Path
-from subprocess import DEVNULL, Popen
+from subprocess import DEVNULL, PIPE, Popen
 from typing import Any, Callable, Dict
 
 def error(msg: str, code: int = 1):
@@ -39,7 +40,7 @@ def _fappgen(session_id, workers, static_assets):
     from fastapi import FastAPI
     from fastapi.responses import ORJSONResponse
 
-    from modules.core.system import init_fates_worker
+    from modules.core.system import init_fates_worker, setup_routes
 
     _app = FastAPI(
         title="Fates List",
@@ -63,6 +64,8 @@ def _fappgen(session_id, workers, static_assets):
     
     _app.state.static = static_assets
 
+    setup_routes(_app)
+
     @_app.on_event("startup")
     async def startup():
         await init_fates_worker(_app, session_id, workers)
@@ -74,13 +77,20 @@ default_workers_num = (multiprocessing.cpu_count() * 2) + 1
 
 
 def site_run():
-    """Runs the Fates List site"""
+    """
+    Runs the Fates List site
+
+    WORKERS sets the number of worker processes (prefork, defaults to cpu_count*2+1)
+    and BIND sets the socket to listen on (host:port or unix:path, defaults to 127.0.0.1:9999).
+    Use site.reload to reload without downtime
+    """
     workers = os.environ.get("WORKERS") or default_workers_num
     workers = int(workers)
 
-    import uvicorn
     from PIL import Image
 
+    from modules.core.prefork import Supervisor, bind_socket, inherited_socket
+
     session_id = uuid.uuid4()
 
     # Load in static assets for bot widgets
@@ -103,66 +113,91 @@ def site_run():
 
     _app = _fappgen(str(session_id), workers, static_assets)
 
-    uvicorn.run(_app, host="127.0.0.1", port=9999, log_level="info")
+    # On reload, the socket is handed down by the old supervisor
+    sock = inherited_socket() or bind_socket(os.environ.get("BIND") or "127.0.0.1:9999")
+
+    Supervisor(_app, sock, workers).run()
+
+
+def site_reload():
+    """
+    Reloads the site without dropping requests. New workers are started (and warmed up)
+    before the old ones drain and exit. Set KILL=1 to gracefully stop the site instead
+    """
+    from modules.core.prefork import pidfile
+
+    try:
+        pid = int(pidfile().read_text())
+    except (FileNotFoundError, ValueError):
+        return error("Site is not running (no pidfile)")
+
+    sig = signal.SIGTERM if os.environ.get("KILL") else signal.SIGHUP
+
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pidfile().unlink(missing_ok=True)
+        return error(f"Site is not running (stale pidfile for {pid})")
+
+    print(f"Sent {sig.name} to {pid}")
 
 def site_enum2html():
     """Converts the enums in modules/models/enums.py into markdown. Mainly for apidocs creation"""
-    enums = importlib.import_module("modules.models.enums")
-    aenum = importlib.import_module("aenum")
-    md = {}
+    from modules.models.enum_compile import load_tables
+
     md_path = Path("data/res/base_enum.md")
     with md_path.open() as f:
         base_md = f.read()
 
-    for key in enums.__dict__.keys():
-        # Ignore internal or dunder keys
-        if key.startswith("_") or key in ("IntEnum", "Enum"):
-            continue
-
-        v = enums.__dict__[key]
-        if isinstance(v, aenum.EnumType):
-            props = list(v)
-            try:
-                fields = v._init_
-            except AttributeError:
-                fields = []
-            md[key] = {}
-            md[key]["doc"] = "\n"
-            md[key]["table"] = "| Name | Value | Description |"
-            nl = "\n| :--- | :--- | :--- |"
-            keys = []
-            for ext in fields:
-                if ext in ("value", "__doc__"):
-                    continue
-                md[key][
-                    "table"] += f" {ext.strip('_').replace('_', ' ').title()} |"
-                nl += " :--- |"
-                keys.append(ext)
-            md[key]["table"] += f"{nl}\n"
-
-            if v.__doc__ and v.__doc__ != "An enumeration.":
-                md[key]["doc"] = "\n" + v.__doc__ + "\n\n"
-
-            for prop in props:
-                md[key][
-                    "table"] += f"| {prop.name} | {prop.value} | {prop.__doc__} |"
-                for prop_key in keys:
-                    tmp = getattr(prop, prop_key)
-                    try:
-                        tmp = str(tmp) + f" ({tmp.value})"
-                    except AttributeError:
-                        tmp = str(tmp)
-                    md[key]["table"] += f" {tmp} |"
-                md[key]["table"] += "\n"
-
-    md = dict(sorted(md.items()))
+    def _display(value) -> str:
+        if isinstance(value, dict):  # Enum member
+            return f"{value['enum']}.{value['name']} ({value['value']})"
+        if isinstance(value, list):
+            return str(tuple(value))
+        return str(value)
 
     md_out = []
-    for key in md.keys():
-        md_out.append(f'## {key}\n{md[key]["doc"]}{md[key]["table"]}')
+    for key, table in load_tables().items():
+        doc = "\n" + table["doc"] + "\n\n" if table["doc"] else "\n"
+        md_table = "| Name | Value | Description |"
+        nl = "\n| :--- | :--- | :--- |"
+        for ext in table["fields"]:
+            md_table += f" {ext.strip('_').replace('_', ' ').title()} |"
+            nl += " :--- |"
+        md_table += f"{nl}\n"
+
+        for name, prop in table["members"].items():
+            md_table += f"| {name} | {prop['value']} | {prop['doc']} |"
+            for ext in table["fields"]:
+                md_table += f" {_display(prop[ext])} |"
+            md_table += "\n"
+
+        md_out.append(f"## {key}\n{doc}{md_table}")
 
     print(base_md + "\n" + "\n\n".join(md_out))
 
+def site_enumcompile():
+    """
+    Compiles the enums into lookup tables (modules/models/_enum_tables.py) and a
+    JSON/OpenAPI export (data/res/enums.json). Set CHECK to only check that they are
+    up to date (exits with 1 if not)
+    """
+    from modules.models.enum_compile import outputs
+
+    stale = []
+    for path, content in outputs().items():
+        if path.exists() and path.read_bytes() == content:
+            continue
+        stale.append(path)
+        if not os.environ.get("CHECK"):
+            path.write_bytes(content)
+            print(f"Wrote {path}")
+
+    if os.environ.get("CHECK") and stale:
+        error("Out of date (run flamepaw --cmd site.enumcompile): " + ", ".join(map(str, stale)))
+    elif not stale:
+        print("Enum tables are up to date")
+
 def site_getdragondocs():
     """Gets the dragon docs"""
     async def _docs():
@@ -181,91 +216,192 @@ def site_getdragondocs():
     asyncio.set_event_loop(loop)
     loop.run_until_complete(_docs())
 
-def site_gensecret():
-    """Generates a random secret"""
-    print(secrets.token_urlsafe())
+def site_standin():
+    """Runs a local stand-in for the IPC worker and baypaw (for benchmarks and load tests)"""
+    import orjson
 
+    from modules.core.standin import StandinConfig, run_standin
 
-def site_compilestatic():
-    """Compiles all labelled static files"""
-    for src_file in Path("data/static/assets/src").rglob("*.js"):
-        out_file = (str(src_file).replace(".js", ".min.js").replace(
-            "src/", "prod/").replace("js/", ""))
-        print(f"{src_file} -> {out_file}")
-        cmd = [
-            "google-closure-compiler",
-            "--js",
-            str(src_file),
-            "--js_output_file",
-            out_file,
-        ]
+    fixtures = None
+    if os.environ.get("FIXTURES"):
+        with open(os.environ["FIXTURES"], mode="rb") as fixtures_f:
+            fixtures = orjson.loads(fixtures_f.read())
 
-        with Popen(cmd, env=os.environ) as proc:
-            proc.wait()
+    config = StandinConfig(
+        latency=float(os.environ.get("LATENCY", 0)),
+        jitter=float(os.environ.get("JITTER", 0)),
+        error_rate=float(os.environ.get("ERROR_RATE", 0)),
+        fixtures=fixtures,
+        port=int(os.environ.get("PORT", 1234)),
+    )
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(run_standin(config))
+    except KeyboardInterrupt:
+        pass
 
-    for src_file in Path("data/static/assets/src").rglob("*.scss"):
-        out_file = (str(src_file).replace(".scss", ".min.css").replace(
-            "src/", "prod/").replace("css/", ""))
-        print(f"{src_file} -> {out_file}")
-        cmd = ["sass", "--style=compressed", str(src_file), out_file]
+def site_lynxbench():
+    """
+    Benchmarks the per request overhead of the real LynxMiddleware against the
+    CustomHeaderMiddleware/NoCacher stack it replaced. REQUESTS sets the number of
+    requests, STAGE_LATENCY_MS the latency of each (stubbed) postgres/redis round trip
+    """
+    from modules.infra.admin_piccolo.bench import run
+
+    run(
+        requests=int(os.environ.get("REQUESTS") or 5000),
+        stage_latency=float(os.environ.get("STAGE_LATENCY_MS") or 0) / 1000,
+    )
 
-        with Popen(cmd, env=os.environ) as proc:
-            proc.wait()
+def site_startup_profile():
+    """
+    Reports where site startup time goes (import times from ``python -X importtime``
+    and the time taken to make the app). TOP sets how many imports to show
+    """
+    top = int(os.environ.get("TOP") or 25)
+
+    code = (
+        "import time; start = time.perf_counter();"
+        "from modules.core._manage import _fappgen; imported = time.perf_counter();"
+        "_fappgen('startup-profile', 1, {});"
+        "print(imported - start, time.perf_counter() - imported)"
+    )
 
-    for img in Path("data/static/assets/src/img").rglob("*"):
-        ext = str(img).split(".")[-1]
-        out = str(img).replace("src/img/", "prod/").replace(f".{ext}", ".webp")
-        print(f"{img} -> {out}")
+    with Popen([sys.executable, "-X", "importtime", "-c", code], stdout=PIPE, stderr=PIPE, text=True) as proc:
+        out, err = proc.communicate()
 
-        if ext == "webp":
-            shutil.copy2(str(img), out)
-        else:
-            cmd = ["cwebp", "-quiet", "-q", "75", str(img), "-o", out]
+    if proc.returncode:
+        return error(err, proc.returncode)
 
-            with Popen(cmd, env=os.environ) as proc:
-                proc.wait()
+    imports = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Top level imports are not indented, only they are shown (with their children)
+        if not name.startswith("  "):
+            imports.append((int(cumulative_us), int(self_us), name.strip()))
+
+    import_time, app_time = (float(v) for v in out.split()[-2:])
+
+    print(f"Imports: {import_time * 1000:.0f}ms, making app (routes and OpenAPI): {app_time * 1000:.0f}ms\n")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+
+def site_gensecret():
+    """Generates a random secret"""
+    print(secrets.token_urlsafe())
+
+
+def site_compilestatic():
+    """
+    Compiles all labelled static files. Only changed files are rebuilt (set FORCE
+    to rebuild everything) across ASSET_WORKERS processes (defaults to the cpu count)
+    """
+    from modules.core.assets import build_assets
+
+    workers = int(os.environ.get("ASSET_WORKERS") or 0) or None
+    if not build_assets(workers=workers, force=bool(os.environ.get("FORCE"))):
+        error("Some assets failed to build")
 
 def db_backup():
-    """Backs up the Fates List database"""
+    """
+    Backs up the Fates List database
+
+    The full backup is a directory format dump made by JOBS (defaults to the cpu count)
+    parallel pg_dump jobs with each table compressed as it is written (COMPRESS sets the
+    level, defaults to 5). Set BACKUP_FORMAT=custom for the old single file backups.
+    The schema is dumped alongside it and both are uploaded concurrently. Raises
+    RuntimeError (after stopping the other dumps/uploads) if any of them fail
+    """
     from loguru import logger
 
+    jobs = int(os.environ.get("JOBS") or multiprocessing.cpu_count())
+    compress = os.environ.get("COMPRESS") or "5"
+    directory = os.environ.get("BACKUP_FORMAT", "directory") == "directory"
+
+    conf_pwd = getpass(prompt="Enter rclone conf password: ")
+
     logger.info("Starting backups")
 
     bak_id = datetime.datetime.now().strftime("%Y-%m-%d~%H:%M:%S")
-    cmd = f"pg_dump -Fc > /backups/full-{bak_id}.bak"
+    full_path = f"/backups/full-{bak_id}" if directory else f"/backups/full-{bak_id}.bak"
+    schema_path = f"/backups/schema-{bak_id}.bak"
+
+    if directory:
+        full_cmd = ["pg_dump", "-Fd", "-j", str(jobs), "-Z", compress, "-f", full_path]
+    else:
+        full_cmd = ["pg_dump", "-Fc", "-Z", compress, "-f", full_path]
+    schema_cmd = ["pg_dump", "-Fc", "--schema-only", "--no-owner", "-f", schema_path]
+
+    procs: list[Popen] = []
+
+    def _start(cmd: list[str]) -> Popen:
+        proc = Popen(cmd, env=os.environ)
+        procs.append(proc)
+        return proc
+
+    def _upload(path: str) -> Popen:
+        dest = "Fates List:fates_backups"
+        if Path(path).is_dir():
+            dest += "/" + Path(path).name
+        cmd = [
+            "rclone", "copy", path, dest,
+            "--transfers", str(jobs),
+            "--password-command", f"printf {conf_pwd}",
+        ]
+        return _start(cmd)
 
-    with Popen(cmd, shell=True, env=os.environ) as proc:
-        proc.wait()
+    def _check(proc: Popen, what: str):
+        if proc.wait():
+            raise RuntimeError(f"{what} failed with code {proc.returncode}")
 
-    logger.info("Backup of full db done. Backing up only schema...")
+    start_time = time.time()
 
     try:
-        Path("/backups/latest.bak").unlink()
-    except FileNotFoundError:
-        pass
+        # The schema dump is tiny so it is dumped (and uploaded) while the full dump runs
+        full_dump = _start(full_cmd)
+        schema_dump = _start(schema_cmd)
 
-    Path("/backups/latest.bak").symlink_to(f"/backups/full-{bak_id}.bak")
-    cmd = f"pg_dump -Fc --schema-only --no-owner > /backups/schema-{bak_id}.bak"
+        _check(schema_dump, "Schema backup")
+        logger.info("Schema backup done, uploading it")
+        schema_upload = _upload(schema_path)
 
-    with Popen(cmd, shell=True, env=os.environ) as proc:
-        proc.wait()
+        _check(full_dump, "Full backup")
+        logger.info(f"Backup of full db done in {time.time() - start_time:.1f}s, uploading it")
 
-    logger.info("Schema backup done")
+        try:
+            Path("/backups/latest.bak").unlink()
+        except FileNotFoundError:
+            pass
 
-    conf_pwd = getpass(prompt="Enter rclone conf password: ")
-    for bak_type in ("full", "schema"):
-        cmd = (
-            f"rclone copy /backups/{bak_type}-{bak_id}.bak 'Fates List:fates_backups' "
-        )
-        cmd += f"--password-command 'printf {conf_pwd}'"
+        Path("/backups/latest.bak").symlink_to(full_path)
 
-        with Popen(cmd, env=os.environ, shell=True) as proc:
-            proc.wait()
+        full_upload = _upload(full_path)
 
-    logger.success("Backups done!")
+        _check(schema_upload, "Schema upload")
+        _check(full_upload, "Full backup upload")
+    except BaseException:
+        # Don't leave dumps/uploads running behind a failed backup
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+        raise
+
+    logger.success(f"Backups done in {time.time() - start_time:.1f}s!")
 
 def db_apply():
-    """Apply Fates List database migration"""
+    """
+    Apply Fates List database migration
+
+    Migrations accepting a ``migrator`` (see modules/core/migrate.py) are chunked and
+    resumable. For those, DRY_RUN rolls everything back, CHUNK_SIZE sets the rows per
+    chunk (and transaction) and RESTART ignores checkpoints of previous runs
+    """
     import uvloop
 
     from loguru import logger
@@ -291,9 +427,24 @@ def db_apply():
         postgres = await asyncpg.create_pool()
         redis = aioredis.from_url("redis://localhost:1001", db=1)
         logger.info("Starting migration")
+
+        kwargs = {}
+        if "migrator" in inspect.signature(migration.apply).parameters:
+            from modules.core.migrate import Migrator
+
+            kwargs["migrator"] = Migrator(
+                postgres,
+                logger,
+                name=module,
+                chunk_size=int(os.environ.get("CHUNK_SIZE") or 5000),
+                dry_run=bool(os.environ.get("DRY_RUN")),
+                restart=bool(os.environ.get("RESTART")),
+            )
+
         ret = await migration.apply(postgres=postgres,
                                     redis=redis,
-                                    logger=logger)
+                                    logger=logger,
+                                    **kwargs)
         logger.success(f"Migration applied with return code of {ret}")
 
     loop = asyncio.new_event_loop()
@@ -302,7 +453,13 @@ def db_apply():
 
 
 def db_wipeuser():
-    """Wipes a user account (e.g. Data Deletion Request)"""
+    """
+    Wipes user accounts (e.g. Data Deletion Requests)
+
+    Set USER to the user id to wipe, USERS to a comma separated list of user ids
+    or USERS_FILE to a file with one user id per line. Everything is wiped in one
+    transaction so either all of the users are wiped or none of them are
+    """
     import uvloop
 
     from loguru import logger
@@ -312,45 +469,62 @@ def db_wipeuser():
     import aioredis
     import asyncpg
 
+    user_ids = set()
+
+    if os.environ.get("USERS_FILE"):
+        with open(os.environ["USERS_FILE"]) as users_f:
+            user_ids.update(line.strip() for line in users_f if line.strip())
+    if os.environ.get("USERS"):
+        user_ids.update(user.strip() for user in os.environ["USERS"].split(",") if user.strip())
+    if os.environ.get("USER", "").isdigit():
+        user_ids.add(os.environ["USER"])
+
     try:
-        user_id = int(os.environ.get("USER"))
-    except:
-        user_id = None
+        user_ids = sorted(int(user_id) for user_id in user_ids)
+    except ValueError as exc:
+        return error(f"Invalid user id: {exc}")
 
-    if not user_id:
-        raise RuntimeError("Set USER envvar to user id to wipe")
+    if not user_ids:
+        raise RuntimeError("Set USER, USERS or USERS_FILE envvar to user id(s) to wipe")
 
     async def _wipeuser():
-        logger.info("Wiping user info in db")
-        db = await asyncpg.create_pool()
-        await db.execute("DELETE FROM users WHERE user_id = $1", user_id)
-
-        bots = await db.fetch(
-            """SELECT DISTINCT bots.bot_id FROM bots 
-            INNER JOIN bot_owner ON bot_owner.bot_id = bots.bot_id 
-            WHERE bot_owner.owner = $1 AND bot_owner.main = true""",
-            user_id,
-        )
-        for bot in bots:
-            await db.execute("DELETE FROM bots WHERE bot_id = $1",
-                             bot["bot_id"])
-
-        votes = await db.fetch(
-            "SELECT bot_id from bot_voters WHERE user_id = $1", user_id)
-        for vote in votes:
+        start_time = time.time()
+        logger.info(f"Wiping info of {len(user_ids)} user(s) in db")
+        db = await asyncpg.connect()
+
+        async with db.transaction():
+            await db.execute("DELETE FROM users WHERE user_id = ANY($1)", user_ids)
+
+            bots = await db.fetchval(
+                """SELECT COALESCE(array_agg(DISTINCT bot_id), '{}') FROM bot_owner
+                WHERE owner = ANY($1) AND main = true""",
+                user_ids,
+            )
+
+            # One vote per voter row, bots being deleted anyways are skipped
             await db.execute(
-                "UPDATE bots SET votes = votes - 1 WHERE bot_id = $1",
-                vote["bot_id"])
+                """UPDATE bots SET votes = bots.votes - voters.count FROM (
+                    SELECT bot_id, COUNT(*) AS count FROM bot_voters
+                    WHERE user_id = ANY($1) GROUP BY bot_id
+                ) voters WHERE bots.bot_id = voters.bot_id AND bots.bot_id <> ALL($2)""",
+                user_ids,
+                bots,
+            )
+
+            await db.execute("DELETE FROM bots WHERE bot_id = ANY($1)", bots)
+            await db.execute("DELETE FROM bot_voters WHERE user_id = ANY($1)", user_ids)
 
-        await db.execute("DELETE FROM bot_voters WHERE user_id = $1", user_id)
+        await db.close()
+        logger.info(f"Deleted {len(bots)} bot(s). Clearing redis info on users...")
 
-        logger.info("Clearing redis info on user...")
         redis = aioredis.from_url("redis://localhost:1001", db=1)
-        await redis.hdel(str(user_id), "cache")
-        await redis.hdel(str(user_id), "ws")
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hdel(str(user_id), "cache", "ws")
+            await pipe.execute()
 
         await redis.close()
-        logger.success("Done wiping user")
+        logger.success(f"Done wiping {len(user_ids)} user(s) in {time.time() - start_time:.2f}s")
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -535,7 +709,9 @@ def db_setup():
         bashrc_f.write("\n".join(lines))
 
     if Path("/backups/latest.bak").exists():
-        logger.info("Restoring backup...")
+        # Restores with JOBS (defaults to the cpu count) parallel jobs
+        jobs = int(os.environ.get("JOBS") or multiprocessing.cpu_count())
+        logger.info(f"Restoring backup using {jobs} jobs...")
 
         with open("/tmp/s2.bash", "w") as sf_s2_f:
             lines = [
@@ -547,7 +723,7 @@ def db_setup():
                 'psql -c "CREATE SCHEMA IF NOT EXISTS public"',
                 "psql -c 'CREATE EXTENSION IF NOT EXISTS " + '"uuid-ossp"' +
                 "'",
-                "pg_restore -cvd fateslist /backups/latest.bak",
+                f"pg_restore -j {jobs} -cvd fateslist /backups/latest.bak",
             ]
             sf_s2_f.write("\n".join(lines))
 
@@ -0,0 +1,146 @@
+"""
+Event loop lag monitoring and admission control for site workers
+
+Once a worker is overloaded (loop lag above SHED_LAG_MS or more than SHED_INFLIGHT
+requests in flight), expensive work like uncached widget renders is shed with a
+503 first while cheap requests (cached hits) are still served. Past
+SHED_HARD_INFLIGHT requests in flight, everything is shed so the worker can recover
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from loguru import logger
+
+RETRY_AFTER = 1
+
+LAG_INTERVAL = 0.1
+LAG_ALPHA = 0.3  # EWMA weight of the newest lag sample
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1)  # In seconds, for the lag histogram
+
+
+class LoopMonitor:
+    """Measures event loop lag by timing how late a periodic sleep wakes up"""
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0  # EWMA
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self.samples = 0
+        self.buckets = dict.fromkeys(LAG_BUCKETS, 0)  # Samples with lag over each bucket
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+
+            self.lag = lag if not self.samples else self.lag + LAG_ALPHA * (lag - self.lag)
+            self.lag_last = lag
+            self.lag_max = max(self.lag_max, lag)
+            self.samples += 1
+            for bucket in LAG_BUCKETS:
+                if lag > bucket:
+                    self.buckets[bucket] += 1
+
+            if lag > 1:
+                logger.warning(f"Event loop of worker {os.getpid()} blocked for {lag:.2f}s")
+
+    def stats(self) -> dict:
+        return {
+            "lag_ms": self.lag * 1000,
+            "lag_last_ms": self.lag_last * 1000,
+            "lag_max_ms": self.lag_max * 1000,
+            "samples": self.samples,
+            "over_ms": {str(int(bucket * 1000)): count for bucket, count in self.buckets.items()},
+        }
+
+
+class AdmissionControl:
+    """Tracks requests in flight and decides what to shed"""
+    def __init__(self, monitor: LoopMonitor, *, max_lag: float, max_inflight: int, hard_inflight: int):
+        self.monitor = monitor
+        self.max_lag = max_lag
+        self.max_inflight = max_inflight
+        self.hard_inflight = hard_inflight
+        self.in_flight = 0
+        self.shed = 0
+        self.shed_hard = 0
+
+    @classmethod
+    def from_env(cls, monitor: LoopMonitor) -> "AdmissionControl":
+        max_inflight = int(os.environ.get("SHED_INFLIGHT") or 64)
+        return cls(
+            monitor,
+            max_lag=float(os.environ.get("SHED_LAG_MS") or 100) / 1000,
+            max_inflight=max_inflight,
+            hard_inflight=int(os.environ.get("SHED_HARD_INFLIGHT") or max_inflight * 4),
+        )
+
+    def overloaded(self) -> bool:
+        return self.monitor.lag > self.max_lag or self.in_flight > self.max_inflight
+
+    def admit(self) -> bool:
+        """Called for every request. Returns False if it must be shed"""
+        if self.in_flight >= self.hard_inflight:
+            self.shed_hard += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def check(self):
+        """Sheds expensive work (by raising a 503) if the worker is overloaded"""
+        if self.overloaded():
+            self.shed += 1
+            raise HTTPException(
+                status_code=503,
+                detail="This worker is overloaded, please try again later",
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "overloaded": self.overloaded(),
+            "shed": self.shed,
+            "shed_hard": self.shed_hard,
+            "max_lag_ms": self.max_lag * 1000,
+            "max_inflight": self.max_inflight,
+            "hard_inflight": self.hard_inflight,
+        }
+
+
+def shed_if_overloaded(request: Request):
+    """Call before doing expensive work in a route"""
+    request.app.state.worker_session.admission.check()
+
+
+router = APIRouter(
+    include_in_schema=False,
+)
+
+@router.get("/_stats")
+async def worker_stats(request: Request):
+    """Load stats of the worker serving this request"""
+    worker_session = request.app.state.worker_session
+    return {
+        "pid": os.getpid(),
+        "uptime": time.time() - worker_session.start_time,
+        "loop": worker_session.loop_monitor.stats(),
+        "admission": worker_session.admission.stats(),
+        "postgres": worker_session.pool_stats(),
+    }
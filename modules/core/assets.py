@@ -0,0 +1,181 @@
+"""
+Static asset build pipeline used by ``site.compilestatic``
+
+Assets in ``data/static/assets/src`` are built in parallel into ``data/static/assets/prod``:
+
+- js is minified by google-closure-compiler
+- scss is compiled by sass
+- images are converted to webp by cwebp
+
+Builds are incremental: a file is only rebuilt if its content hash (plus the hash
+of any scss partials it may import) differs from the build manifest or its output
+is missing. Every output is also copied to a content-hashed filename (e.g.
+``main.3f2a9c1e.min.js``) for long-lived caching, ``prod/manifest.json`` maps
+the plain paths (relative to ``prod``) to the hashed ones
+"""
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from subprocess import PIPE, Popen
+
+SRC = Path("data/static/assets/src")
+PROD = Path("data/static/assets/prod")
+BUILD_MANIFEST = Path("data/static/assets/.build-manifest.json")
+ASSET_MANIFEST = PROD / "manifest.json"
+
+
+class Asset:
+    """A source file and how to build it"""
+    __slots__ = ("src", "out", "cmd", "deps")
+
+    def __init__(self, src: Path, out: Path, cmd: list[str] | None, deps: tuple[Path, ...] = ()):
+        self.src = src
+        self.out = out
+        self.cmd = cmd  # None means copy
+        self.deps = deps  # Other files that affect the output
+
+    def digest(self) -> str:
+        digest = hashlib.sha256(self.src.read_bytes())
+        for dep in self.deps:
+            digest.update(dep.read_bytes())
+        return digest.hexdigest()
+
+    def build(self):
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        if self.cmd is None:
+            shutil.copy2(self.src, self.out)
+            return
+
+        with Popen(self.cmd, env=os.environ, stdout=PIPE, stderr=PIPE, text=True) as proc:
+            out, err = proc.communicate()
+
+        if proc.returncode:
+            raise RuntimeError(f"{self.cmd[0]} failed on {self.src}: {err or out}")
+
+
+def hashed_name(path: Path) -> Path:
+    """main.min.js -> main.<hash>.min.js"""
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:8]
+    stem, _, suffixes = path.name.partition(".")
+    return path.with_name(f"{stem}.{digest}.{suffixes}")
+
+
+def discover() -> list[Asset]:
+    """Finds all assets, output paths are the same as they have always been"""
+    assets = []
+
+    for src_file in SRC.rglob("*.js"):
+        out_file = Path(str(src_file).replace(".js", ".min.js").replace(
+            "src/", "prod/").replace("js/", ""))
+        cmd = [
+            "google-closure-compiler",
+            "--js",
+            str(src_file),
+            "--js_output_file",
+            str(out_file),
+        ]
+        assets.append(Asset(src_file, out_file, cmd))
+
+    # sass partials (_name.scss) can be imported by anything so they're deps of every stylesheet
+    partials = tuple(sorted(SRC.rglob("_*.scss")))
+    for src_file in SRC.rglob("*.scss"):
+        if src_file.name.startswith("_"):
+            continue
+        out_file = Path(str(src_file).replace(".scss", ".min.css").replace(
+            "src/", "prod/").replace("css/", ""))
+        cmd = ["sass", "--style=compressed", str(src_file), str(out_file)]
+        assets.append(Asset(src_file, out_file, cmd, partials))
+
+    for img in (SRC / "img").rglob("*"):
+        if not img.is_file():
+            continue
+        ext = str(img).split(".")[-1]
+        out = Path(str(img).replace("src/img/", "prod/").replace(f".{ext}", ".webp"))
+        cmd = None if ext == "webp" else ["cwebp", "-quiet", "-q", "75", str(img), "-o", str(out)]
+        assets.append(Asset(img, out, cmd))
+
+    return assets
+
+
+def _load_json(path: Path) -> dict:
+    import orjson
+
+    try:
+        return orjson.loads(path.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
+
+
+def _dump_json(path: Path, data: dict):
+    import orjson
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+
+
+def build_assets(*, workers: int | None = None, force: bool = False) -> bool:
+    """Builds all out of date assets. Returns False if any build failed"""
+    workers = workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+
+    build_manifest = {} if force else _load_json(BUILD_MANIFEST)
+    asset_manifest = _load_json(ASSET_MANIFEST)
+
+    todo = []
+    skipped = 0
+    for asset in discover():
+        digest = asset.digest()
+        if build_manifest.get(str(asset.src)) == digest and asset.out.exists():
+            skipped += 1
+            continue
+        todo.append((asset, digest))
+
+    timings = []
+    failed = []
+
+    def _build(asset: Asset):
+        build_start = time.perf_counter()
+        asset.build()
+        return time.perf_counter() - build_start
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_build, asset): (asset, digest) for asset, digest in todo}
+        for future in as_completed(futures):
+            asset, digest = futures[future]
+            try:
+                elapsed = future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                print(f"FAILED {asset.src}: {exc}")
+                failed.append(asset)
+                build_manifest.pop(str(asset.src), None)
+                continue
+
+            hashed = hashed_name(asset.out)
+            shutil.copy2(asset.out, hashed)
+            # Keyed by path (not name) so same named outputs in different directories don't clash
+            key = asset.out.relative_to(PROD).as_posix()
+            old = asset_manifest.get(key)
+            if old and old != hashed.relative_to(PROD).as_posix():
+                (PROD / old).unlink(missing_ok=True)
+            asset_manifest[key] = hashed.relative_to(PROD).as_posix()
+
+            build_manifest[str(asset.src)] = digest
+            timings.append((elapsed, asset))
+            print(f"{asset.src} -> {asset.out} ({hashed.name}) in {elapsed:.2f}s")
+
+    _dump_json(BUILD_MANIFEST, build_manifest)
+    if timings:
+        _dump_json(ASSET_MANIFEST, asset_manifest)
+
+    total = time.perf_counter() - start_time
+    print(
+        f"\nBuilt {len(timings)}, skipped {skipped} (unchanged), failed {len(failed)} "
+        f"in {total:.2f}s using {workers} workers"
+    )
+    for elapsed, asset in sorted(timings, key=lambda t: t[0], reverse=True)[:5]:
+        print(f"{elapsed:>8.2f}s  {asset.src}")
+
+    return not failed
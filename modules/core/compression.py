@@ -0,0 +1,241 @@
+"""
+Response compression (brotli or gzip, whichever the client prefers)
+
+Only text-like bodies of at least ``minimum_size`` bytes are compressed, images
+and other binary bodies are passed through untouched. Nothing is buffered: bodies
+sent in one message are compressed whole, streamed bodies (``more_body``) are
+compressed incrementally chunk by chunk with one compressor per response.
+
+Compressed whole bodies are cached by a digest of the original body so the same
+page or JSON being served again doesn't have to be compressed again. The cache is
+an in memory LRU per process in front of redis (the same redis the widget cache
+lives in), so the variants are shared by all workers and survive restarts
+
+brotli is optional, only gzip is used if it isn't installed
+"""
+import asyncio
+import collections
+import gzip
+import hashlib
+import zlib
+from typing import Any, Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+# Bodies bigger than this are compressed in a thread so the event loop isn't blocked
+THREAD_THRESHOLD = 64 * 1024
+
+# Compressed variants of bodies at least this big are shared through redis
+REDIS_MIN_SIZE = 8 * 1024
+REDIS_TTL = 60 * 60
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class _StreamCompressor:
+    """Incremental compressor for streamed bodies, every chunk is flushed so streams stay live"""
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.process(chunk) + self.compressor.flush()
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Returns the best encoding we support from an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip()] = quality
+
+    supported = ("br", "gzip") if brotli else ("gzip",)
+    best = max(supported, key=lambda encoding: accepted.get(encoding, 0))
+    return best if accepted.get(best, 0) > 0 else None
+
+
+class CompressedCache:
+    """
+    LRU of compressed bodies keyed by encoding and body digest, bounded by total size.
+    Misses of bodies of at least ``REDIS_MIN_SIZE`` are looked up in (and written to)
+    redis when there is one
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.entries: collections.OrderedDict[tuple[str, bytes], bytes] = collections.OrderedDict()
+
+    def _remember(self, key: tuple[str, bytes], compressed: bytes):
+        if len(compressed) <= self.max_bytes:
+            self.entries[key] = compressed
+            self.size += len(compressed)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    async def get(self, body: bytes, encoding: str, redis: Any = None) -> bytes:
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        key = (encoding, digest)
+        compressed = self.entries.get(key)
+        if compressed is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return compressed
+
+        redis_key = f"compressed:{encoding}:{digest.hex()}"
+        if redis is not None and len(body) >= REDIS_MIN_SIZE:
+            try:
+                compressed = await redis.get(redis_key)
+            except Exception:  # Redis being down must not break responses
+                redis = None
+            if compressed:
+                self.redis_hits += 1
+                self._remember(key, compressed)
+                return compressed
+        else:
+            redis = None
+
+        self.misses += 1
+        if len(body) > THREAD_THRESHOLD:
+            compressed = await asyncio.to_thread(_compress, body, encoding)
+        else:
+            compressed = _compress(body, encoding)
+
+        self._remember(key, compressed)
+        if redis is not None:
+            try:
+                await redis.set(redis_key, compressed, ex=REDIS_TTL)
+            except Exception:
+                pass
+
+        return compressed
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI compression middleware. ``redis`` returns the redis connection to share
+    compressed bodies through for a request scope (or None)
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        cache_bytes: int = 32 * 1024 * 1024,
+        redis: Optional[Callable[[Scope], Any]] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = CompressedCache(cache_bytes)
+        self.redis = redis
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if not encoding:
+            return await self.app(scope, receive, send)
+
+        start_message: Message | None = None
+        passthrough = False
+        stream: _StreamCompressor | None = None
+
+        async def _send(message: Message):
+            nonlocal start_message, passthrough, stream
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith("text/event-stream")
+                ):
+                    passthrough = True
+                    return await send(message)
+                # Hold back until the first body message says if the body is streamed
+                start_message = message
+                MutableHeaders(scope=start_message).add_vary_header("Accept-Encoding")
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if stream:
+                # Rest of a streamed body
+                if len(body) > THREAD_THRESHOLD:
+                    compressed = await asyncio.to_thread(stream.compress, body)
+                else:
+                    compressed = stream.compress(body)
+                if not more_body:
+                    compressed += stream.finish()
+                return await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+            headers = MutableHeaders(scope=start_message)
+
+            if more_body:
+                # Streamed body (e.g. StreamingResponse), compress as it goes
+                stream = _StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                await send(start_message)
+                return await _send(message)
+
+            if len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                return await send(message)
+
+            redis = self.redis(scope) if self.redis else None
+            compressed = await self.cache.get(body, encoding, redis)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, _send)
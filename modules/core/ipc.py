@@ -4,7 +4,8 @@ import uuid
 from typing import Sequence
 import orjson
 from loguru import logger
-import aiohttp
+
+from modules.core import timing
 
 async def redis_ipc_new(
     redis,
@@ -15,7 +16,13 @@ async def redis_ipc_new(
     *_,
     **__,
 ):
+    with timing.segment("ipc"):
+        return await _redis_ipc_new(redis, cmd, msg, timeout, args)
+
+async def _redis_ipc_new(redis, cmd: str, msg: dict, timeout: int, args: Sequence[str]):
     if cmd == "GETCH":
+        import aiohttp
+
         async with aiohttp.ClientSession() as sess:
             async with sess.get(f"http://localhost:1234/getch/{args[0]}") as res:
                 if res.status == 404:
@@ -27,6 +34,9 @@ async def redis_ipc_new(
             msg["embed"] = {"type": "rich", "title": "Baypaw Message"}
         if not msg.get("mention_roles"):
             msg["mention_roles"] = []
+
+        import aiohttp
+
         async with aiohttp.ClientSession() as sess:
             async with sess.post(f"http://localhost:1234/messages", json=msg) as res:
                 return await res.text()
@@ -0,0 +1,174 @@
+"""
+Toolkit for data migrations run by ``db.apply``
+
+A migration streams the rows it needs through a server side cursor (in one read
+only snapshot) and handles them in chunks. Each chunk is written in its own
+transaction together with a checkpoint of the last key handled, so an interrupted
+migration resumes where it stopped when run again. Set DRY_RUN to roll every chunk
+back instead (so nothing is written, checkpoints included: the checkpoint table is
+neither created nor cleared by RESTART in a dry run)
+
+Migrations opt in by accepting a ``migrator`` argument in ``apply``::
+
+    async def apply(postgres, redis, logger, migrator):
+        async def _handle(conn, rows):
+            await conn.executemany("UPDATE ...", [(row["a"], row["b"]) for row in rows])
+
+        await migrator.run(
+            "SELECT id, a, b FROM t WHERE id > $1::bigint ORDER BY id",
+            key="id",
+            start="0",
+            handle=_handle,
+            count="SELECT COUNT(*) FROM t",
+        )
+"""
+import time
+from typing import Awaitable, Callable, Optional
+
+import asyncpg
+
+CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS _migration_checkpoints (
+    name TEXT PRIMARY KEY,
+    last_key TEXT NOT NULL,
+    rows BIGINT NOT NULL DEFAULT 0,
+    done BOOLEAN NOT NULL DEFAULT false,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+
+class _DryRun(Exception):
+    """Raised to roll back a chunk in dry run mode"""
+
+
+class Migrator:
+    def __init__(
+        self,
+        postgres: asyncpg.Pool,
+        logger,
+        *,
+        name: str,
+        chunk_size: int = 5000,
+        dry_run: bool = False,
+        restart: bool = False,
+    ):
+        self.postgres = postgres
+        self.logger = logger
+        self.name = name
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.restart = restart
+
+    async def _checkpoint(self, conn, step: str) -> Optional[asyncpg.Record]:
+        if self.dry_run:
+            # Write free: existing checkpoints are only read (RESTART just ignores them)
+            if self.restart or not await conn.fetchval("SELECT to_regclass('_migration_checkpoints') IS NOT NULL"):
+                return None
+        else:
+            await conn.execute(CHECKPOINTS)
+            if self.restart:
+                await conn.execute("DELETE FROM _migration_checkpoints WHERE name = $1", step)
+                return None
+        return await conn.fetchrow(
+            "SELECT last_key, rows, done FROM _migration_checkpoints WHERE name = $1",
+            step,
+        )
+
+    async def run(
+        self,
+        query: str,
+        *,
+        key: str,
+        start: str,
+        handle: Callable[[asyncpg.Connection, list[asyncpg.Record]], Awaitable[None]],
+        count: Optional[str] = None,
+        step: str = "default",
+    ) -> int:
+        """
+        Streams the rows of ``query`` to ``handle`` in chunks. ``query`` must select
+        rows with ``key`` greater than ``$1`` ordered by ``key`` (``$1`` is passed as
+        text so cast it). ``start`` is the key to start after on the first run.
+        Returns the number of rows handled. Use ``step`` for migrations with more than
+        one run
+        """
+        step = f"{self.name}:{step}"
+
+        async with self.postgres.acquire() as write_conn:
+            checkpoint = await self._checkpoint(write_conn, step)
+            if checkpoint and checkpoint["done"]:
+                self.logger.info(f"{step} was already applied, set RESTART to run it again")
+                return 0
+
+            last_key = checkpoint["last_key"] if checkpoint else start
+            handled = checkpoint["rows"] if checkpoint else 0
+            if checkpoint:
+                self.logger.info(f"Resuming {step} after key {last_key} ({handled} rows already done)")
+
+            total = None
+            if count:
+                total = await write_conn.fetchval(count)
+
+            start_time = time.monotonic()
+            handled_now = 0
+
+            async def _write(chunk: list[asyncpg.Record]):
+                nonlocal last_key, handled, handled_now
+
+                chunk_key = str(chunk[-1][key])
+                try:
+                    async with write_conn.transaction():
+                        await handle(write_conn, chunk)
+                        if self.dry_run:
+                            raise _DryRun()
+                        await write_conn.execute(
+                            """INSERT INTO _migration_checkpoints (name, last_key, rows, updated_at)
+                            VALUES ($1, $2, $3, NOW())
+                            ON CONFLICT (name) DO UPDATE SET last_key = $2, rows = $3, updated_at = NOW()""",
+                            step,
+                            chunk_key,
+                            handled + len(chunk),
+                        )
+                except _DryRun:
+                    pass
+
+                last_key = chunk_key
+                handled += len(chunk)
+                handled_now += len(chunk)
+                self._progress(step, handled, handled_now, total, start_time)
+
+            async with self.postgres.acquire() as read_conn:
+                async with read_conn.transaction(isolation="repeatable_read", readonly=True):
+                    chunk = []
+                    async for row in read_conn.cursor(query, last_key, prefetch=self.chunk_size):
+                        chunk.append(row)
+                        if len(chunk) >= self.chunk_size:
+                            await _write(chunk)
+                            chunk = []
+                    if chunk:
+                        await _write(chunk)
+
+            if not self.dry_run:
+                await write_conn.execute(
+                    """INSERT INTO _migration_checkpoints (name, last_key, rows, done)
+                    VALUES ($1, $2, $3, true)
+                    ON CONFLICT (name) DO UPDATE SET done = true, updated_at = NOW()""",
+                    step,
+                    last_key,
+                    handled,
+                )
+
+        elapsed = time.monotonic() - start_time
+        mode = " (dry run, nothing was written)" if self.dry_run else ""
+        self.logger.success(f"{step}: handled {handled_now} rows in {elapsed:.1f}s{mode}")
+        return handled_now
+
+    def _progress(self, step: str, handled: int, handled_now: int, total: Optional[int], start_time: float):
+        elapsed = time.monotonic() - start_time
+        rate = handled_now / elapsed if elapsed else 0
+        msg = f"{step}: {handled} rows ({rate:.0f}/s)"
+        if total:
+            msg += f", {min(handled / total, 1) * 100:.1f}%"
+            if rate:
+                msg += f", ETA {max(total - handled, 0) / rate:.0f}s"
+        self.logger.info(msg)
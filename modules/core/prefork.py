@@ -0,0 +1,261 @@
+"""
+Prefork process supervisor for the Fates List site
+
+The parent binds the listening socket and loads everything that can be shared
+(static assets etc.) *before* forking so workers get them copy-on-write.
+Workers all accept on the same socket and are restarted if they die
+
+Reloads (SIGHUP or ``flamepaw --cmd site.reload``) are zero-downtime: a new
+supervisor is exec'd with the listening socket passed down, and only once all
+of its workers are up and warm does it tell the old supervisor to drain and exit.
+The socket is never closed so no connections are refused
+"""
+import asyncio
+import gc
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+# Workers dying faster than this after starting are considered to be crash looping
+MIN_WORKER_LIFETIME = 5
+MAX_RESTART_DELAY = 30
+
+# How long a new supervisor may take to get all its workers ready on reload
+READY_TIMEOUT = 120
+
+LISTEN_FD_ENV = "FATES_LISTEN_FD"
+OLD_MASTER_ENV = "FATES_OLD_MASTER"
+
+
+def pidfile() -> Path:
+    return Path(os.environ.get("PIDFILE") or "data/site.pid")
+
+
+def inherited_socket() -> socket.socket | None:
+    """Returns the listening socket passed down by the previous supervisor on reload"""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is None:
+        return None
+    sock = socket.socket(fileno=int(fd))
+    sock.set_inheritable(True)
+    return sock
+
+
+def bind_socket(bind: str, backlog: int = 2048) -> socket.socket:
+    """
+    Binds the site socket. ``bind`` is either ``host:port`` or ``unix:/path/to/sock``
+    (``unix`` on its own means ``~/fates.sock``)
+    """
+    if bind == "unix" or bind.startswith("unix:"):
+        path = Path(bind[5:] or "~/fates.sock").expanduser()
+        try:
+            path.unlink()  # Stale socket from a previous run
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(str(path))
+        path.chmod(0o777)
+    else:
+        host, port = bind.rsplit(":", 1)
+        host = host.strip("[]")
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, int(port)))
+
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_worker(app, sock: socket.socket, log_level: str = "info", ready_fd: int | None = None):
+    """
+    Runs a single uvicorn server on an already bound socket (blocking).
+
+    If ``ready_fd`` is set, a byte is written to it once startup (pools,
+    widget pre-warm etc.) is done and the worker is accepting requests
+    """
+    import uvicorn
+
+    config = uvicorn.Config(app, log_level=log_level)
+    server = uvicorn.Server(config)
+
+    async def _serve():
+        serve_task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started and not serve_task.done():
+            await asyncio.sleep(0.05)
+        if server.started and ready_fd is not None:
+            os.write(ready_fd, b"r")
+        await serve_task
+
+    config.setup_event_loop()
+    asyncio.run(_serve())
+
+
+class Supervisor:
+    """Forks and supervises ``workers`` uvicorn processes sharing one socket"""
+    def __init__(self, app, sock: socket.socket, workers: int, *, log_level: str = "info"):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children: dict[int, float] = {}  # pid -> start time
+        self.stopping = False
+        self.crashes = 0
+        self.successor: int | None = None  # New supervisor during a reload
+        self.ready_r, self.ready_w = os.pipe()
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # Use default signal handling, uvicorn installs its own
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    signal.signal(sig, signal.SIG_DFL)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                os.close(self.ready_r)
+                serve_worker(self.app, self.sock, self.log_level, ready_fd=self.ready_w)
+            except BaseException as exc:  # pylint: disable=broad-except
+                logger.exception(f"Worker {os.getpid()} crashed: {exc}")
+                code = 1
+            finally:
+                os._exit(code)  # Never run the parents cleanup in a child
+
+        self.children[pid] = time.time()
+        logger.info(f"Spawned worker {pid}")
+        return pid
+
+    def stop(self, *_):
+        """Gracefully stops all workers. uvicorn drains in-flight requests on SIGTERM"""
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info("Stopping workers...")
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload(self, *_):
+        """Starts a new supervisor (with fresh code) that takes over the socket once ready"""
+        if self.stopping or self.successor:
+            logger.warning("Ignoring reload as one is already in progress or we are stopping")
+            return
+
+        env = os.environ | {
+            LISTEN_FD_ENV: str(self.sock.fileno()),
+            OLD_MASTER_ENV: str(os.getpid()),
+        }
+        cmd = "from modules.core._manage import site_run; site_run()"
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.execve(sys.executable, [sys.executable, "-c", cmd], env)
+            finally:
+                os._exit(1)
+
+        self.successor = pid
+        logger.info(f"Reloading, started new supervisor {pid}")
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        """Waits for all workers to finish starting up"""
+        ready = 0
+        deadline = time.time() + timeout
+        while ready < self.workers and time.time() < deadline and not self.stopping:
+            readable, _, _ = select.select([self.ready_r], [], [], 1)
+            if readable:
+                ready += len(os.read(self.ready_r, 64))
+
+            # Workers dying during startup means this generation is broken
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                code = os.waitstatus_to_exitcode(status)
+                logger.error(f"Worker {pid} exited with code {code} during startup")
+                self.children.pop(pid, None)
+                return False
+        return ready >= self.workers
+
+    def _reap(self, pid: int, status: int):
+        if pid == self.successor:
+            # The new supervisor only exits by itself if it failed to start
+            logger.error(f"Reload failed, new supervisor exited with code {os.waitstatus_to_exitcode(status)}")
+            self.successor = None
+            return
+
+        started = self.children.pop(pid, None)
+        if started is None:
+            return
+
+        code = os.waitstatus_to_exitcode(status)
+
+        if self.stopping:
+            logger.info(f"Worker {pid} exited with code {code}")
+            return
+
+        if time.time() - started < MIN_WORKER_LIFETIME:
+            self.crashes += 1
+        else:
+            self.crashes = 0
+
+        delay = min(2 ** self.crashes - 1, MAX_RESTART_DELAY)
+        logger.warning(f"Worker {pid} died with code {code}, restarting in {delay}s")
+        time.sleep(delay)
+        if not self.stopping:
+            self.spawn()
+
+    def run(self):
+        """Spawns the workers and blocks until all of them have exited"""
+        # Move everything loaded so far out of the GC's way so collections
+        # in workers don't touch (and copy) the shared pages
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)  # Can't reload until we're up
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        if not self.wait_ready():
+            logger.error("Workers failed to start up, giving up")
+            self.stop()
+            self._wait_children()
+            sys.exit(1)
+
+        logger.success(f"All {self.workers} workers are ready")
+
+        old_master = os.environ.pop(OLD_MASTER_ENV, None)
+        if old_master:
+            logger.info(f"Taking over from supervisor {old_master}, it will now drain and exit")
+            try:
+                os.kill(int(old_master), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        pidfile().write_text(str(os.getpid()))
+        signal.signal(signal.SIGHUP, self.reload)
+
+        self._wait_children()
+
+        # Only remove the pidfile if a new supervisor hasn't taken over
+        if pidfile().exists() and pidfile().read_text() == str(os.getpid()):
+            pidfile().unlink()
+
+        logger.success("All workers exited")
+
+    def _wait_children(self):
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self._reap(pid, status)
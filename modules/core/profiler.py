@@ -0,0 +1,255 @@
+"""
+Opt-in profiling for site workers. Everything here is disabled unless PROFILING
+is set to a secret token, which must then be sent in the ``X-Fates-Profile`` header
+
+- Sending the header on any request samples the event loop whenever that request
+  is running. The response gets an ``X-Profile-Id`` header and the folded stacks
+  (for flamegraph.pl or speedscope) can be fetched from ``/_profiler/profiles/{id}``
+- ``/_profiler/tracemalloc/*`` starts and stops tracemalloc and diffs heap snapshots
+  of the worker that serves the request (pass ``pid`` to make sure it's the right one,
+  keep-alive connections always go to the same worker)
+- If PROFILING_CONTINUOUS is set (in seconds), the whole worker is sampled at a low
+  rate and aggregated stacks are written to ``data/profiles`` every period
+"""
+import asyncio
+import collections
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from loguru import logger
+
+PROFILE_HEADER = "X-Fates-Profile"
+
+# Sampling intervals (in seconds) while a request is being profiled and otherwise
+REQUEST_INTERVAL = 0.001
+CONTINUOUS_INTERVAL = 0.05
+
+PROFILE_EXPIRY = 60 * 60
+MAX_PROFILE_FILES = 100  # Per worker
+
+
+class Profiler:
+    """Stack sampler for the event loop thread of a worker"""
+    def __init__(self, token: str, redis, *, continuous: float = 0, out_dir: str = "data/profiles"):
+        self.token = token
+        self.redis = redis
+        self.continuous = continuous
+        self.out_dir = Path(out_dir)
+
+        # Must be made on the event loop thread
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+
+        self.active: dict[asyncio.Task, collections.Counter] = {}
+        self.aggregate: collections.Counter = collections.Counter()
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+
+        self._labels: dict = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, redis) -> Optional["Profiler"]:
+        token = os.environ.get("PROFILING")
+        if not token:
+            return None
+        return cls(token, redis, continuous=float(os.environ.get("PROFILING_CONTINUOUS") or 0))
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(token) and secrets.compare_digest(token, self.token)
+
+    def start(self):
+        """Starts continuous sampling (if enabled)"""
+        if self.continuous:
+            logger.info(f"Continuous profiling enabled, writing stacks every {self.continuous}s")
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="fates-profiler", daemon=True)
+                self._thread.start()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _fold(self, frame) -> str:
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return ";".join(stack)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._lock:
+                if not self.active and not self.continuous:
+                    self._thread = None
+                    return
+                interval = REQUEST_INTERVAL if self.active else CONTINUOUS_INTERVAL
+
+            time.sleep(interval)
+
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            if frame is None:
+                continue
+            stack = self._fold(frame)
+            del frame
+
+            task = asyncio.current_task(self.loop)
+            with self._lock:
+                samples = self.active.get(task)
+                if samples is not None:
+                    samples[stack] += 1
+                if self.continuous:
+                    self.aggregate[stack] += 1
+
+            if self.continuous and time.monotonic() - last_flush >= self.continuous:
+                last_flush = time.monotonic()
+                self._flush()
+
+    def _flush(self):
+        with self._lock:
+            aggregate, self.aggregate = self.aggregate, collections.Counter()
+        if not aggregate:
+            return
+
+        pid = os.getpid()
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            path = self.out_dir / f"{pid}-{int(time.time())}.folded"
+            path.write_text(fold(aggregate))
+
+            old = sorted(self.out_dir.glob(f"{pid}-*.folded"))[:-MAX_PROFILE_FILES]
+            for file in old:
+                file.unlink(missing_ok=True)
+        except OSError as exc:
+            logger.warning(f"Could not write profile: {exc}")
+
+    def begin(self) -> asyncio.Task:
+        """Starts profiling the current request (task)"""
+        task = asyncio.current_task()
+        with self._lock:
+            self.active[task] = collections.Counter()
+        self._ensure_thread()
+        return task
+
+    async def end(self, task: asyncio.Task, profile_id: str):
+        """Stops profiling the request and stores the result under ``profile_id``"""
+        with self._lock:
+            samples = self.active.pop(task, None)
+        if samples is None:
+            return
+        # Stored in redis as the profile can be fetched through any worker
+        await self.redis.set(f"profile:{profile_id}", fold(samples), ex=PROFILE_EXPIRY)
+
+
+def fold(samples: collections.Counter) -> str:
+    """Returns samples in folded stack format (``frame;frame;frame count`` per line)"""
+    return "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
+
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex
+
+
+router = APIRouter(
+    prefix="/_profiler",
+    include_in_schema=False,
+)
+
+def _profiler(request: Request, pid: Optional[int] = None) -> Profiler:
+    """Returns the profiler, 404ing if profiling is disabled or the token is wrong"""
+    profiler = request.app.state.worker_session.profiler
+    if not profiler or not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=404)
+    if pid and pid != os.getpid():
+        raise HTTPException(status_code=409, detail=f"Served by worker {os.getpid()}, not {pid}")
+    return profiler
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    profiler = _profiler(request)
+    profile = await profiler.redis.get(f"profile:{profile_id}")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    return PlainTextResponse(profile)
+
+@router.get("/aggregate")
+async def get_aggregate(request: Request, pid: Optional[int] = None):
+    """Stacks sampled by the continuous profiler since the last write to disk"""
+    profiler = _profiler(request, pid)
+    with profiler._lock:  # pylint: disable=protected-access
+        samples = profiler.aggregate.copy()
+    return PlainTextResponse(fold(samples), headers={"X-PID": str(os.getpid())})
+
+@router.post("/tracemalloc/start")
+async def tracemalloc_start(request: Request, frames: int = 10, pid: Optional[int] = None):
+    profiler = _profiler(request, pid)
+    if tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is already running")
+    tracemalloc.start(frames)
+    profiler.snapshot = None
+    return {"pid": os.getpid(), "frames": frames}
+
+@router.post("/tracemalloc/snapshot")
+async def tracemalloc_snapshot(request: Request, limit: int = 25, key_type: str = "lineno", pid: Optional[int] = None):
+    """
+    Takes a heap snapshot. The top allocations are returned for the first snapshot
+    and the top differences against the previous snapshot after that
+    """
+    profiler = _profiler(request, pid)
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not running")
+    if key_type not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key_type must be lineno, filename or traceback")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+    if profiler.snapshot is None:
+        stats = [
+            {"trace": str(stat.traceback), "size": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(key_type)[:limit]
+        ]
+    else:
+        stats = [
+            {
+                "trace": str(stat.traceback),
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(profiler.snapshot, key_type)[:limit]
+        ]
+
+    diffed = profiler.snapshot is not None
+    profiler.snapshot = snapshot
+    current, peak = tracemalloc.get_traced_memory()
+
+    return {"pid": os.getpid(), "diff": diffed, "current": current, "peak": peak, "stats": stats}
+
+@router.post("/tracemalloc/stop")
+async def tracemalloc_stop(request: Request, pid: Optional[int] = None):
+    profiler = _profiler(request, pid)
+    tracemalloc.stop()
+    profiler.snapshot = None
+    return {"pid": os.getpid()}
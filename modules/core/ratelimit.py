@@ -0,0 +1,228 @@
+"""
+Distributed rate limiting for the site
+
+Every client (see ``rl_key_func``) gets a token bucket in redis that holds up to
+RL_CAPACITY tokens and refills at RL_RATE tokens a second. Routes take tokens by
+calling ``ratelimit(request, action)`` where the cost of each action is in ``COSTS``
+(uncached renders cost much more than cached hits). The bucket is updated atomically
+by a Lua script using the redis clock so workers never disagree on time.
+
+To avoid a round trip per request, each worker may spend up to 1/workers of the
+tokens redis last said a client had without asking again. Tokens spent locally are
+charged to redis in the background, so until they are a client can overshoot its
+limit by at most that local budget
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from loguru import logger
+
+# Cost in tokens of each action
+COSTS = {
+    "default": 1,
+    "widget": 1,
+    "widget_render": 10,
+}
+
+FLUSH_INTERVAL = 1
+MAX_LOCAL_KEYS = 50000
+
+# KEYS[1] = bucket, ARGV = capacity, rate, cost, debt
+# Debt (tokens already spent locally) is always charged, cost only if there are enough tokens.
+# Returns whether cost was charged and the tokens left
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local debt = tonumber(ARGV[4])
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+tokens = math.max(-capacity, tokens - debt)
+
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+
+return {allowed, tostring(tokens)}
+"""
+
+
+class _LocalBucket:
+    __slots__ = ("tokens", "synced_at", "pending")
+
+    def __init__(self, tokens: float, synced_at: float):
+        self.tokens = tokens  # As of the last sync with redis
+        self.synced_at = synced_at
+        self.pending = 0  # Spent locally but not charged to redis yet
+
+
+class RateLimiter:
+    def __init__(self, redis, key_func, *, capacity: float, rate: float, workers: int):
+        self.redis = redis
+        self.key_func = key_func  # Returns the key (client) to ratelimit a request by
+        self.capacity = capacity
+        self.rate = rate
+        self.workers = max(1, workers)
+        self.local: dict[str, _LocalBucket] = {}
+        self.script = redis.register_script(TOKEN_BUCKET)
+        self._task: Optional[asyncio.Task] = None
+        self._last_error = 0.0
+
+    @classmethod
+    def from_env(cls, redis, key_func, workers: int) -> Optional["RateLimiter"]:
+        """Returns None if rate limiting is disabled (RATELIMIT=0)"""
+        if os.environ.get("RATELIMIT") == "0":
+            return None
+        return cls(
+            redis,
+            key_func,
+            capacity=float(os.environ.get("RL_CAPACITY") or 120),
+            rate=float(os.environ.get("RL_RATE") or 2),
+            workers=workers,
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+
+    def _estimate(self, bucket: _LocalBucket, now: float) -> float:
+        return min(self.capacity, bucket.tokens + (now - bucket.synced_at) * self.rate)
+
+    @staticmethod
+    def _take_debt(bucket: _LocalBucket) -> float:
+        """
+        Moves what was spent locally out of ``pending`` before it is charged to redis, so
+        concurrent hits/flushes never charge the same tokens twice. Until redis answers
+        the debt is taken off the local tokens instead
+        """
+        debt, bucket.pending = bucket.pending, 0
+        bucket.tokens -= debt
+        return debt
+
+    @staticmethod
+    def _return_debt(bucket: _LocalBucket, debt: float):
+        """Charging ``debt`` failed, it is charged again by the next sync"""
+        bucket.pending += debt
+        bucket.tokens += debt
+
+    async def hit(self, key: str, cost: int) -> tuple[bool, float]:
+        """Takes ``cost`` tokens from the bucket of ``key``. Returns whether allowed and the tokens left"""
+        now = time.monotonic()
+        bucket = self.local.get(key)
+
+        if bucket is not None:
+            # Our share of what the client had left at the last sync
+            budget = self._estimate(bucket, now) / self.workers
+            if bucket.pending + cost <= budget:
+                bucket.pending += cost
+                return True, self._estimate(bucket, now) - bucket.pending
+
+        debt = self._take_debt(bucket) if bucket else 0
+        try:
+            allowed, tokens = await self.script(
+                keys=[key],
+                args=[self.capacity, self.rate, cost, debt],
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            if bucket is not None:
+                self._return_debt(bucket, debt)
+            # Fail open, redis being down shouldn't take the site down with it
+            if now - self._last_error > 60:
+                self._last_error = now
+                logger.warning(f"Rate limiter unavailable, allowing requests: {exc}")
+            return True, self.capacity
+
+        tokens = float(tokens)
+        if bucket is not None:
+            bucket.tokens, bucket.synced_at = tokens, now
+        elif len(self.local) < MAX_LOCAL_KEYS:
+            self.local[key] = _LocalBucket(tokens, now)
+
+        return bool(allowed), tokens
+
+    async def flush(self):
+        """Charges tokens spent locally to redis and forgets idle clients"""
+        now = time.monotonic()
+        idle_after = self.capacity / self.rate
+
+        pending = []
+        for key, bucket in list(self.local.items()):
+            if bucket.pending:
+                pending.append((key, bucket, self._take_debt(bucket)))
+            elif now - bucket.synced_at > idle_after:
+                del self.local[key]
+
+        if not pending:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, bucket, debt in pending:
+                    await self.script(keys=[key], args=[self.capacity, self.rate, 0, debt], client=pipe)
+                results = await pipe.execute()
+        except BaseException:
+            for _, bucket, debt in pending:
+                self._return_debt(bucket, debt)
+            raise
+
+        for (_, bucket, _), (_, tokens) in zip(pending, results):
+            bucket.tokens, bucket.synced_at = float(tokens), now
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning(f"Could not flush rate limits: {exc}")
+
+    def headers(self, tokens: float, cost: int, allowed: bool) -> dict:
+        """RateLimit-* headers (and Retry-After when limited)"""
+        remaining = max(0, math.floor(tokens))
+        headers = {
+            "RateLimit-Limit": str(int(self.capacity)),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(math.ceil(max(0, self.capacity - tokens) / self.rate)),
+        }
+        if not allowed:
+            headers["Retry-After"] = str(math.ceil(max(0, cost - tokens) / self.rate))
+        return headers
+
+
+async def ratelimit(request: Request, action: str = "default"):
+    """
+    Charges the client for ``action``, raising a 429 if it is over its limit.
+    The RateLimit-* headers are added to the response by the request handler
+    """
+    limiter = request.app.state.worker_session.ratelimiter
+    if not limiter:
+        return
+
+    cost = COSTS.get(action, COSTS["default"])
+    allowed, tokens = await limiter.hit(await limiter.key_func(request), cost)
+    headers = limiter.headers(tokens, cost, allowed)
+
+    if not allowed:
+        raise HTTPException(status_code=429, detail="You are being ratelimited", headers=headers)
+
+    request.state.ratelimit_headers = headers
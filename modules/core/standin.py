@@ -0,0 +1,184 @@
+"""
+Local stand-in for the flamepaw IPC worker (``_worker_fates``) and the
+baypaw HTTP service on localhost:1234.
+
+Neither of these exist on a dev or CI box, so this lets benchmarks and load
+tests drive ``redis_ipc_new`` and the HTTP endpoints end to end on one machine.
+Start it with ``flamepaw --cmd site.standin``
+"""
+import asyncio
+import hashlib
+import random
+import time
+from typing import Optional
+
+import orjson
+from loguru import logger
+
+WORKER_CHANNEL = "_worker_fates"
+COMMAND_EXPIRY = 30  # Same as commandExpiryTime in flamepaw/ipc/ipc.go
+
+default_fixtures = {
+    # user_id -> user (as returned by GETCH)
+    "users": {},
+    # user_id -> staff perms (as returned by GETPERM) or just a perm number
+    "perms": {},
+    # If set, GETCH on users not in fixtures 404s instead of making one up
+    "strict": False,
+    "docs": "# Stand-in docs\n\nThese docs are served by the local IPC stand-in",
+}
+
+
+class StandinConfig:
+    """Stand-in tuning knobs. Latencies are in milliseconds"""
+    def __init__(
+        self,
+        *,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        fixtures: Optional[dict] = None,
+        host: str = "127.0.0.1",
+        port: int = 1234,
+        redis_url: str = "redis://localhost:1001",
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures = default_fixtures | (fixtures or {})
+        self.host = host
+        self.port = port
+        self.redis_url = redis_url
+
+    async def delay(self):
+        """Sleeps for the configured latency (plus jitter)"""
+        latency = self.latency + random.uniform(0, self.jitter)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def _fake_user(user_id: str) -> dict:
+    """Deterministic fake user so any id can be benchmarked"""
+    digest = hashlib.sha1(user_id.encode()).hexdigest()
+    return {
+        "id": user_id,
+        "username": f"standin-{digest[:8]}",
+        "avatar": "https://cdn.discordapp.com/embed/avatars/0.png",
+        "disc": str(int(digest[8:12], 16) % 10000).zfill(4),
+        "status": 0,
+        "bot": int(digest[12], 16) % 2 == 0,
+    }
+
+
+def getch(config: StandinConfig, user_id: str) -> Optional[dict]:
+    users = config.fixtures["users"]
+    if user_id not in users and config.fixtures.get("strict"):
+        return None
+    return users.get(user_id) or _fake_user(user_id)
+
+
+def getperm(config: StandinConfig, user_id: str) -> dict:
+    perm = config.fixtures["perms"].get(user_id)
+    if perm is None:
+        return {"fname": "Unknown", "id": "0", "staff_id": "0", "perm": 0}
+    if isinstance(perm, int):
+        return {"fname": "Stand-in", "id": str(perm), "staff_id": "0", "perm": perm}
+    return perm
+
+
+async def _http_server(config: StandinConfig):
+    """Serves the baypaw endpoints used by GETCH and SENDMSG"""
+    from aiohttp import web
+
+    async def _getch(request: web.Request):
+        await config.delay()
+        if config.should_fail():
+            return web.Response(status=503, text="Stand-in injected error")
+        user = getch(config, request.match_info["user_id"])
+        if not user:
+            return web.Response(status=404, text="Not Found")
+        return web.Response(body=orjson.dumps(user), content_type="application/json")
+
+    async def _messages(request: web.Request):
+        await config.delay()
+        if config.should_fail():
+            return web.Response(status=503, text="Stand-in injected error")
+        msg = await request.json()
+        logger.debug(f"SENDMSG to {msg.get('channel_id')}: {msg.get('content')}")
+        return web.Response(text="OK")
+
+    app = web.Application()
+    app.add_routes([
+        web.get("/getch/{user_id}", _getch),
+        web.post("/messages", _messages),
+    ])
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, config.host, config.port)
+    await site.start()
+    logger.info(f"Stand-in HTTP service listening on {config.host}:{config.port}")
+    return runner
+
+
+async def _handle_ipc(config: StandinConfig, redis, payload: str):
+    op = payload.split(" ")
+    if len(op) < 2:
+        return
+
+    cmd, cmd_id, args = op[0], op[1], op[2:]
+
+    if cmd == "PING":
+        res = "PONG V3 0"
+    elif cmd == "GETPERM" and len(args) == 1:
+        res = orjson.dumps(getperm(config, args[0]))
+    elif cmd == "DOCS":
+        res = config.fixtures["docs"]
+    else:
+        return
+
+    await config.delay()
+
+    if config.should_fail():
+        # The real worker never answers on failure, callers just time out
+        logger.debug(f"Dropping {cmd} {cmd_id} (injected error)")
+        return
+
+    await redis.set(cmd_id, res, ex=COMMAND_EXPIRY)
+
+
+async def run_standin(config: StandinConfig):
+    """Runs the stand-in until cancelled"""
+    import aioredis
+
+    redis = aioredis.from_url(config.redis_url, db=1)
+    runner = await _http_server(config)
+
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(WORKER_CHANNEL)
+    logger.info(f"Stand-in IPC worker subscribed to {WORKER_CHANNEL}")
+
+    tasks = set()
+    start_time = time.time()
+    handled = 0
+
+    try:
+        async for msg in pubsub.listen():
+            if msg["type"] != "message":
+                continue
+            data = msg["data"]
+            if isinstance(data, bytes):
+                data = data.decode()
+            # Handle concurrently like the go worker does
+            task = asyncio.create_task(_handle_ipc(config, redis, data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            handled += 1
+    finally:
+        logger.info(f"Handled {handled} IPC messages in {time.time() - start_time:.1f}s")
+        await pubsub.unsubscribe(WORKER_CHANNEL)
+        await runner.cleanup()
+        await redis.close()
@@ -2,48 +2,116 @@
 """Fates List System Bootstrapper"""
 import asyncio
 import builtins
+import contextlib
 import datetime
+import functools
+import hashlib
 import importlib
+import inspect
+import ipaddress
 import os
 import signal
 import sys
 import time
 import uuid
+from pathlib import Path
+from typing import Optional, Sequence
 
 import aioredis
 import asyncpg
-import sentry_sdk
+import fastapi
+import orjson
 from fastapi import FastAPI, Request
-from fastapi.responses import PlainTextResponse, HTMLResponse
 from fastapi.routing import APIRoute
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from loguru import logger
+from modules.core import timing
+from modules.core.admission import RETRY_AFTER, AdmissionControl, LoopMonitor
+from modules.core.admission import router as admission_router
+from modules.core.compression import CompressionMiddleware
 from modules.core.ipc import redis_ipc_new
+from modules.core.profiler import Profiler, new_profile_id
+from modules.core.ratelimit import RateLimiter
 from modules.models import enums
 
 sys.pycache_prefix = "data/pycache"
 
-class FatesListRequestHandler(BaseHTTPMiddleware):
-    """Request Handler for Fates List"""
-    def __init__(self, app):
-        super().__init__(app)
-                        
-    async def dispatch(self, request, call_next):
-        """Run _dispatch, if that fails, log error and do exc handler"""
-        if request.headers.get("method"):
-            request.scope["method"] = request.headers.get("method", "GET")
-                               
-        start_time = time.time()
-        
-        response = await call_next(request)
-
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        response.headers["X-PID"] = str(os.getpid())
-           
-        return response if response else PlainTextResponse("Something went wrong!")
-        
+class FatesListRequestHandler:
+    """
+    Request Handler for Fates List
+
+    This is a pure ASGI middleware (and not a BaseHTTPMiddleware) so it 
+    doesn't add an extra task and body stream to every request
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile_token = None
+        for key, value in scope["headers"]:
+            if key == b"method" and value:
+                scope["method"] = value.decode("latin-1")
+            elif key == b"x-fates-profile":
+                profile_token = value.decode("latin-1")
+
+        worker_session = scope["app"].state.worker_session
+        admission = worker_session.admission
+        if not admission.admit():
+            return await _overloaded(send)
+
+        profiler = profile_id = None
+        if profile_token:
+            profiler = worker_session.profiler
+            if profiler and profiler.authorized(profile_token):
+                profile_id = new_profile_id()
+                profile_task = profiler.begin()
+
+        start_time = time.perf_counter()
+        timings, token = timing.start()
+
+        async def _send(message: Message):
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str(process_time))
+                headers.append("X-PID", str(os.getpid()))
+                headers.append("Server-Timing", timings.header(process_time))
+                if profile_id:
+                    headers.append("X-Profile-Id", profile_id)
+                ratelimit_headers = scope.get("state", {}).get("ratelimit_headers")
+                if ratelimit_headers:
+                    headers.update(ratelimit_headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            admission.release()
+            timing.stop(token)
+            if profile_id:
+                await profiler.end(profile_task, profile_id)
+
+async def _overloaded(send: Send):
+    """Sheds a request without running the app at all"""
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(RETRY_AFTER).encode()),
+            (b"x-pid", str(os.getpid()).encode()),
+        ],
+    })
+    await send({
+        "type": "http.response.body",
+        "body": orjson.dumps({"detail": "This worker is overloaded, please try again later"}),
+    })
+
 class FatesWorkerSession:  # pylint: disable=too-many-instance-attributes
     """Stores a worker session"""
 
@@ -52,19 +120,100 @@ class FatesWorkerSession:  # pylint: disable=too-many-instance-attributes
         *, 
         app: FastAPI,
         session_id: str,
-        postgres: asyncpg.Pool,
+        postgres: "FatesPool",
         redis: aioredis.Connection,
-        worker_count: int
+        worker_count: int,
+        profiler: Optional["Profiler"] = None,
+        ratelimiter: Optional["RateLimiter"] = None
     ):
         self.id = session_id
         self.postgres = postgres
         self.redis = redis
         self.worker_count = worker_count
         self.app = app
+        self.profiler = profiler  # None unless profiling is enabled
+        self.ratelimiter = ratelimiter  # None if ratelimiting is disabled
+        self.loop_monitor = LoopMonitor()
+        self.admission = AdmissionControl.from_env(self.loop_monitor)
 
         # Record basic stats and initially set workers to None
         self.start_time = time.time()
 
+    def pool_stats(self) -> dict:
+        """Returns stats on the postgres pool of this worker"""
+        return self.postgres.stats()
+
+    def loop_stats(self) -> dict:
+        """Returns event loop lag stats of this worker"""
+        return self.loop_monitor.stats()
+
+
+class FatesPool:
+    """
+    Thin wrapper around an asyncpg pool that records acquire latency and waiters.
+    Anything not defined here is passed through to the underlying pool
+    """
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+        self.waiters = 0
+        self.acquires = 0
+        self.acquire_time = 0.0
+        self.acquire_max = 0.0
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, *, timeout: float | None = None):
+        self.waiters += 1
+        start_time = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=timeout)
+        finally:
+            self.waiters -= 1
+
+        elapsed = time.perf_counter() - start_time
+        self.acquires += 1
+        self.acquire_time += elapsed
+        self.acquire_max = max(self.acquire_max, elapsed)
+
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    async def execute(self, query: str, *args, timeout: float | None = None):
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args, *, timeout: float | None = None):
+        async with self.acquire() as conn:
+            return await conn.executemany(command, args, timeout=timeout)
+
+    async def fetch(self, query: str, *args, timeout: float | None = None, record_class=None):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout, record_class=record_class)
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: float | None = None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args, timeout: float | None = None, record_class=None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout, record_class=record_class)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "waiters": self.waiters,
+            "acquires": self.acquires,
+            "acquire_avg_ms": (self.acquire_time / self.acquires * 1000) if self.acquires else 0,
+            "acquire_max_ms": self.acquire_max * 1000,
+        }
+
+    def __getattr__(self, name: str):
+        return getattr(self.pool, name)
+
 def fix_operation_ids(app) -> None:
     """
     Simplify operation IDs so that generated API docs are easier to link to.
@@ -75,46 +224,194 @@ def fix_operation_ids(app) -> None:
             if not route.operation_id or "__" in route.operation_id:
                 route.operation_id = route.name  # in this case, 'read_items'
 
+def _openapi_cache_path(app) -> Path:
+    """
+    The cached schema is keyed on everything that can change it: the source of
+    the modules defining routes, the models and the fastapi version
+    """
+    sources = {Path(enums.__file__).resolve()}
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            sources.add(Path(inspect.getsourcefile(route.endpoint)).resolve())
+
+    digest = hashlib.sha256(f"{fastapi.__version__} {app.title} {app.version}".encode())
+    for source in sorted(sources):
+        digest.update(source.read_bytes())
+
+    return Path(sys.pycache_prefix) / f"openapi-{digest.hexdigest()[:16]}.json"
+
+def load_openapi(app) -> None:
+    """
+    Loads the OpenAPI schema from the on-disk cache, generating (and caching)
+    it if the routes changed. Should be called only after all routes have been added
+    """
+    path = _openapi_cache_path(app)
+    try:
+        app.openapi_schema = orjson.loads(path.read_bytes())
+        return
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        pass
+
+    start_time = time.perf_counter()
+    # Operation IDs are only used in the schema so this can be skipped on a cache hit
+    fix_operation_ids(app)
+    schema = app.openapi()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for old in path.parent.glob("openapi-*.json"):
+        old.unlink(missing_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(orjson.dumps(schema))
+    tmp.replace(path)
+
+    logger.info(f"Generated OpenAPI schema in {time.perf_counter() - start_time:.2f}s")
+
+def setup_routes(app) -> None:
+    """
+    Adds all routers and loads the OpenAPI schema. This is called once when the app
+    is made (before workers are forked) so workers don't each have to do it
+    """
+    from modules.infra.widgets.widgets import router
+
+    # Before the widget router as /{target_id} would match /_stats too
+    app.include_router(admission_router)
+    app.include_router(router)
+
+    if os.environ.get("PROFILING"):
+        from modules.core.profiler import router as profiler_router
+
+        app.include_router(profiler_router)
+
+    load_openapi(app)
+
+def _compression_redis(scope):
+    """Compressed bodies are shared through the worker redis (once the worker session is up)"""
+    worker_session = getattr(scope["app"].state, "worker_session", None)
+    return worker_session.redis if worker_session else None
+
 async def init_fates_worker(app, session_id, workers):
     """
     On startup:
         - Initialize Postgres andRedis
         - Setup the ratelimiter and IPC worker protocols
         - Start repeated task for vote reminder posting
+
+    Set FAST_STARTUP to skip warming up widgets (they are then loaded on first use)
     """
     builtins.app = app
+    # Compress text responses (added first so the request handler times it too)
+    app.add_middleware(CompressionMiddleware, redis=_compression_redis)
+
     # Add request handler
     app.add_middleware(
         FatesListRequestHandler, 
     )
 
-    dbs = await setup_db()
+    from modules.infra.widgets.widgets import HOT_QUERIES, prewarm
+
+    dbs = await setup_db(workers, hot_queries=HOT_QUERIES)
 
     app.state.worker_session = FatesWorkerSession(
         app=app,
         session_id=session_id,
         postgres=dbs["postgres"],
         redis=dbs["redis"],
-        worker_count=workers
+        worker_count=workers,
+        profiler=Profiler.from_env(dbs["redis"]),
+        ratelimiter=RateLimiter.from_env(dbs["redis"], rl_key_func, workers)
     )
-               
-    # Include all routers
-    from modules.infra.widgets.widgets import router
-    app.include_router(router)
 
-    # Fix operation ids
-    fix_operation_ids(app)
+    app.state.worker_session.loop_monitor.start()
+    if app.state.worker_session.ratelimiter:
+        app.state.worker_session.ratelimiter.start()
+    if app.state.worker_session.profiler:
+        app.state.worker_session.profiler.start()
+
+    # Warm up before we start accepting requests (uvicorn only does so after startup)
+    if not os.environ.get("FAST_STARTUP"):
+        await prewarm()
 
     logger.success(
         f"Fates List worker (pid: {os.getpid()}) bootstrapped successfully!"
     )
 
 
+@functools.lru_cache(maxsize=1)
+def trusted_proxies() -> tuple:
+    """
+    Networks of the reverse proxies in front of the site (TRUSTED_PROXIES, comma
+    separated addresses or CIDRs, defaults to localhost)
+    """
+    proxies = os.environ.get("TRUSTED_PROXIES") or "127.0.0.1,::1"
+    return tuple(ipaddress.ip_network(proxy.strip(), strict=False) for proxy in proxies.split(",") if proxy.strip())
+
+def _is_trusted_proxy(host: str | None) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return False
+    return any(address in network for network in trusted_proxies())
+
 async def rl_key_func(request: Request) -> str:
-    return None
+    """
+    Returns the key to ratelimit a request by. This is the client IP as given
+    by cloudflare or the reverse proxy in front of the site, these headers are
+    only trusted when the request comes from a trusted proxy (see trusted_proxies)
+    """
+    ip = request.client.host if request.client else None
+    if _is_trusted_proxy(ip):
+        if request.headers.get("CF-Connecting-IP"):
+            ip = request.headers["CF-Connecting-IP"]
+        elif request.headers.get("X-Forwarded-For"):
+            # Rightmost address not added by one of our proxies, anything left of it is client supplied
+            for forwarded in reversed(request.headers["X-Forwarded-For"].split(",")):
+                ip = forwarded.strip()
+                if not _is_trusted_proxy(ip):
+                    break
+    return f"rl:{ip or 'unknown'}"
+
+def pool_config(workers: int) -> dict:
+    """
+    Postgres pool settings from the environment. 
+    
+    Every worker gets its own pool so by default PG_MAX_CONNECTIONS (the 
+    total budget for the site) is split between all workers
+    """
+    max_connections = int(os.environ.get("PG_MAX_CONNECTIONS", 80))
+    max_size = int(os.environ.get("PG_POOL_MAX") or max(2, max_connections // max(workers, 1)))
+    min_size = min(int(os.environ.get("PG_POOL_MIN", 2)), max_size)
+    return {
+        "min_size": min_size,
+        "max_size": max_size,
+        "max_queries": int(os.environ.get("PG_MAX_QUERIES", 50000)),
+        "max_inactive_connection_lifetime": float(os.environ.get("PG_MAX_INACTIVE", 300)),
+        "statement_cache_size": int(os.environ.get("PG_STATEMENT_CACHE", 1024)),
+        "max_cached_statement_lifetime": int(os.environ.get("PG_STATEMENT_LIFETIME", 0)),
+    }
+
+async def _init_connection(conn: asyncpg.Connection, hot_queries: Sequence[str]):
+    """Sets up codecs and warms the statement cache of a new pool connection"""
+    def _json_encoder(value):
+        # Already encoded json is passed through as is
+        return value if isinstance(value, str) else orjson.dumps(value).decode()
 
-async def setup_db():
+    for typ in ("json", "jsonb"):
+        await conn.set_type_codec(typ, encoder=_json_encoder, decoder=orjson.loads, schema="pg_catalog")
+
+    # Hot statements take a single id, 0 never matches anything but still gets the statement prepared and cached
+    for query in hot_queries:
+        await conn.fetchrow(query, 0)
+
+async def setup_db(workers: int = 1, *, hot_queries: Sequence[str] = ()):
     """Function to setup the asyncpg connection pool"""
-    postgres = await asyncpg.create_pool()
+    config = pool_config(workers)
+    start_time = time.perf_counter()
+    postgres = await asyncpg.create_pool(
+        init=functools.partial(_init_connection, hot_queries=hot_queries),
+        **config
+    )
+    logger.info(
+        f"Postgres pool ready with {postgres.get_size()} warm connections in {time.perf_counter() - start_time:.2f}s ({config})"
+    )
     redis = await aioredis.from_url('redis://localhost:1001', db=1)
-    return {"postgres": postgres, "redis": redis}
+    return {"postgres": FatesPool(postgres), "redis": redis}
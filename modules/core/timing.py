@@ -0,0 +1,56 @@
+"""Per-request timing segments used for the Server-Timing header"""
+import contextlib
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+SEGMENTS = ("db", "redis", "ipc", "render", "http")
+
+_request_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Accumulated time (in seconds) per segment for one request"""
+    __slots__ = ("segments",)
+
+    def __init__(self):
+        self.segments = dict.fromkeys(SEGMENTS, 0.0)
+
+    def add(self, name: str, elapsed: float):
+        self.segments[name] = self.segments.get(name, 0.0) + elapsed
+
+    def header(self, total: float) -> str:
+        """Returns the Server-Timing header value (durations are in ms)"""
+        parts = [
+            f"{name};dur={elapsed * 1000:.2f}"
+            for name, elapsed in self.segments.items() if elapsed
+        ]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def start() -> tuple[RequestTimings, object]:
+    """Starts collecting timings for the current request. Returns the timings and a token for ``stop``"""
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def stop(token):
+    _request_timings.reset(token)
+
+
+def record(name: str, elapsed: float):
+    """Records elapsed time for a segment. A no-op outside of a request"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(name, elapsed)
+
+
+@contextlib.contextmanager
+def segment(name: str):
+    """Times the wrapped block as ``name``. Works in both sync and async code"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start_time)
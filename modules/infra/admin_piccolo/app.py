@@ -1,5 +1,4 @@
 from base64 import b64decode
-from os import abort
 import pathlib
 from pickletools import int4
 import random
@@ -12,31 +11,39 @@ from typing import Any, Union
 import orjson
 from http import HTTPStatus
 import hashlib
+import html
 import bleach
+import collections
 import copy
 import time
+from urllib.parse import urlencode
 
 sys.path.append(".")
 sys.path.append("modules/infra/admin_piccolo")
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from typing import Callable, Awaitable, Tuple, Dict, List
 from starlette.responses import Response, StreamingResponse, RedirectResponse, HTMLResponse, PlainTextResponse
 from starlette.requests import Request
-from starlette.concurrency import iterate_in_threadpool
 from fastapi.responses import ORJSONResponse
 from piccolo.engine import engine_finder
 from piccolo_admin.endpoints import create_admin
 from piccolo_api.crud.endpoints import PiccoloCRUD
 from piccolo_api.fastapi.endpoints import FastAPIWrapper
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.routing import Mount
-from starlette.types import Scope, Message
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth_cache import AuthCache
+from audit_log import AuditLog
+from discord_rest import DiscordError, DiscordREST, Route
+import request_logs
 from tables import Bot, Reviews, ReviewVotes, BotTag, User, Vanity, BotListTags, ServerTags, BotPack, BotCommand, LeaveOfAbsence, UserBotLogs, BotVotes
 import orjson
 import aioredis
 from modules.core import redis_ipc_new
+from modules.core.compression import CompressionMiddleware
 from modules.models import enums
-from discord import Embed
+from modules.models.enum_lookup import member as enum_member
+from modules.models.embed import Embed
 from piccolo.apps.user.tables import BaseUser
 import secrets
 import aiohttp
@@ -49,17 +56,33 @@ from mdit_py_plugins.field_list import fieldlist_plugin
 from mdit_py_plugins.container import container_plugin
 from fastapi.staticfiles import StaticFiles
 
+UNKNOWN_USER = {
+    "id": "",
+    "username": "Unknown User",
+    "avatar": "https://cdn.discordapp.com/embed/avatars/0.png",
+    "disc": "0000"
+}
+
+async def _getch(sess, user_id: int) -> dict:
+    async with sess.get(f"http://localhost:1234/getch/{user_id}") as resp:
+        if resp.status == 404:
+            return dict(UNKNOWN_USER)
+        return await resp.json()
+
 async def fetch_user(user_id: int):
     async with aiohttp.ClientSession() as sess:
-        async with sess.get(f"http://localhost:1234/getch/{user_id}") as resp:
-            if resp.status == 404:
-                return {
-                    "id": "",
-                    "username": "Unknown User",
-                    "avatar": "https://cdn.discordapp.com/embed/avatars/0.png",
-                    "disc": "0000"
-                }
-            return await resp.json()
+        return await _getch(sess, user_id)
+
+async def fetch_users(user_ids, concurrency: int = 10) -> dict[int, dict]:
+    """Fetches many users at once over one session, at most ``concurrency`` at a time"""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _fetch(sess, user_id):
+        async with sem:
+            return user_id, await _getch(sess, user_id)
+
+    async with aiohttp.ClientSession() as sess:
+        return dict(await asyncio.gather(*[_fetch(sess, user_id) for user_id in user_ids]))
 
 def get_token(length: int) -> str:
     secure_str = ""
@@ -83,51 +106,46 @@ with open("config/data/secrets.json") as json:
 with open("config/data/staff_roles.json") as json:
     staff_roles = orjson.loads(json.read())
 
+# Shared Discord REST client (per route ratelimits), see discord_rest.py
+discord = DiscordREST(main_bot_token)
+
 async def add_role(server, member, role, reason):
     print(f"[LYNX] Giving role {role} to member {member} on server {server} for reason: {reason}")
-    url = f"https://discord.com/api/v10/guilds/{server}/members/{member}/roles/{role}"
-    async with aiohttp.ClientSession() as sess:
-        async with sess.put(url, headers={
-            "Authorization": f"Bot {main_bot_token}",
-            "X-Audit-Log-Reason": f"[LYNX] {reason}"
-        }) as resp:
-            if resp.status == HTTPStatus.NO_CONTENT:
-                return None
-            return await resp.json()
+    try:
+        return await discord.request(
+            Route("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", guild_id=server, user_id=member, role_id=role),
+            reason=f"[LYNX] {reason}"
+        )
+    except DiscordError as exc:
+        return exc.data
 
 async def del_role(server, member, role, reason):
     print(f"[LYNX] Removing role {role} to member {member} on server {server} for reason: {reason}")
-    url = f"https://discord.com/api/v10/guilds/{server}/members/{member}/roles/{role}"
-    async with aiohttp.ClientSession() as sess:
-        async with sess.delete(url, headers={
-            "Authorization": f"Bot {main_bot_token}",
-            "X-Audit-Log-Reason": f"[LYNX] {reason}"
-        }) as resp:
-            if resp.status == HTTPStatus.NO_CONTENT:
-                return None
-            return await resp.json()
+    try:
+        return await discord.request(
+            Route("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", guild_id=server, user_id=member, role_id=role),
+            reason=f"[LYNX] {reason}"
+        )
+    except DiscordError as exc:
+        return exc.data
 
 async def ban_user(server, member, reason):
-    url = f"https://discord.com/api/v10/guilds/{server}/bans/{member}"
-    async with aiohttp.ClientSession() as sess:
-        async with sess.put(url, headers={
-            "Authorization": f"Bot {main_bot_token}",
-            "X-Audit-Log-Reason": f"[LYNX] Bot Banned: {reason[:14]+'...'}"
-        }) as resp:
-            if resp.status == HTTPStatus.NO_CONTENT:
-                return None
-            return await resp.json()
+    try:
+        return await discord.request(
+            Route("PUT", "/guilds/{guild_id}/bans/{user_id}", guild_id=server, user_id=member),
+            reason=f"[LYNX] Bot Banned: {reason[:14]+'...'}"
+        )
+    except DiscordError as exc:
+        return exc.data
 
 async def unban_user(server, member, reason):
-    url = f"https://discord.com/api/v10/guilds/{server}/bans/{member}"
-    async with aiohttp.ClientSession() as sess:
-        async with sess.delete(url, headers={
-            "Authorization": f"Bot {main_bot_token}",
-            "X-Audit-Log-Reason": f"[LYNX] Bot Unbanned: {reason[:14]+'...'}"
-        }) as resp:
-            if resp.status == HTTPStatus.NO_CONTENT:
-                return None
-            return await resp.json()
+    try:
+        return await discord.request(
+            Route("DELETE", "/guilds/{guild_id}/bans/{user_id}", guild_id=server, user_id=member),
+            reason=f"[LYNX] Bot Unbanned: {reason[:14]+'...'}"
+        )
+    except DiscordError as exc:
+        return exc.data
 
 admin = create_admin(
     [LeaveOfAbsence, Vanity, User, Bot, BotPack, BotCommand, BotTag, BotListTags, ServerTags, Reviews, ReviewVotes, UserBotLogs, BotVotes], 
@@ -926,65 +944,122 @@ md = (
 
 staff_guide = md.render(staff_guide_md)
 
-class CustomHeaderMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
+# Validated auth contexts, see auth_cache.py
+auth_cache = AuthCache(ttl=30)
+
+# Batched lynx_logs writer, see audit_log.py
+audit_log = AuditLog()
+
+class LynxMiddleware:
+    """
+    Auth, permission checks, ratelimits and audit logging for Lynx as one pure ASGI
+    middleware (so each of these runs once per request). Response bodies are passed
+    through as they are sent and every response gets ``Cache-Control: no-store``
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def _send(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["Cache-Control"] = "no-store"
+            await send(message)
+
+        request = Request(scope, receive)
+        response, audit = await self.check(request)
+
+        if response:
+            return await response(scope, receive, _send)
+
+        if not audit:
+            return await self.app(scope, receive, _send)
+
+        if request.url.path.startswith("/admin/api/tables/leave_of_absence") and request.method == "POST":
+            return await self.create_loa(request, _send)
+
+        await self.app(scope, receive, _send)
+        await self.audit(request, status_code)
+
+    async def check(self, request: Request) -> tuple[Response | None, bool]:
+        """
+        Returns a response to send instead of calling the app (if any) and whether the
+        request should be audit logged
+        """
         lynx_form_html = lynx_form_beta.replace("%username%", "Not logged in")
 
         if request.url.path.startswith("/_"):
-            return await call_next(request)
+            return None, False
 
-        if request.url.path.startswith(("/staff-guide", "/requests", "/links", "/roadmap", "/docs")) or request.url.path == "/":
+        if request.url.path.startswith(("/staff-guide", "/links", "/roadmap", "/docs")) or request.url.path == "/":
             if request.headers.get("Frostpaw-Staff-Notify"):
-                return await call_next(request)
+                return None, False
             else:
-                return HTMLResponse(lynx_form_html)
-        print("Calling custom lynx")
+                return HTMLResponse(lynx_form_html), False
         if request.cookies.get("sunbeam-session:warriorcats"):
             request.scope["sunbeam_user"] = orjson.loads(b64decode(request.cookies.get("sunbeam-session:warriorcats")))
         else:
-            return RedirectResponse(f"https://fateslist.xyz/frostpaw/herb?redirect={request.url}")
+            return RedirectResponse(f"https://fateslist.xyz/frostpaw/herb?redirect={request.url}"), False
 
-        check = await app.state.db.fetchval(
-            "SELECT user_id FROM users WHERE user_id = $1 AND api_token = $2", 
-            int(request.scope["sunbeam_user"]["user"]["id"]), 
-            request.scope["sunbeam_user"]["token"]
-        )
+        user_id = int(request.scope["sunbeam_user"]["user"]["id"])
+        token = request.scope["sunbeam_user"]["token"]
 
-        if not check:
-            if request.headers.get("Frostpaw-Staff-Notify"):
-                return ORJSONResponse({
-                    "title": "Re-login required!",
-                    "data": f"""
-                    Since your user token has recently changed, you will have to logout and login again!
-                    <br/>
-                    <a href="https://fateslist.xyz/frostpaw/herb?redirect=https://lynx.fateslist.xyz">Re-login</a>
-                    """
-                })
-            return HTMLResponse(lynx_form_html)
+        ctx = auth_cache.get(user_id, token)
 
-        _, perm, member = await is_staff(None, int(request.scope["sunbeam_user"]["user"]["id"]), 2, redis=app.state.redis)
+        if not ctx:
+            check = await app.state.db.fetchval(
+                "SELECT user_id FROM users WHERE user_id = $1 AND api_token = $2", 
+                user_id,
+                token
+            )
+
+            if not check:
+                if request.headers.get("Frostpaw-Staff-Notify"):
+                    return ORJSONResponse({
+                        "title": "Re-login required!",
+                        "data": f"""
+                        Since your user token has recently changed, you will have to logout and login again!
+                        <br/>
+                        <a href="https://fateslist.xyz/frostpaw/herb?redirect=https://lynx.fateslist.xyz">Re-login</a>
+                        """
+                    }), False
+                return HTMLResponse(lynx_form_html), False
+
+            _, perm, member = await is_staff(None, user_id, 2, redis=app.state.redis)
+
+            # Before erroring, ensure they are perm of at least 2 and have no staff_verify_code set
+            is_verified = None
+            if member.perm >= 2:
+                staff_verify_code = await app.state.db.fetchval(
+                    "SELECT staff_verify_code FROM users WHERE user_id = $1", 
+                    user_id
+                )
+                is_verified = bool(staff_verify_code) and code_check(staff_verify_code, user_id)
+
+            ctx = auth_cache.set(user_id, token, perm=perm, member=member, is_verified=is_verified)
+
+        perm, member = ctx.perm, ctx.member
 
         request.state.member = member
 
         if request.url.path.startswith("/my-perms"):
             if request.headers.get("Frostpaw-Staff-Notify"):
-                return await call_next(request)
+                return None, False
             else:
-                return HTMLResponse(lynx_form_html)
-
-        # Before erroring, ensure they are perm of at least 2 and have no staff_verify_code set
-        if member.perm >= 2:
-            staff_verify_code = await app.state.db.fetchval(
-                "SELECT staff_verify_code FROM users WHERE user_id = $1", 
-                int(request.scope["sunbeam_user"]["user"]["id"])
-            )
+                return HTMLResponse(lynx_form_html), False
 
-            request.state.is_verified = True
+        if ctx.is_verified is not None:
+            request.state.is_verified = ctx.is_verified
 
-            if not staff_verify_code or not code_check(staff_verify_code, int(request.scope["sunbeam_user"]["user"]["id"])):                    
-                request.state.is_verified = False
+            if not ctx.is_verified:
                 if request.method == "GET" and not request.url.path.startswith("/staff-verify"):
-                    return RedirectResponse("/staff-verify")
+                    return RedirectResponse("/staff-verify"), False
 
         # Only mods have rw access to this, but bot reviewers have ro access
         if perm < 2:
@@ -992,13 +1067,13 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
                 return ORJSONResponse({
                     "title": "Permission Error",
                     "data": "<h2>You do not have permission to access this page. Try <a href='/my-perms'>this page</a> for more information</h2>"
-                })
-            return HTMLResponse(lynx_form_html)
+                }), False
+            return HTMLResponse(lynx_form_html), False
 
         # Perm check
         if request.url.path.startswith("/admin/api"):
             if request.url.path == "/admin/api/tables/" and perm < 4:
-                return ORJSONResponse(["reviews", "review_votes", "bot_packs", "vanity", "leave_of_absence", "user_vote_table"])
+                return ORJSONResponse(["reviews", "review_votes", "bot_packs", "vanity", "leave_of_absence", "user_vote_table"]), False
             elif request.url.path == "/admin/api/tables/users/ids/" and request.method == "GET":
                 pass
             elif request.url.path in ("/admin/api/forms/", "/admin/api/user/", "/admin/api/openapi.json") or request.url.path.startswith("/admin/api/docs"):
@@ -1006,11 +1081,11 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
             elif perm < 4:
                 if request.url.path.startswith("/admin/api/tables/vanity"):
                     if request.method != "GET":
-                        return ORJSONResponse({"error": "You do not have permission to update vanity"}, status_code=403)
+                        return ORJSONResponse({"error": "You do not have permission to update vanity"}, status_code=403), False
                 
                 elif request.url.path.startswith("/admin/api/tables/bot_packs"):
                     if request.method != "GET":
-                        return ORJSONResponse({"error": "You do not have permission to update bot packs"}, status_code=403)
+                        return ORJSONResponse({"error": "You do not have permission to update bot packs"}, status_code=403), False
                 
                 elif request.url.path.startswith("/admin/api/tables/leave_of_absence/") and request.method in ("PATCH", "DELETE"):
                     ids = request.url.path.split("/")
@@ -1020,16 +1095,18 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
                             loa_id = int(id)
                             break
                     else:
-                        return abort(404)
+                        return ORJSONResponse({"error": "Not Found"}, status_code=404), False
                     
                     user_id = await app.state.db.fetchval("SELECT user_id::text FROM leave_of_absence WHERE id = $1", loa_id)
                     if user_id != request.scope["sunbeam_user"]["user"]["id"]:
-                        return ORJSONResponse({"error": "You do not have permission to update this leave of absence"}, status_code=403)
+                        return ORJSONResponse({"error": "You do not have permission to update this leave of absence"}, status_code=403), False
 
                 elif not request.url.path.startswith(("/admin/api/tables/reviews", "/admin/api/tables/review_votes", "/admin/api/tables/bot_packs", "/admin/api/tables/user_vote_table", "/admin/api/tables/leave_of_absence")):
-                    return ORJSONResponse({"error": "You do not have permission to access this page"}, status_code=403)
+                    return ORJSONResponse({"error": "You do not have permission to access this page"}, status_code=403), False
+
+        user_id = int(request.scope["sunbeam_user"]["user"]["id"])
 
-        key = "rl:%s" % request.scope["sunbeam_user"]["user"]["id"]
+        key = "rl:%s" % user_id
         check = await app.state.redis.get(key)
         if not check:
             rl = await app.state.redis.set(key, "0", ex=30)
@@ -1037,86 +1114,71 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
             rl = await app.state.redis.incr(key)
             if int(rl) > 5:
                 expire = await app.state.redis.ttl(key)
-                await app.state.db.execute("UPDATE users SET api_token = $1 WHERE user_id = $2", get_token(128), int(request.scope["sunbeam_user"]["user"]["id"]))
-                return ORJSONResponse({"detail": f"You have exceeded the rate limit {expire} is TTL. API_TOKEN_RESET"}, status_code=429)
+                await app.state.db.execute("UPDATE users SET api_token = $1 WHERE user_id = $2", get_token(128), user_id)
+                auth_cache.invalidate(user_id)
+                return ORJSONResponse({"detail": f"You have exceeded the rate limit {expire} is TTL. API_TOKEN_RESET"}, status_code=429), False
 
-        embed = Embed(
-            title = "Lynx API Request", 
-            description = f"**This is usually malicious. When in doubt DM**", 
-            color = 0x00ff00,
-        )
-
-        embed.add_field(name="User ID", value=request.scope["sunbeam_user"]["user"]["id"])
-        embed.add_field(name="Username", value=request.scope["sunbeam_user"]["user"]["username"])
-        embed.add_field(name="Request", value=f"{request.method} {request.url}")
-        
         if request.url.path.startswith("/meta"):
-            return ORJSONResponse({"piccolo_admin_version": "0.1a1", "site_name": "Lynx Admin"})
+            return ORJSONResponse({"piccolo_admin_version": "0.1a1", "site_name": "Lynx Admin"}), False
 
-        request.state.user_id = int(request.scope["sunbeam_user"]["user"]["id"])
+        request.state.user_id = user_id
 
-        if not request.url.path.startswith("/admin") and not request.url.path.startswith("/_"):
+        if not request.url.path.startswith("/admin"):
             if not request.headers.get("Frostpaw-Staff-Notify") and request.method == "GET":
-                return HTMLResponse(lynx_form_html)
+                return HTMLResponse(lynx_form_html), False
             else:
-                return await call_next(request)
+                return None, False
+
+        return None, True
+
+    async def create_loa(self, request: Request, send: Send):
+        """
+        Leave of absences are created through piccolo admin but must belong to the
+        user creating them. This is the only response that is buffered
+        """
+        messages = []
 
-        response = await call_next(request)
+        async def _buffer(message: Message):
+            messages.append(message)
 
-        embed.add_field(name="Status Code", value=f"{response.status_code} {HTTPStatus(response.status_code).phrase}")
+        await self.app(request.scope, request.receive, _buffer)
 
-        await app.state.db.execute(
-            "INSERT INTO lynx_logs (user_id, method, url, status_code) VALUES ($1, $2, $3, $4)",
-            int(request.scope["sunbeam_user"]["user"]["id"]),
-            request.method,
-            str(request.url),
-            response.status_code
-        )
+        status_code = messages[0]["status"]
+        await self.audit(request, status_code)
 
-        if not response.status_code < 400:
-            return response
+        if status_code >= 400:
+            for message in messages:
+                await send(message)
+            return
 
-        try:
-            print(request.user.user.username)
-        except:
-            request.scope["user"] = Unknown()
+        content = b"".join(message.get("body", b"") for message in messages[1:])
+        content_dict = orjson.loads(content)
+        await app.state.db.execute("UPDATE leave_of_absence SET user_id = $1 WHERE id = $2", request.state.user_id, content_dict[0]["id"])
+        await ORJSONResponse(content_dict)(request.scope, request.receive, send)
 
-        if request.url.path.startswith("/admin/api/tables/leave_of_absence") and request.method == "POST":
-            response_body = [section async for section in response.body_iterator]
-            response.body_iterator = iterate_in_threadpool(iter(response_body))
-            content = response_body[0]
-            content_dict = orjson.loads(content)
-            await app.state.db.execute("UPDATE leave_of_absence SET user_id = $1 WHERE id = $2", int(request.scope["sunbeam_user"]["user"]["id"]), content_dict[0]["id"])
-            return ORJSONResponse(content_dict)
+    async def audit(self, request: Request, status_code: int):
+        await audit_log.put(request.state.user_id, request.method, str(request.url), status_code)
+
+        if status_code >= 400:
+            return
 
         if request.url.path.startswith("/admin/api/tables/bots") and request.method == "PATCH":
-            print("Got bot edit, sending message")
+            try:
+                username = request.user.user.username
+            except (AssertionError, AttributeError):
+                username = Unknown.username
+
             path = request.url.path.rstrip("/")
             bot_id = int(path.split("/")[-1])
-            print("Got bot id: ", bot_id)
             owner = await app.state.db.fetchval("SELECT owner FROM bot_owner WHERE bot_id = $1", bot_id)
             embed = Embed(
                 title = "Bot Edited Via Lynx", 
-                description = f"Bot <@{bot_id}> has been edited via Lynx by user {request.user.user.username}", 
+                description = f"Bot <@{bot_id}> has been edited via Lynx by user {username}", 
                 color = 0x00ff00,
                 url=f"https://fateslist.xyz/bot/{bot_id}"
             )
             await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
-        return response
-
-admin = CustomHeaderMiddleware(admin)
-
-class NoCacher(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        #if request.url.path.startswith(("/admin", "/meta")) or request.headers.get("Frostpaw-Staff-Notify"):
-        #    response.headers["Cache-Control"] = "no-store"
-        response.headers["Cache-Control"] = "no-store"
-        return response
-
-admin = NoCacher(admin)
-
 async def server_error(request, exc):
     return HTMLResponse(content="Error", status_code=exc.status_code)
 
@@ -1221,10 +1283,74 @@ In case, you haven't went through staff verification and you somehow didn't get
 """
     })
 
+# Submitted applications never change so their rendered questions/answers are cached by app_id
+staff_app_cache: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+STAFF_APP_CACHE_SIZE = 1024
+STAFF_APPS_PER_PAGE = 20
+
+def render_staff_app(questions: str, answers: str) -> str:
+    questions = orjson.loads(questions)
+    answers = orjson.loads(answers)
+
+    questions_html = ""
+
+    for pane in questions:
+        questions_html += f"<h3>{pane['title']}</h3><strong>Prelude</strong>: {pane['pre'] or 'No prelude for this section'}<br/>"
+        for question in pane["questions"]:
+            questions_html += f"""
+                <h4>{question['title']}</h4>
+                <pre>
+                    <strong>ID:</strong> {question['id']}
+                    <strong>Minimum Length:</strong> {question['min_length']}
+                    <strong>Maximum Length:</strong> {question['max_length']}
+                    <strong>Question:</strong> {question['question']}
+                    <strong>Answer:</strong> {bleach.clean(answers[question['id']])}
+                </pre>
+            """
+    return questions_html
+
+async def staff_app_html(app_ids: list[str]) -> dict[str, str]:
+    """Rendered questions/answers of applications, only uncached ones are fetched and rendered"""
+    missing = [app_id for app_id in app_ids if app_id not in staff_app_cache]
+    if missing:
+        rows = await app.state.db.fetch(
+            "SELECT app_id::text, questions, answers FROM lynx_apps WHERE app_id = ANY($1::uuid[])",
+            missing
+        )
+        for row in rows:
+            staff_app_cache[row["app_id"]] = render_staff_app(row["questions"], row["answers"])
+        while len(staff_app_cache) > STAFF_APP_CACHE_SIZE:
+            staff_app_cache.popitem(last=False)
+
+    rendered = {}
+    for app_id in app_ids:
+        if app_id in staff_app_cache:
+            staff_app_cache.move_to_end(app_id)
+            rendered[app_id] = staff_app_cache[app_id]
+    return rendered
+
 @app.get("/staff-apps")
-async def staff_apps(request: Request, response: Response):
-    # Get staff application list
-    staff_apps = await app.state.db.fetch("SELECT user_id, app_id, questions, answers, created_at FROM lynx_apps ORDER BY created_at DESC")
+async def staff_apps(request: Request, response: Response, page: int = 1, open: str | None = None):
+    page = max(page, 1)
+
+    # Get a page of the staff application list (plus the one to open if its not on this page)
+    staff_apps = await app.state.db.fetch(
+        """SELECT user_id, app_id::text, created_at FROM lynx_apps ORDER BY created_at DESC NULLS LAST, app_id
+        LIMIT $1 OFFSET $2""",
+        STAFF_APPS_PER_PAGE + 1,
+        (page - 1) * STAFF_APPS_PER_PAGE
+    )
+    has_next = len(staff_apps) > STAFF_APPS_PER_PAGE
+    staff_apps = staff_apps[:STAFF_APPS_PER_PAGE]
+
+    if open and open not in [staff_app["app_id"] for staff_app in staff_apps]:
+        try:
+            opened = await app.state.db.fetchrow("SELECT user_id, app_id::text, created_at FROM lynx_apps WHERE app_id = $1::uuid", open)
+        except asyncpg.DataError:
+            opened = None
+        if opened:
+            staff_apps.insert(0, opened)
+
     app_html = "" 
 
     # Easiest way to block cross origin is to just use a hidden input
@@ -1233,49 +1359,37 @@ async def staff_apps(request: Request, response: Response):
 
     response.set_cookie("csrf_token_ua", csrf_token, max_age=60*10, domain="lynx.fateslist.xyz", path="/user-actions", secure=True, httponly=True, samesite="Strict")
 
+    users = await fetch_users({staff_app["user_id"] for staff_app in staff_apps})
+    questions = await staff_app_html([staff_app["app_id"] for staff_app in staff_apps])
+
     for staff_app in staff_apps:
-        if str(staff_app["app_id"]) == request.query_params.get("open"):
+        if staff_app["app_id"] == open:
             open_attr = "open"
         else:
             open_attr = ""
-        user = await fetch_user(staff_app['user_id'])
-        user["username"] = bleach.clean(user["username"])
-
-        questions = orjson.loads(staff_app["questions"])
-        answers = orjson.loads(staff_app["answers"])
-
-        questions_html = ""
-
-
-
-        for pane in questions:
-            questions_html += f"<h3>{pane['title']}</h3><strong>Prelude</strong>: {pane['pre'] or 'No prelude for this section'}<br/>"
-            for question in pane["questions"]:
-                questions_html += f"""
-                    <h4>{question['title']}</h4>
-                    <pre>
-                        <strong>ID:</strong> {question['id']}
-                        <strong>Minimum Length:</strong> {question['min_length']}
-                        <strong>Maximum Length:</strong> {question['max_length']}
-                        <strong>Question:</strong> {question['question']}
-                        <strong>Answer:</strong> {bleach.clean(answers[question['id']])}
-                    </pre>
-                """
+        user = users[staff_app["user_id"]]
+        username = bleach.clean(user["username"])
 
         app_html += f"""
         <details {open_attr}>
             <summary>{staff_app['app_id']}</summary>
             <h2>User Info</h2>
             <p><strong><em>Created At:</em></strong> {staff_app['created_at']}</p>
-            <p><strong><em>User:</em></strong> {user['username']} ({user['id']})</p>
+            <p><strong><em>User:</em></strong> {username} ({user['id']})</p>
             <h2>Application:</h2> 
-            {questions_html}
+            {questions.get(staff_app['app_id'], '')}
             <br/>
             <button onclick="window.location.href = '/addstaff?id={user['id']}'">Accept</button>
             <button onclick="deleteAppByUser('{user['id']}')">Delete</button>
         </details>
         """
 
+    pages_html = ""
+    if page > 1:
+        pages_html += f"<a href='/staff-apps?page={page - 1}'>Newer applications</a> "
+    if has_next:
+        pages_html += f"<a href='/staff-apps?page={page + 1}'>Older applications</a>"
+
     return {
         "title": "Staff Application List",
         "pre": "/links",
@@ -1283,6 +1397,7 @@ async def staff_apps(request: Request, response: Response):
         <p>Please verify applications fairly</p>
         {app_html}
         <br/>
+        {pages_html}
         """,
         "script": f"""
         var csrfToken = "{csrf_token}"
@@ -1390,6 +1505,7 @@ async def reset_creds(request: Request):
         get_token(132),
         int(request.scope["sunbeam_user"]["user"]["id"])
     )
+    auth_cache.invalidate(int(request.scope["sunbeam_user"]["user"]["id"]))
     return ORJSONResponse({"detail": "Done"})
 
 @app.get("/loa")
@@ -1446,32 +1562,127 @@ def bot_select(id: str, bot_list: list[str], reason: bool = False):
 
     return select
 
+def bot_search_select(id: str, states: list[enums.BotState] | None = None, reason: bool = False):
+    """Like bot_select but searches bots as you type (see /bot-actions/search) instead of listing all of them"""
+    states = [state.value for state in states or []]
+
+    select = f"""
+<label for='{id}'>Search by bot name or ID</label><br/>
+<input id='{id}' name='{id}' list='{id}-list' autocomplete='off' oninput='searchBots("{id}", {states})' />
+<datalist id='{id}-list'></datalist>
+<br/>
+    """
+
+    if reason:
+        select += f"""
+<label for="{id}-reason">Reason</label><br/>
+<textarea 
+    type="text" 
+    id="{id}-reason" 
+    name="{id}-reason"
+    placeholder="Enter reason and feedback for improvement here"
+    style="width: 100%; height: 200px; font-size: 20px !important; resize: none;"
+></textarea>
+<br/>
+        """
+
+    return select
+
 app.state.valid_csrf = {}
 app.state.valid_csrf_user = {}
 
+def like_prefix(value: str) -> str:
+    """A LIKE pattern matching anything starting with value"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+# Sort keys of /bot-actions/search, matching bots_username_sort_idx and bots_id_sort_idx.
+# These C collation btrees serve both the prefix LIKE and the ORDER BY
+BOT_NAME_KEY = """(lower(coalesce(username_cached, '')) COLLATE "C")"""
+BOT_ID_KEY = """(bot_id::text COLLATE "C")"""
+
+@app.get("/bot-actions/search")
+async def bot_actions_search(q: str = "", state: list[int] = Query([]), flag: int | None = None, after: str | None = None, limit: int = 20):
+    """
+    Typeahead search over bots by state, flag and id or (cached) username prefix. Paginated by
+    keyset, ``next`` is the ``after`` of the next page
+    """
+    limit = max(1, min(limit, 100))
+    conditions = []
+    args = []
+
+    def arg(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    if state:
+        conditions.append(f"state = ANY({arg(state)}::int[])")
+
+    if flag is not None:
+        # Uses bots_flags_idx (GIN)
+        conditions.append(f"flags @> {arg([flag])}::int[]")
+
+    q = q.strip()
+    by_id = q.isdigit()
+    if by_id:
+        conditions.append(f"{BOT_ID_KEY} LIKE {arg(like_prefix(q))}")
+    elif q:
+        conditions.append(f"{BOT_NAME_KEY} LIKE {arg(like_prefix(q.lower()))}")
+
+    if after:
+        # Cursors are <bot_id>.<name key>
+        after_id, _, after_name = after.partition(".")
+        if not after_id.isdigit():
+            return ORJSONResponse({"detail": "Invalid cursor"}, status_code=400)
+        if by_id:
+            conditions.append(f"{BOT_ID_KEY} > {arg(after_id)}")
+        else:
+            conditions.append(f"({BOT_NAME_KEY}, bot_id) > ({arg(after_name)}, {arg(int(after_id))})")
+
+    query = f"SELECT bot_id, username_cached, flags, {BOT_NAME_KEY} AS name_key FROM bots"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {BOT_ID_KEY}" if by_id else f" ORDER BY {BOT_NAME_KEY}, bot_id"
+    query += f" LIMIT {arg(limit + 1)}"
+
+    bots = await app.state.db.fetch(query, *args)
+    next_cursor = None
+    if len(bots) > limit:
+        bots = bots[:limit]
+        next_cursor = f"{bots[-1]['bot_id']}.{bots[-1]['name_key']}"
+
+    return {
+        "bots": [
+            {"bot_id": str(bot["bot_id"]), "username": bot["username_cached"] or "No cached username", "flags": bot["flags"] or []}
+            for bot in bots
+        ],
+        "next": next_cursor,
+    }
+
 @app.get("/bot-actions")
 async def loa(request: Request, response: Response):
-    queue = await app.state.db.fetch("SELECT bot_id, username_cached, description, prefix, created_at FROM bots WHERE state = $1 ORDER BY created_at ASC", enums.BotState.pending)
+    # The queue and bots under review in one go, everything else is searched for as needed
+    bots = await app.state.db.fetch(
+        "SELECT bot_id, username_cached, description, prefix, created_at, state FROM bots WHERE state = ANY($1::int[]) ORDER BY created_at ASC",
+        [enums.BotState.pending.value, enums.BotState.under_review.value]
+    )
+    queue = [bot for bot in bots if bot["state"] == enums.BotState.pending]
+    under_review = [bot for bot in bots if bot["state"] == enums.BotState.under_review]
 
     queue_select = bot_select("queue", queue)
 
-    under_review = await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1", enums.BotState.under_review)
-
     under_review_select_approved = bot_select("under_review_approved", under_review, reason=True)
     under_review_select_denied = bot_select("under_review_denied", under_review, reason=True)
     under_review_select_claim = bot_select("under_review_claim", under_review, reason=True)
-    
-    approved = await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1 ORDER BY created_at DESC", enums.BotState.approved)
 
-    ban_select = bot_select("ban", approved, reason=True)
-    certify_select = bot_select("certify", approved, reason=True)
-    unban_select = bot_select("unban", await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1", enums.BotState.banned), reason=True)
-    unverify_select = bot_select("unverify", await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1", enums.BotState.approved), reason=True)
-    requeue_select = bot_select("requeue", await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1 OR state = $2", enums.BotState.denied, enums.BotState.banned), reason=True)
+    ban_select = bot_search_select("ban", [enums.BotState.approved], reason=True)
+    certify_select = bot_search_select("certify", [enums.BotState.approved], reason=True)
+    unban_select = bot_search_select("unban", [enums.BotState.banned], reason=True)
+    unverify_select = bot_search_select("unverify", [enums.BotState.approved], reason=True)
+    requeue_select = bot_search_select("requeue", [enums.BotState.denied, enums.BotState.banned], reason=True)
 
-    uncertify_select = bot_select("uncertify", await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1", enums.BotState.certified), reason=True)
+    uncertify_select = bot_search_select("uncertify", [enums.BotState.certified], reason=True)
 
-    reset_bot_votes_select = bot_select("reset-votes", await app.state.db.fetch("SELECT bot_id, username_cached FROM bots WHERE state = $1 OR state = $2", enums.BotState.approved, enums.BotState.certified), reason=True)
+    reset_bot_votes_select = bot_search_select("reset-votes", [enums.BotState.approved, enums.BotState.certified], reason=True)
 
     flag_list = list(enums.BotFlag)
     flags_select = "<label>Select Flag</label><select id='flag' name='flag'>"
@@ -1479,7 +1690,9 @@ async def loa(request: Request, response: Response):
         flags_select += f"<option value={flag.value}>{flag.name} ({flag.value}) -> {flag.__doc__}</option>"
     flags_select += "</select>"
 
-    flags_bot_select = bot_select("set-flag", await app.state.db.fetch("SELECT bot_id, username_cached FROM bots"), reason=True)
+    bulk_flags_select = flags_select.replace("id='flag' name='flag'", "id='bulk-flag' name='bulk-flag'")
+
+    flags_bot_select = bot_search_select("set-flag", reason=True)
 
     # Easiest way to block cross origin is to just use a hidden input
     csrf_token = get_token(132)
@@ -1489,13 +1702,20 @@ async def loa(request: Request, response: Response):
 
     queue_md = ""
 
+    owners = collections.defaultdict(list)
+    for owner in await app.state.db.fetch(
+        "SELECT bot_id, owner, main FROM bot_owner WHERE bot_id = ANY($1::bigint[])",
+        [bot["bot_id"] for bot in queue]
+    ):
+        owners[owner["bot_id"]].append(owner)
+
+    users = await fetch_users({owner["owner"] for bot_owners in owners.values() for owner in bot_owners})
+
     for bot in queue:
-        owners = await app.state.db.fetch("SELECT owner, main FROM bot_owner WHERE bot_id = $1", bot["bot_id"])
-        
         owners_md = ""
 
-        for owner in owners:
-            user = await fetch_user(owner["owner"])
+        for owner in owners[bot["bot_id"]]:
+            user = users[owner["owner"]]
             owners_md += f"""
 {user['username']}  ({owner['owner']}) |  main -> {owner["main"]}
             """
@@ -1704,6 +1924,47 @@ Please check site pages before approving/denying. You can save lots of time by d
 </div>
 
 <button onclick="setFlag()">Update</button>
+<button onclick="listFlagged()">List bots with this flag</button>
+<pre id="flagged-bots"></pre>
+:::
+
+::: action-bulk
+
+### Bulk Actions
+
+- Applies an action to many bots at once, bots not in the right state for it are skipped
+- Enter one bot ID per line (at most 500)
+- Same permissions as the action itself
+
+<label for="bulk-ids">Bot IDs</label><br/>
+<textarea id="bulk-ids" name="bulk-ids" style="width: 100%; height: 150px; resize: none;"></textarea>
+<br/>
+
+<label for="bulk-action">Action</label><br/>
+<select id="bulk-action" name="bulk-action">
+    <option value="approve">Approve (under_review => approved)</option>
+    <option value="deny">Deny (under_review => denied)</option>
+    <option value="ban">Ban (approved => banned)</option>
+    <option value="requeue">Requeue (denied | banned => pending)</option>
+    <option value="reset-votes">Reset Votes</option>
+    <option value="set-flag">Set Flag</option>
+</select>
+<br/>
+
+{bulk_flags_select}
+
+<label for="bulk-reason">Reason</label><br/>
+<textarea 
+    type="text" 
+    id="bulk-reason" 
+    name="bulk-reason"
+    placeholder="Enter reason and feedback for improvement here"
+    style="width: 100%; height: 200px; font-size: 20px !important; resize: none;"
+></textarea>
+<br/>
+
+<button onclick="bulkAction()">Apply</button>
+<pre id="bulk-results"></pre>
 :::
 """), 
     "script": f"""
@@ -1711,7 +1972,37 @@ Please check site pages before approving/denying. You can save lots of time by d
     """ + 
     """
         function getBotId(id) {
-            return document.querySelector(id+"-alt").value || document.querySelector(id).value
+            let alt = document.querySelector(id+"-alt")
+            return (alt && alt.value) || document.querySelector(id).value
+        }
+
+        var searchTimers = {}
+
+        function searchBots(id, states) {
+            clearTimeout(searchTimers[id])
+            searchTimers[id] = setTimeout(async () => {
+                let params = new URLSearchParams({"q": document.querySelector(`#${id}`).value})
+                states.forEach(state => params.append("state", state))
+                let res = await fetch(`/bot-actions/search?${params}`, {
+                    method: "GET",
+                    credentials: 'same-origin',
+                    headers: {
+                        "Frostpaw-Staff-Notify": "0.1.0"
+                    },
+                })
+                if(!res.ok) {
+                    return
+                }
+                let { bots } = await res.json()
+                let list = document.querySelector(`#${id}-list`)
+                list.innerHTML = ""
+                bots.forEach(bot => {
+                    let option = document.createElement("option")
+                    option.value = bot.bot_id
+                    option.textContent = `${bot.username} (${bot.bot_id})`
+                    list.appendChild(option)
+                })
+            }, 200)
         }
 
         async function claim() {
@@ -1905,6 +2196,52 @@ Please check site pages before approving/denying. You can save lots of time by d
             alert(json.detail)
         }
 
+        async function listFlagged() {
+            let flag = parseInt(document.querySelector("#flag").value)
+            let res = await fetch(`/bot-actions/search?flag=${flag}&limit=100`, {
+                method: "GET",
+                credentials: 'same-origin',
+                headers: {
+                    "Frostpaw-Staff-Notify": "0.1.0"
+                },
+            })
+            let { bots, next } = await res.json()
+            while(next) {
+                res = await fetch(`/bot-actions/search?flag=${flag}&limit=100&after=${encodeURIComponent(next)}`, {
+                    method: "GET",
+                    credentials: 'same-origin',
+                    headers: {
+                        "Frostpaw-Staff-Notify": "0.1.0"
+                    },
+                })
+                let json = await res.json()
+                bots = bots.concat(json.bots)
+                next = json.next
+            }
+            document.querySelector("#flagged-bots").innerText = bots.map(bot => `${bot.username} (${bot.bot_id})`).join("\n") || "No bots have this flag"
+        }
+
+        async function bulkAction() {
+            let botIds = document.querySelector("#bulk-ids").value.split("\n").map(id => id.trim()).filter(id => id)
+            let reason = document.querySelector("#bulk-reason").value
+            let name = document.querySelector("#bulk-action").value
+            let flag = parseInt(document.querySelector("#bulk-flag").value)
+
+            let res = await fetch(`/bot-actions/bulk/${name}?csrf_token=${csrfToken}`, {
+                method: "POST",
+                credentials: 'same-origin',
+                headers: {
+                    "Content-Type": "application/json"
+                },
+                body: JSON.stringify({"bot_ids": botIds, "reason": reason, "context": flag}),
+            })
+            let json = await res.json()
+            alert(json.detail)
+            if(json.results) {
+                document.querySelector("#bulk-results").innerText = json.results.map(result => `${result.bot_id}: ${result.detail}`).join("\n")
+            }
+        }
+
         docReady(() => {
             if(window.location.hash) {
                 document.querySelector(`${window.location.hash}`).scrollIntoView()
@@ -1916,21 +2253,153 @@ class Action(BaseModel):
     bot_id: str
     owners: list[dict] | None = None # This is filled in by action decorator
     main_owner: int | None = None # This is filled in by action decorator
+    returned: dict | None = None # This is filled in by transition
     context: Any | None = None
 
 class ActionWithReason(Action):
     reason: str
 
+# Adds a flag (removing unlocked), keeping flags sorted and unique
+SET_FLAG_SQL = f"ARRAY(SELECT DISTINCT f FROM unnest(array_append(array_remove(COALESCE(bots.flags, '{{}}'), {int(enums.BotFlag.unlocked)}), $value::int)) AS f ORDER BY f)"
+
+# Removes a flag (and unlocked)
+UNSET_FLAG_SQL = f"array_remove(array_remove(COALESCE(bots.flags, '{{}}'), {int(enums.BotFlag.unlocked)}), $value::int)"
+
+class SQL:
+    """A SQL expression to set a column to in ``transition``, ``$value`` in it is replaced by a parameter holding ``value``"""
+    def __init__(self, expression: str, value: Any = None):
+        self.expression = expression
+        self.value = value
+
+async def transition_many(
+    bot_ids: list[int],
+    user_id: int,
+    states: list[enums.BotState],
+    to_state: enums.BotState | None = None,
+    *,
+    set_verifier: bool = False,
+    extra: dict[str, Any] | None = None,
+    per_bot: dict[str, tuple[str, list]] | None = None,
+    where: SQL | None = None,
+    returning: list[str] | None = None,
+    action_log: enums.UserBotAction | None = None,
+    context: str | None = None,
+) -> dict[int, dict]:
+    """
+    Moves bots from one of ``states`` (any state if empty) to ``to_state`` as one
+    statement: the state check, the update (plus ``extra`` columns), the
+    user_bot_logs entries and fetching the owners all happen in the same round trip.
+    The state is checked by the UPDATE itself so two staff members can't both make
+    the same transition.
+
+    ``per_bot`` sets columns to a different value for each bot: ``{column: (type, values)}``
+    with values in the same order as ``bot_ids``. ``where`` is an extra condition bots
+    must meet. Returns ``{bot_id: {"owners": [...], **returning}}`` (``returning`` being
+    the new values of those columns) for the bots that were transitioned, bots missing
+    from it weren't in an acceptable state (or don't exist)
+    """
+    per_bot = per_bot or {}
+    args = [bot_ids]
+
+    def arg(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    columns = ["bot_id"] + list(per_bot)
+    arrays = ["$1::bigint[]"] + [f"{arg(values)}::{sql_type}[]" for sql_type, values in per_bot.values()]
+
+    sets = []
+    if to_state is not None:
+        sets.append(f"state = {arg(to_state.value)}")
+    if set_verifier:
+        sets.append(f"verifier = {arg(user_id)}")
+    for column, value in (extra or {}).items():
+        if isinstance(value, SQL):
+            sets.append(f"{column} = " + value.expression.replace("$value", arg(value.value)))
+        else:
+            sets.append(f"{column} = {arg(value)}")
+    for column in per_bot:
+        sets.append(f"{column} = v.{column}")
+
+    guard = f" AND bots.state = ANY({arg([state.value for state in states])}::int[])" if states else ""
+    if where:
+        guard += " AND " + where.expression.replace("$value", arg(where.value))
+
+    returning = returning or []
+    returned = "".join(f", bots.{column}" for column in returning)
+
+    values = f"unnest({', '.join(arrays)}) AS v({', '.join(columns)})"
+    if sets:
+        target = f"UPDATE bots SET {', '.join(sets)} FROM {values} WHERE bots.bot_id = v.bot_id{guard} RETURNING bots.bot_id{returned}"
+    else:
+        target = f"SELECT bots.bot_id{returned} FROM bots, {values} WHERE bots.bot_id = v.bot_id{guard}"
+
+    logged = ""
+    if action_log is not None:
+        logged = f""", logged AS (
+            INSERT INTO user_bot_logs (user_id, bot_id, action, context)
+            SELECT {arg(user_id)}::bigint, bot_id, {arg(action_log.value)}::int, {arg(context)}::text FROM target
+        )"""
+
+    rows = await app.state.db.fetch(
+        f"""WITH target AS ({target}){logged}
+        SELECT target.*, bot_owner.owner, bot_owner.main FROM target
+        LEFT JOIN bot_owner ON bot_owner.bot_id = target.bot_id""",
+        *args
+    )
+
+    bots = {}
+    for row in rows:
+        bot = bots.setdefault(row["bot_id"], {"owners": []} | {column: row[column] for column in returning})
+        if row["owner"] is not None:
+            bot["owners"].append({"owner": row["owner"], "main": row["main"]})
+    return bots
+
+def main_owner_of(owners: list[dict]) -> int | None:
+    for owner in owners:
+        if owner["main"]:
+            return owner["owner"]
+
+async def transition(
+    data: Action,
+    user_id: int,
+    states: list[enums.BotState],
+    to_state: enums.BotState | None = None,
+    *,
+    detail: str | None = None,
+    **kwargs
+) -> ORJSONResponse | None:
+    """
+    ``transition_many`` for the bot of an action. Fills in ``data.owners``,
+    ``data.main_owner`` and ``data.returned``, returns an error response (with
+    ``detail`` if given) if the bot isn't in an acceptable state
+    """
+    bots = await transition_many([data.bot_id], user_id, states, to_state, **kwargs)
+
+    if data.bot_id not in bots:
+        return ORJSONResponse({
+            "detail": detail or f"Bot is not in acceptable states or doesn't exist: Acceptable states are {states}"
+        }, status_code=400)
+
+    data.returned = bots[data.bot_id]
+    data.owners = data.returned.pop("owners")
+    data.main_owner = main_owner_of(data.owners)
+
 def action(
     states: list[enums.BotState], 
     with_reason: bool, 
     min_perm: int = 2,
-    action_log: enums.UserBotAction | None = None
+    action_log: enums.UserBotAction | None = None,
+    to_state: enums.BotState | None = None,
+    set_verifier: bool = False,
+    extra: dict[str, Any] | None = None,
+    manual: bool = False,
 ):
-    async def state_check(bot_id: int):
-        bot_state = await app.state.db.fetchval("SELECT state FROM bots WHERE bot_id = $1", bot_id)
-        return (bot_state in states) or len(states) == 0
-    
+    """
+    Checks and performs a bot action. The state transition (see ``transition``) is
+    made before the handler is called unless ``manual`` is set, in which case the
+    handler must call ``transition`` itself
+    """
     async def _core(request: Request, csrf_token: str, data: Action):
         if request.state.member.perm < min_perm:
             return ORJSONResponse({
@@ -1946,49 +2415,44 @@ def action(
                 "detail": "Bot ID is invalid"
             }, status_code=400)
         data.bot_id = int(data.bot_id)
-        
-        if not await state_check(data.bot_id):
+
+        if with_reason and len(data.reason) < 5:
             return ORJSONResponse({
-                "detail": f"Bot is not in acceptable states or doesn't exist: Acceptable states are {states}"
+                "detail": "Reason must be more than 5 characters"
             }, status_code=400)
-        
-        data.owners = await app.state.db.fetch("SELECT owner, main FROM bot_owner WHERE bot_id = $1", data.bot_id)
 
-        for owner in data.owners:
-            if owner["main"]:
-                data.main_owner = owner["owner"]
-                break
+        if manual:
+            return None
+
+        return await transition(
+            data,
+            request.state.user_id,
+            states,
+            to_state,
+            set_verifier=set_verifier,
+            extra=extra,
+            action_log=action_log,
+            context=getattr(data, "reason", None),
+        )
 
     def decorator(function):
         if not with_reason:
             async def wrapper(request: Request, csrf_token: str, data: Action):
                 if res := await _core(request, csrf_token, data):
                     return res
-                res = await function(request, data)
-                if action_log:
-                    ... 
-                return res
+                return await function(request, data)
         else:
             async def wrapper(request: Request, csrf_token: str, data: ActionWithReason):
                 if res := await _core(request, csrf_token, data):
                     return res
-                if len(data.reason) < 5:
-                    return ORJSONResponse({
-                        "detail": "Reason must be more than 5 characters"
-                    }, status_code=400)
-                res = await function(request, data)
-                if action_log:
-                    ...
-                return res
+                return await function(request, data)
         return wrapper
     return decorator
 
 # TODO: Implement this if we go ahead with this
 @app.post("/bot-actions/claim")
-@action([enums.BotState.pending], with_reason=False)
+@action([enums.BotState.pending], with_reason=False, to_state=enums.BotState.under_review, set_verifier=True, action_log=enums.UserBotAction.claim)
 async def claim(request: Request, data: Action):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.under_review, request.state.user_id, int(data.bot_id))
-    
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0x00ff00,
@@ -2000,10 +2464,8 @@ async def claim(request: Request, data: Action):
     return {"detail": "Successfully claimed bot!"}
 
 @app.post("/bot-actions/unclaim")
-@action([enums.BotState.under_review], with_reason=True)
+@action([enums.BotState.under_review], with_reason=True, to_state=enums.BotState.pending, action_log=enums.UserBotAction.unclaim)
 async def unclaim(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1 WHERE bot_id = $2", enums.BotState.pending, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0x00ff00,
@@ -2018,7 +2480,7 @@ async def unclaim(request: Request, data: ActionWithReason):
     return {"detail": "Successfully unclaimed bot"}
 
 @app.post("/bot-actions/approve")
-@action([enums.BotState.under_review], with_reason=True)
+@action([enums.BotState.under_review], with_reason=True, manual=True)
 async def approve(request: Request, data: ActionWithReason):
     # Get approximate guild count
     async with aiohttp.ClientSession() as sess:
@@ -2030,8 +2492,18 @@ async def approve(request: Request, data: ActionWithReason):
             japi = await resp.json()
             approx_guild_count = japi["data"]["bot"]["approximate_guild_count"]
 
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2, guild_count = $3 WHERE bot_id = $4", enums.BotState.approved, request.state.user_id, approx_guild_count, data.bot_id)
-    
+    if res := await transition(
+        data,
+        request.state.user_id,
+        [enums.BotState.under_review],
+        enums.BotState.approved,
+        set_verifier=True,
+        extra={"guild_count": approx_guild_count},
+        action_log=enums.UserBotAction.approve,
+        context=data.reason,
+    ):
+        return res
+
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0x00ff00,
@@ -2045,15 +2517,13 @@ async def approve(request: Request, data: ActionWithReason):
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
     
     for owner in data.owners:
-        asyncio.create_task(add_role(main_server, owner["owner"], bot_developer, "Bot Approved"))
+        discord.spawn(add_role(main_server, owner["owner"], bot_developer, "Bot Approved"))
 
     return {"detail": "Successfully approved bot", "guild_id": str(main_server)}
 
 @app.post("/bot-actions/deny")
-@action([enums.BotState.under_review], with_reason=True)
+@action([enums.BotState.under_review], with_reason=True, to_state=enums.BotState.denied, set_verifier=True, action_log=enums.UserBotAction.deny)
 async def deny(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.denied, request.state.user_id, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0xe74c3c,
@@ -2068,10 +2538,8 @@ async def deny(request: Request, data: ActionWithReason):
     return {"detail": "Successfully denied bot"}
 
 @app.post("/bot-actions/ban")
-@action([enums.BotState.approved], min_perm=4, with_reason=True)
+@action([enums.BotState.approved], min_perm=4, with_reason=True, to_state=enums.BotState.banned, set_verifier=True, action_log=enums.UserBotAction.ban)
 async def ban(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.banned, request.state.user_id, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0xe74c3c,
@@ -2081,17 +2549,15 @@ async def ban(request: Request, data: ActionWithReason):
 
     embed.add_field(name="Reason", value=data.reason)
 
-    asyncio.create_task(ban_user(main_server, data.bot_id, data.reason))
+    discord.spawn(ban_user(main_server, data.bot_id, data.reason))
 
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
     return {"detail": "Successfully banned bot"}
 
 @app.post("/bot-actions/unban")
-@action([enums.BotState.banned], min_perm=4, with_reason=True)
+@action([enums.BotState.banned], min_perm=4, with_reason=True, to_state=enums.BotState.approved, set_verifier=True)
 async def unban(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.approved, request.state.user_id, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0x00ff00,
@@ -2101,17 +2567,15 @@ async def unban(request: Request, data: ActionWithReason):
 
     embed.add_field(name="Reason", value=data.reason)
 
-    asyncio.create_task(unban_user(main_server, data.bot_id, data.reason))
+    discord.spawn(unban_user(main_server, data.bot_id, data.reason))
 
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
     return {"detail": "Successfully unbanned bot"}
 
 @app.post("/bot-actions/certify")
-@action([enums.BotState.approved], with_reason=True, min_perm=5)
+@action([enums.BotState.approved], with_reason=True, min_perm=5, to_state=enums.BotState.certified, set_verifier=True, action_log=enums.UserBotAction.certify)
 async def certify(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.certified, request.state.user_id, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0x00ff00,
@@ -2122,20 +2586,18 @@ async def certify(request: Request, data: ActionWithReason):
     embed.add_field(name="Feedback", value=data.reason)
 
     for owner in data.owners:
-        asyncio.create_task(add_role(main_server, owner["owner"], certified_developer, "Bot certified - owner gets role"))
+        discord.spawn(add_role(main_server, owner["owner"], certified_developer, "Bot certified - owner gets role"))
 
     # Add certified bot role to bot
-    asyncio.create_task(add_role(main_server, data.bot_id, certified_bot, "Bot certified - add bots role"))
+    discord.spawn(add_role(main_server, data.bot_id, certified_bot, "Bot certified - add bots role"))
 
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
     return {"detail": "Successfully certified bot"}
 
 @app.post("/bot-actions/uncertify")
-@action([enums.BotState.certified], with_reason=True, min_perm=5)
+@action([enums.BotState.certified], with_reason=True, min_perm=5, to_state=enums.BotState.approved)
 async def uncertify(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1 WHERE bot_id = $2", enums.BotState.approved, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0xe74c3c,
@@ -2146,20 +2608,18 @@ async def uncertify(request: Request, data: ActionWithReason):
     embed.add_field(name="Reason", value=data.reason)
 
     for owner in data.owners:
-        asyncio.create_task(del_role(main_server, owner["owner"], certified_developer, "Bot uncertified - Owner gets role"))
+        discord.spawn(del_role(main_server, owner["owner"], certified_developer, "Bot uncertified - Owner gets role"))
 
     # Add certified bot role to bot
-    asyncio.create_task(del_role(main_server, data.bot_id, certified_bot, "Bot uncertified - Bots Role"))
+    discord.spawn(del_role(main_server, data.bot_id, certified_bot, "Bot uncertified - Bots Role"))
 
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
     return {"detail": "Successfully uncertified bot"}
 
 @app.post("/bot-actions/unverify")
-@action([enums.BotState.approved], with_reason=True, min_perm=3)
+@action([enums.BotState.approved], with_reason=True, min_perm=3, to_state=enums.BotState.pending, set_verifier=True)
 async def unverify(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.pending, request.state.user_id, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0xe74c3c,
@@ -2174,10 +2634,8 @@ async def unverify(request: Request, data: ActionWithReason):
     return {"detail": "Successfully unverified bot"}
 
 @app.post("/bot-actions/requeue")
-@action([enums.BotState.banned, enums.BotState.denied], with_reason=True, min_perm=3)
+@action([enums.BotState.banned, enums.BotState.denied], with_reason=True, min_perm=3, to_state=enums.BotState.pending, set_verifier=True)
 async def requeue(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET state = $1, verifier = $2 WHERE bot_id = $3", enums.BotState.pending, request.state.user_id, data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0x00ff00,
@@ -2192,10 +2650,8 @@ async def requeue(request: Request, data: ActionWithReason):
     return {"detail": "Successfully requeued bot"}
 
 @app.post("/bot-actions/reset-votes")
-@action([], with_reason=True, min_perm=3)
+@action([], with_reason=True, min_perm=3, extra={"votes": 0})
 async def reset_votes(request: Request, data: ActionWithReason):
-    await app.state.db.execute("UPDATE bots SET votes = 0 WHERE bot_id = $1", data.bot_id)
-
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
         color=0xe74c3c,
@@ -2210,28 +2666,23 @@ async def reset_votes(request: Request, data: ActionWithReason):
     return {"detail": "Successfully reset bot votes"}
 
 @app.post("/bot-actions/set-flag")
-@action([], with_reason=True, min_perm=3)
+@action([], with_reason=True, min_perm=3, manual=True)
 async def set_flags(request: Request, data: ActionWithReason):
     if not isinstance(data.context, int):
         return ORJSONResponse({"detail": "Flag must be an integer"}, status_code=400)
     try:
-        flag = enums.BotFlag(data.context)
+        flag = enum_member("BotFlag", data.context)
     except:
         return ORJSONResponse({"detail": "Flag must be of enum Flag"}, status_code=400)
-    
-    existing_flags = await app.state.db.fetchval("SELECT flags FROM bots WHERE bot_id = $1", data.bot_id)
-    existing_flags = existing_flags or []
-    existing_flags = set(existing_flags)
-    existing_flags.add(int(flag))
-
-    try:
-        existing_flags.remove(int(enums.BotFlag.unlocked))
-    except:
-        pass
 
-    existing_flags = list(existing_flags)
-    existing_flags.sort()
-    await app.state.db.fetchval("UPDATE bots SET flags = $1 WHERE bot_id = $2", existing_flags, data.bot_id)
+    if res := await transition(
+        data,
+        request.state.user_id,
+        [],
+        extra={"flags": SQL(SET_FLAG_SQL, int(flag))},
+        returning=["flags"],
+    ):
+        return res
 
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
@@ -2244,34 +2695,28 @@ async def set_flags(request: Request, data: ActionWithReason):
 
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
-    return {"detail": "Successfully set flag"}
+    return {"detail": "Successfully set flag", "flags": data.returned["flags"]}
 
 @app.post("/bot-actions/unset-flag")
-@action([], with_reason=True, min_perm=3)
+@action([], with_reason=True, min_perm=3, manual=True)
 async def unset_flags(request: Request, data: ActionWithReason):
     if not isinstance(data.context, int):
         return ORJSONResponse({"detail": "Flag must be an integer"}, status_code=400)
     try:
-        flag = enums.BotFlag(data.context)
+        flag = enum_member("BotFlag", data.context)
     except:
         return ORJSONResponse({"detail": "Flag must be of enum Flag"}, status_code=400)
-    
-    existing_flags = await app.state.db.fetchval("SELECT flags FROM bots WHERE bot_id = $1", data.bot_id)
-    existing_flags = existing_flags or []
-    existing_flags = set(existing_flags)
-    try:
-        existing_flags.remove(int(flag))
-    except:
-        return ORJSONResponse({"detail": "Flag not on this bot"}, status_code=400)
-
-    try:
-        existing_flags.remove(int(enums.BotFlag.unlocked))
-    except:
-        pass
 
-    existing_flags = list(existing_flags)
-    existing_flags.sort()
-    await app.state.db.fetchval("UPDATE bots SET flags = $1 WHERE bot_id = $2", existing_flags, data.bot_id)
+    if res := await transition(
+        data,
+        request.state.user_id,
+        [],
+        extra={"flags": SQL(UNSET_FLAG_SQL, int(flag))},
+        where=SQL("bots.flags @> ARRAY[$value::int]", int(flag)),
+        returning=["flags"],
+        detail="Flag not on this bot or bot doesn't exist",
+    ):
+        return res
 
     embed = Embed(
         url=f"https://fateslist.xyz/bot/{data.bot_id}", 
@@ -2284,7 +2729,213 @@ async def unset_flags(request: Request, data: ActionWithReason):
 
     await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": f"<@{data.main_owner}>", "embed": embed.to_dict(), "channel_id": str(bot_logs)})
 
-    return {"detail": "Successfully unset flag"}
+    return {"detail": "Successfully unset flag", "flags": data.returned["flags"]}
+
+class BulkAction(BaseModel):
+    bot_ids: list[str]
+    reason: str
+    context: Any | None = None
+
+MAX_BULK_BOTS = 500
+
+# How each bulk action transitions bots, see transition_many
+BULK_ACTIONS = {
+    "approve": {
+        "states": [enums.BotState.under_review],
+        "to_state": enums.BotState.approved,
+        "set_verifier": True,
+        "action_log": enums.UserBotAction.approve,
+        "min_perm": 2,
+        "title": "Bots Approved",
+        "verb": "approved",
+        "color": 0x00ff00,
+    },
+    "deny": {
+        "states": [enums.BotState.under_review],
+        "to_state": enums.BotState.denied,
+        "set_verifier": True,
+        "action_log": enums.UserBotAction.deny,
+        "min_perm": 2,
+        "title": "Bots Denied",
+        "verb": "denied",
+        "color": 0xe74c3c,
+    },
+    "ban": {
+        "states": [enums.BotState.approved],
+        "to_state": enums.BotState.banned,
+        "set_verifier": True,
+        "action_log": enums.UserBotAction.ban,
+        "min_perm": 4,
+        "title": "Bots Banned",
+        "verb": "banned",
+        "color": 0xe74c3c,
+    },
+    "requeue": {
+        "states": [enums.BotState.banned, enums.BotState.denied],
+        "to_state": enums.BotState.pending,
+        "set_verifier": True,
+        "min_perm": 3,
+        "title": "Bots Requeued",
+        "verb": "requeued",
+        "color": 0x00ff00,
+    },
+    "reset-votes": {
+        "states": [],
+        "extra": {"votes": 0},
+        "min_perm": 3,
+        "title": "Bot Votes Reset",
+        "verb": "force resetted the votes of",
+        "color": 0xe74c3c,
+    },
+    "set-flag": {
+        "states": [],
+        "min_perm": 3,
+        "title": "Bot Flags Updated",
+        "verb": "modified the flags of",
+        "color": 0xe74c3c,
+    },
+}
+
+
+async def notify_owners_bulk(title: str, description: str, color: int, reason: str, owners: dict[int, list[dict]]):
+    """One bot_logs message per 20 bots instead of one per bot"""
+    bot_ids = list(owners)
+    for i in range(0, len(bot_ids), 20):
+        chunk = bot_ids[i:i+20]
+        embed = Embed(
+            color=color,
+            title=title,
+            description=description + "\n" + "\n".join(f"<@{bot_id}> (https://fateslist.xyz/bot/{bot_id})" for bot_id in chunk),
+        )
+        embed.add_field(name="Reason", value=reason[:1024])
+
+        mentions = {f"<@{main_owner_of(owners[bot_id])}>" for bot_id in chunk if main_owner_of(owners[bot_id])}
+        await redis_ipc_new(app.state.redis, "SENDMSG", msg={"content": " ".join(sorted(mentions)), "embed": embed.to_dict(), "channel_id": str(bot_logs)})
+
+@app.post("/bot-actions/bulk/{name}")
+async def bulk_action(request: Request, name: str, csrf_token: str, data: BulkAction):
+    """Applies a bot action to many bots in one transaction, returning the result for each bot"""
+    spec = BULK_ACTIONS.get(name)
+    if not spec:
+        return ORJSONResponse({"detail": f"Unknown bulk action. Must be one of {', '.join(BULK_ACTIONS)}"}, status_code=404)
+
+    if request.state.member.perm < spec["min_perm"]:
+        return ORJSONResponse({
+            "detail": f"This operation has a minimum perm of {spec['min_perm']} but you have permission level {request.state.member.perm}"
+        }, status_code=400)
+
+    if csrf_token != request.cookies.get("csrf_token_ba") or csrf_token not in app.state.valid_csrf:
+        return ORJSONResponse({
+            "detail": "CSRF Token is invalid. Consider copy pasting reason and reloading your page"
+        }, status_code=400)
+
+    if len(data.reason) < 5:
+        return ORJSONResponse({
+            "detail": "Reason must be more than 5 characters"
+        }, status_code=400)
+
+    if len(data.bot_ids) > MAX_BULK_BOTS:
+        return ORJSONResponse({"detail": f"At most {MAX_BULK_BOTS} bots can be updated at once"}, status_code=400)
+
+    results = {}
+    bot_ids = []
+    for bot_id in data.bot_ids:
+        if not bot_id.isdigit():
+            results[bot_id] = "Bot ID is invalid"
+        elif int(bot_id) not in bot_ids:
+            bot_ids.append(int(bot_id))
+    requested = list(bot_ids)
+
+    kwargs = {
+        "set_verifier": spec.get("set_verifier", False),
+        "extra": dict(spec.get("extra", {})),
+        "action_log": spec.get("action_log"),
+        "context": data.reason,
+    }
+
+    if name == "set-flag":
+        if not isinstance(data.context, int):
+            return ORJSONResponse({"detail": "Flag must be an integer"}, status_code=400)
+        try:
+            flag = enum_member("BotFlag", data.context)
+        except ValueError:
+            return ORJSONResponse({"detail": "Flag must be of enum Flag"}, status_code=400)
+        kwargs["extra"]["flags"] = SQL(SET_FLAG_SQL, int(flag))
+
+    if name == "approve":
+        # Only bots that can be approved are worth a japi.rest lookup (transition_many still guards the state)
+        bot_ids = [
+            row["bot_id"] for row in await app.state.db.fetch(
+                "SELECT bot_id FROM bots WHERE bot_id = ANY($1::bigint[]) AND state = ANY($2::int[])",
+                bot_ids,
+                [int(state) for state in spec["states"]],
+            )
+        ]
+
+        # Get approximate guild counts
+        sem = asyncio.Semaphore(10)
+
+        async def _guild_count(sess, bot_id):
+            """Returns the bot id and its guild count, or an error for this bot"""
+            async with sem:
+                try:
+                    async with sess.get(f"https://japi.rest/discord/v1/application/{bot_id}") as resp:
+                        if resp.status != 200:
+                            return bot_id, None, f"Bot does not exist or japi.rest is down. Got status code {resp.status}"
+                        japi = await resp.json()
+                        return bot_id, japi["data"]["bot"]["approximate_guild_count"], None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    return bot_id, None, f"Could not reach japi.rest: {type(exc).__name__} {exc}"
+                except (KeyError, TypeError, ValueError):
+                    return bot_id, None, "japi.rest did not return a guild count for this bot"
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as sess:
+            counts = await asyncio.gather(*[_guild_count(sess, bot_id) for bot_id in bot_ids])
+
+        guild_counts = {}
+        for bot_id, count, err in counts:
+            if err:
+                results[str(bot_id)] = err
+            else:
+                guild_counts[bot_id] = count
+
+        bot_ids = list(guild_counts)
+        kwargs["per_bot"] = {"guild_count": ("bigint", [guild_counts[bot_id] for bot_id in bot_ids])}
+
+    owners = {}
+    if bot_ids:
+        bots = await transition_many(bot_ids, request.state.user_id, spec["states"], spec.get("to_state"), **kwargs)
+        owners = {bot_id: bot["owners"] for bot_id, bot in bots.items()}
+
+    for bot_id in requested:
+        if str(bot_id) in results:
+            continue
+        if bot_id in owners:
+            results[str(bot_id)] = "OK"
+        else:
+            results[str(bot_id)] = f"Bot is not in acceptable states or doesn't exist: Acceptable states are {spec['states']}"
+
+    if owners:
+        if name == "approve":
+            for bot_owners in owners.values():
+                for owner in bot_owners:
+                    discord.spawn(add_role(main_server, owner["owner"], bot_developer, "Bot Approved"))
+        elif name == "ban":
+            for bot_id in owners:
+                discord.spawn(ban_user(main_server, bot_id, data.reason))
+
+        await notify_owners_bulk(
+            spec["title"],
+            f"<@{request.state.user_id}> has {spec['verb']} the following bots:",
+            spec["color"],
+            data.reason,
+            owners,
+        )
+
+    return {
+        "detail": f"Successfully updated {len(owners)} of {len(results)} bots",
+        "results": [{"bot_id": bot_id, "ok": detail == "OK", "detail": detail} for bot_id, detail in results.items()],
+    }
 
 @app.get("/links")
 def links(request: Request):
@@ -2389,21 +3040,107 @@ def docs_source(page: str):
     }
 
 @app.get("/requests")
-async def lynx_request_logs():
-    requests = await app.state.db.fetch("SELECT user_id, method, url, status_code, request_time from lynx_logs")
-    requests_html = ""
-    for request in requests:
-        requests_html += f"""
-        <p>{request["user_id"]} - {request["method"]} - {request["url"]} - {request["status_code"]} - {request["request_time"]}</p>
-        """
+async def lynx_request_logs(request: Request, before: str | None = None, limit: int = request_logs.PAGE_SIZE):
+    try:
+        filters = request_logs.LogFilters(request.query_params)
+        rows, next_cursor = await request_logs.fetch_page(app.state.db, filters, cursor=before, limit=limit)
+    except ValueError as exc:
+        return ORJSONResponse({"title": "Lynx Request Logs", "pre": "/requests", "data": f"<h3>Invalid filter: {bleach.clean(str(exc))}</h3>"})
+
+    per_day, per_user = await request_logs.fetch_overview(app.state.db)
+
+    overview_html = "".join(
+        f"<tr><td>{day['day']}</td><td>{day['requests']}</td><td>{day['errors']}</td></tr>" for day in per_day
+    )
+    users_html = "".join(
+        f"<tr><td><a href='/requests?user_id={user['user_id']}'>{user['user_id']}</a></td><td>{user['requests']}</td><td>{user['errors']}</td></tr>" for user in per_user
+    )
+    requests_html = "".join(
+        f"""<tr><td>{row["request_time"]}</td><td>{row["user_id"]}</td><td>{bleach.clean(row["method"])}</td><td>{row["status_code"]}</td><td>{bleach.clean(row["url"])}</td></tr>"""
+        for row in rows
+    )
+
+    params = filters.params()
+    next_html = ""
+    if next_cursor:
+        next_html = f"<a href='/requests?{html.escape(urlencode(params | {'before': next_cursor, 'limit': limit}))}'>Older requests</a>"
+
+    def _value(key: str):
+        return html.escape(params.get(key, ""), quote=True)
 
     return ORJSONResponse({
         "title": "Lynx Request Logs",
         "pre": "/links",
         "data": f"""
-        {requests_html}
+        <h3>Last 14 days</h3>
+        <table class="table">
+            <thead><tr><th>Day</th><th>Requests</th><th>Errors</th></tr></thead>
+            <tbody>{overview_html}</tbody>
+        </table>
+        <table class="table">
+            <thead><tr><th>User</th><th>Requests</th><th>Errors</th></tr></thead>
+            <tbody>{users_html}</tbody>
+        </table>
+
+        <h3>Requests</h3>
+        <form method="GET" action="/requests">
+            <label for="user_id">User ID</label>
+            <input id="user_id" name="user_id" value="{_value('user_id')}" />
+            <label for="method">Method</label>
+            <input id="method" name="method" value="{_value('method')}" placeholder="GET, POST..." />
+            <label for="status">Status</label>
+            <input id="status" name="status" value="{_value('status')}" placeholder="200, 4xx, errors..." />
+            <label for="since">Since</label>
+            <input id="since" name="since" value="{_value('since')}" placeholder="2022-06-01T00:00:00" />
+            <label for="until">Until</label>
+            <input id="until" name="until" value="{_value('until')}" />
+            <button type="submit">Filter</button>
+        </form>
+        <button id="export-btn" onclick="exportLogs()">Export</button>
+
+        <table class="table">
+            <thead><tr><th>Time</th><th>User</th><th>Method</th><th>Status</th><th>URL</th></tr></thead>
+            <tbody>{requests_html}</tbody>
+        </table>
+        {next_html}
+        """,
+        "script": f"""
+            async function exportLogs() {{
+                document.querySelector("#export-btn").innerText = "Exporting..."
+                let res = await fetch("/requests/export?{urlencode(params)}", {{
+                    method: "GET",
+                    credentials: 'same-origin',
+                    headers: {{
+                        "Frostpaw-Staff-Notify": "0.1.0"
+                    }},
+                }})
+                let blob = await res.blob()
+                let link = document.createElement("a")
+                link.href = URL.createObjectURL(blob)
+                link.download = "lynx_logs.ndjson"
+                link.click()
+                document.querySelector("#export-btn").innerText = "Export"
+            }}
         """
-    })        
+    })
+
+@app.get("/requests/export")
+async def lynx_request_logs_export(request: Request):
+    """Streams every log matching the filters as newline delimited JSON"""
+    try:
+        filters = request_logs.LogFilters(request.query_params)
+    except ValueError as exc:
+        return ORJSONResponse({"detail": str(exc)}, status_code=400)
+
+    query, args = request_logs.build_query(filters)
+
+    async def _export():
+        async with app.state.db.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor(query, *args, prefetch=1000):
+                    yield orjson.dumps(dict(row)) + b"\n"
+
+    return StreamingResponse(_export(), media_type="application/x-ndjson")
 
 @app.post("/verify-code")
 async def verify_code(request: Request):
@@ -2442,6 +3179,7 @@ async def verify_code(request: Request):
             body["code"],
             int(request.scope["sunbeam_user"]["user"]["id"]),
         )
+        auth_cache.invalidate(int(request.scope["sunbeam_user"]["user"]["id"]))
 
         await add_role(staff_server, request.scope["sunbeam_user"]["user"]["id"], access_granted_role, "Access granted to server")
         await add_role(staff_server, request.scope["sunbeam_user"]["user"]["id"], request.state.member.staff_id, "Gets corresponding staff role")
@@ -2646,27 +3384,22 @@ async def addstaff(request: Request, data: UserAction):
     await add_role(main_server, data.user_id, staff_roles["bot_reviewer"]["id"], "New staff member")
 
     # Check if DMable by attempting to send a message
-    async with aiohttp.ClientSession() as sess:
-        async with sess.post(
-            "https://discord.com/api/v10/users/@me/channels", 
-            json={"recipient_id": str(data.user_id)},
-            headers={"Authorization": f"Bot {main_bot_token}"}) as res:
-            if res.status != 200:
-                json = await res.json()
-                return ORJSONResponse({
-                    "detail": f"User is not DMable {json}"
-                }, status_code=400)
-            json = await res.json()
-            channel_id = json["id"]
+    try:
+        channel = await discord.request(Route("POST", "/users/@me/channels"), json={"recipient_id": str(data.user_id)})
+    except DiscordError as exc:
+        return ORJSONResponse({
+            "detail": f"User is not DMable {exc.data}"
+        }, status_code=400)
 
-        embed = Embed(
-            color=0xe74c3c,
-            title="Staff Application Accepted",
-            description=f"You have been accepted into the Fates List Staff Team!",
-        )
+    embed = Embed(
+        color=0xe74c3c,
+        title="Staff Application Accepted",
+        description=f"You have been accepted into the Fates List Staff Team!",
+    )
 
-        async with sess.post(
-            f"https://discord.com/api/v10/channels/{channel_id}/messages",
+    try:
+        await discord.request(
+            Route("POST", "/channels/{channel_id}/messages", channel_id=channel["id"]),
             json={
                 "content": """
 Please join our staff server first of all: https://fateslist.xyz/banappeal/invite
@@ -2674,14 +3407,12 @@ Please join our staff server first of all: https://fateslist.xyz/banappeal/invit
 Then head on over to https://lynx.fateslist.xyz to read our staff guide and get started!
                 """, 
                 "embeds": [embed.to_dict()],
-            },
-            headers={"Authorization": f"Bot {main_bot_token}"}
-        ) as resp:
-            if resp.status != 200:
-                json = await resp.json()
-                return ORJSONResponse({
-                    "detail": f"Failed to send DM to user {json}"
-                }, status_code=400)
+            }
+        )
+    except DiscordError as exc:
+        return ORJSONResponse({
+            "detail": f"Failed to send DM to user {exc.data}"
+        }, status_code=400)
 
     return {"detail": "Successfully added staff member"}
 
@@ -2697,10 +3428,14 @@ async def startup():
     app.state.redis = aioredis.from_url("redis://localhost:1001", db=1)
     app.state.db = await asyncpg.create_pool()
     await engine.start_connection_pool()
+    audit_log.start(app.state.db)
+    discord.start()
 
 @app.on_event("shutdown")
 async def close():
+    await audit_log.close()
+    await discord.close()
     await app.state.engine.close_connection_pool()
 
-app.add_middleware(CustomHeaderMiddleware)
-app.add_middleware(NoCacher)
+app.add_middleware(LynxMiddleware)
+app.add_middleware(CompressionMiddleware, redis=lambda scope: getattr(app.state, "redis", None))
@@ -0,0 +1,164 @@
+"""
+Batched writer for the Lynx audit log (``lynx_logs``)
+
+Requests only append their entry to a bounded in memory queue, a background task
+``COPY``s the entries to postgres every ``batch_size`` entries or ``flush_interval``
+seconds, whichever comes first. The time of the request is recorded when it is
+appended so batching doesn't change ``request_time``.
+
+When the queue is full, entries are either appended to a spill file (the default)
+or ``put`` waits for room (``overflow="block"``). Batches that fail to be written
+are spilled as well. The spill file is written back on the next flush that
+succeeds, so the audit trail stays complete across postgres outages and restarts.
+``close`` flushes everything that is left on shutdown
+"""
+import asyncio
+import datetime
+import os
+from pathlib import Path
+from typing import Optional
+
+import asyncpg
+import orjson
+
+COLUMNS = ("user_id", "method", "url", "status_code", "request_time")
+
+
+class AuditLog:
+    def __init__(
+        self,
+        *,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000,
+        overflow: str = "spill",
+        spill_path: Path = Path("data/lynx_logs.spill"),
+    ):
+        if overflow not in ("spill", "block"):
+            raise ValueError("overflow must be spill or block")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.queue: asyncio.Queue[Optional[tuple]] = asyncio.Queue(maxsize=max_queue)
+        self.postgres: Optional[asyncpg.Pool] = None
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.spilled = 0
+
+    def start(self, postgres: asyncpg.Pool):
+        self.postgres = postgres
+        self.task = asyncio.create_task(self._run())
+
+    async def put(self, user_id: int, method: str, url: str, status_code: int):
+        entry = (user_id, method, url, status_code, datetime.datetime.now(datetime.timezone.utc))
+
+        if self.overflow == "block":
+            return await self.queue.put(entry)
+
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self._spill([entry])
+
+    def _spill(self, entries: list[tuple]):
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.spill_path.open("ab") as spill:
+            for entry in entries:
+                spill.write(orjson.dumps(entry) + b"\n")
+        self.spilled += len(entries)
+
+    def _take_spilled(self) -> list[tuple]:
+        """Reads back (and removes) the spill file"""
+        if not self.spill_path.exists():
+            return []
+
+        # Rename first so entries spilled while this batch is written go to a new file
+        taken = self.spill_path.with_name(f"{self.spill_path.name}.{os.getpid()}")
+        self.spill_path.rename(taken)
+        entries = []
+        for line in taken.read_bytes().splitlines():
+            if not line:
+                continue
+            user_id, method, url, status_code, request_time = orjson.loads(line)
+            entries.append((user_id, method, url, status_code, datetime.datetime.fromisoformat(request_time)))
+        taken.unlink()
+        return entries
+
+    async def _write(self, batch: list[tuple]):
+        try:
+            await self.postgres.copy_records_to_table("lynx_logs", records=batch, columns=COLUMNS)
+        except Exception as exc:
+            # Anything (connection lost, timeouts, closed pool etc.) must not stop the writer
+            print(f"[LYNX] Failed to write {len(batch)} audit log entries, spilling them: {exc}")
+            self._spill(batch)
+            return
+
+        self.written += len(batch)
+
+        if self.spill_path.exists():
+            spilled = self._take_spilled()
+            if spilled:
+                await self._write(spilled)
+
+    def _drain(self, batch: list[tuple]) -> bool:
+        """Takes what is already queued into the batch, returns False once closed"""
+        while len(batch) < self.batch_size:
+            try:
+                entry = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if entry is None:
+                return False
+            batch.append(entry)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        running = True
+
+        while running:
+            entry = await self.queue.get()
+            if entry is None:
+                return
+
+            batch = [entry]
+            deadline = loop.time() + self.flush_interval
+
+            running = self._drain(batch)
+            while running and len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    running = False
+                    break
+                batch.append(entry)
+                running = self._drain(batch)
+
+            try:
+                await self._write(batch)
+            except Exception as exc:
+                # Only if spilling failed too (e.g. disk full), keep the writer alive for the next batches
+                print(f"[LYNX] Lost {len(batch)} audit log entries: {exc}")
+
+    async def close(self):
+        """Stops the writer once it has written everything queued so far"""
+        if self.task:
+            # Everything queued before the sentinel is written by the writer itself
+            await self.queue.put(None)
+            await self.task
+            self.task = None
+
+        batch = []
+        while not self.queue.empty():
+            entry = self.queue.get_nowait()
+            if entry is not None:
+                batch.append(entry)
+        if batch:
+            await self._write(batch)
@@ -0,0 +1,68 @@
+"""
+Short lived cache of validated Lynx auth contexts
+
+Authenticating a Lynx request means checking the api token in postgres, asking
+for the staff perm over IPC (GETPERM) and checking the staff verify code. The
+result of all of that is cached here keyed by (user_id, hash of the token) so a
+staff member clicking around only pays for it once every ``ttl`` seconds.
+
+Anything that changes the token or verification state of a user must call
+``invalidate`` (reset-creds, verify-code, the ratelimit token reset). Changes made
+outside of Lynx (e.g. perms being changed) are picked up once the entry expires
+"""
+import hashlib
+import time
+from typing import Any, Optional
+
+
+class AuthContext:
+    """The validated identity of a user"""
+    __slots__ = ("user_id", "perm", "member", "is_verified", "expires")
+
+    def __init__(self, user_id: int, perm: int, member: Any, is_verified: Optional[bool], expires: float):
+        self.user_id = user_id
+        self.perm = perm
+        self.member = member
+        self.is_verified = is_verified  # None if the perm is too low for verification to matter
+        self.expires = expires
+
+
+class AuthCache:
+    def __init__(self, ttl: float = 30, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: dict[tuple[int, bytes], AuthContext] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id: int, token: str) -> tuple[int, bytes]:
+        return (user_id, hashlib.sha256(token.encode()).digest())
+
+    def get(self, user_id: int, token: str) -> Optional[AuthContext]:
+        key = self._key(user_id, token)
+        ctx = self.entries.get(key)
+        if ctx is None or ctx.expires < time.monotonic():
+            if ctx is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ctx
+
+    def set(self, user_id: int, token: str, *, perm: int, member: Any, is_verified: Optional[bool]) -> AuthContext:
+        now = time.monotonic()
+        if len(self.entries) >= self.max_entries:
+            # Drop expired entries first, then the oldest ones (dicts keep insertion order)
+            self.entries = {key: ctx for key, ctx in self.entries.items() if ctx.expires >= now}
+            while len(self.entries) >= self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+        ctx = AuthContext(user_id, perm, member, is_verified, now + self.ttl)
+        self.entries[self._key(user_id, token)] = ctx
+        return ctx
+
+    def invalidate(self, user_id: int):
+        """Drops every cached context of a user (whatever token it was for)"""
+        for key in [key for key in self.entries if key[0] == user_id]:
+            del self.entries[key]
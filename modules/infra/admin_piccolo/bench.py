@@ -0,0 +1,304 @@
+"""
+Benchmarks the per request overhead of the Lynx middleware stack (see
+``site.lynxbench``)
+
+Compares the real ``LynxMiddleware`` from app.py with the stack it replaced: the
+baseline ``CustomHeaderMiddleware`` and ``NoCacher`` (BaseHTTPMiddleware, copied
+below as they were) around the app *and* around the /admin mount, so the Lynx
+pipeline ran twice per admin request. Both run with the same stubbed postgres,
+redis and ``is_staff`` that await ``stage_latency`` per round trip, and the same
+endpoint standing in for piccolo admin. As in production, LynxMiddleware serves
+repeat requests from its auth cache (auth_cache.py) and audit logs through the
+batched writer (audit_log.py). Requests are driven straight through ASGI
+so no server or network time is included
+
+Importing app.py needs the Lynx environment (config/data, piccolo etc.), it is
+not started so no postgres/redis connections are made
+"""
+import asyncio
+import base64
+import contextlib
+import importlib
+import io
+import statistics
+import time
+from http import HTTPStatus
+
+import orjson
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse
+from starlette.routing import Mount, Route
+from starlette.types import ASGIApp
+
+PAYLOAD = {"rows": [{"id": i, "name": f"row {i}", "flags": [1, 2, 3]} for i in range(50)]}
+
+USER_ID = 563808552288780322
+
+SESSION = base64.b64encode(orjson.dumps({
+    "user": {"id": str(USER_ID), "username": "lynxbench"},
+    "token": "lynxbench",
+})).decode()
+
+
+class FakePostgres:
+    """Answers the queries the Lynx middleware makes, each after ``latency`` seconds"""
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def fetchval(self, query: str, *args):
+        await asyncio.sleep(self.latency)
+        if "staff_verify_code" in query:
+            return "code"
+        return USER_ID
+
+    async def execute(self, query: str, *args):
+        await asyncio.sleep(self.latency)
+
+    async def copy_records_to_table(self, table: str, *, records, columns):
+        await asyncio.sleep(self.latency)
+
+
+class FakeRedis:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def get(self, key):
+        await asyncio.sleep(self.latency)
+        return b"0"
+
+    async def set(self, key, value, ex=None):
+        await asyncio.sleep(self.latency)
+
+    async def incr(self, key):
+        await asyncio.sleep(self.latency)
+        return 1
+
+    async def ttl(self, key):
+        await asyncio.sleep(self.latency)
+        return 30
+
+
+def load_lynx(stage_latency: float):
+    """Imports app.py and stubs out everything that would talk to postgres/redis"""
+    lynx = importlib.import_module("modules.infra.admin_piccolo.app")
+
+    async def is_staff(staff_json, user_id, base_perm, json=False, *, worker_session=None, redis=None):
+        await asyncio.sleep(stage_latency)
+        member = lynx.StaffMember(name="lynxbench", id=user_id, staff_id="0", perm=5)
+        return member.perm >= base_perm, member.perm, member
+
+    lynx.app.state.db = FakePostgres(stage_latency)
+    lynx.app.state.redis = FakeRedis(stage_latency)
+    lynx.is_staff = is_staff
+    lynx.code_check = lambda code, user_id: True
+    lynx.auth_cache.invalidate(USER_ID)
+    return lynx
+
+
+def baseline_middlewares(lynx):
+    """CustomHeaderMiddleware and NoCacher as they were before LynxMiddleware"""
+    class CustomHeaderMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            lynx_form_html = lynx.lynx_form_beta.replace("%username%", "Not logged in")
+
+            if request.url.path.startswith("/_"):
+                return await call_next(request)
+
+            if request.url.path.startswith(("/staff-guide", "/requests", "/links", "/roadmap", "/docs")) or request.url.path == "/":
+                if request.headers.get("Frostpaw-Staff-Notify"):
+                    return await call_next(request)
+                else:
+                    return HTMLResponse(lynx_form_html)
+            print("Calling custom lynx")
+            if request.cookies.get("sunbeam-session:warriorcats"):
+                request.scope["sunbeam_user"] = orjson.loads(base64.b64decode(request.cookies.get("sunbeam-session:warriorcats")))
+            else:
+                return RedirectResponse(f"https://fateslist.xyz/frostpaw/herb?redirect={request.url}")
+
+            check = await lynx.app.state.db.fetchval(
+                "SELECT user_id FROM users WHERE user_id = $1 AND api_token = $2",
+                int(request.scope["sunbeam_user"]["user"]["id"]),
+                request.scope["sunbeam_user"]["token"]
+            )
+
+            if not check:
+                return HTMLResponse(lynx_form_html)
+
+            _, perm, member = await lynx.is_staff(None, int(request.scope["sunbeam_user"]["user"]["id"]), 2, redis=lynx.app.state.redis)
+
+            request.state.member = member
+
+            if member.perm >= 2:
+                staff_verify_code = await lynx.app.state.db.fetchval(
+                    "SELECT staff_verify_code FROM users WHERE user_id = $1",
+                    int(request.scope["sunbeam_user"]["user"]["id"])
+                )
+
+                request.state.is_verified = True
+
+                if not staff_verify_code or not lynx.code_check(staff_verify_code, int(request.scope["sunbeam_user"]["user"]["id"])):
+                    request.state.is_verified = False
+                    if request.method == "GET" and not request.url.path.startswith("/staff-verify"):
+                        return RedirectResponse("/staff-verify")
+
+            if perm < 2:
+                return HTMLResponse(lynx_form_html)
+
+            key = "rl:%s" % request.scope["sunbeam_user"]["user"]["id"]
+            check = await lynx.app.state.redis.get(key)
+            if not check:
+                await lynx.app.state.redis.set(key, "0", ex=30)
+            if request.method != "GET":
+                await lynx.app.state.redis.incr(key)
+
+            embed = lynx.Embed(
+                title = "Lynx API Request",
+                description = f"**This is usually malicious. When in doubt DM**",
+                color = 0x00ff00,
+            )
+
+            embed.add_field(name="User ID", value=request.scope["sunbeam_user"]["user"]["id"])
+            embed.add_field(name="Username", value=request.scope["sunbeam_user"]["user"]["username"])
+            embed.add_field(name="Request", value=f"{request.method} {request.url}")
+
+            request.state.user_id = int(request.scope["sunbeam_user"]["user"]["id"])
+
+            if not request.url.path.startswith("/admin") and not request.url.path.startswith("/_"):
+                if not request.headers.get("Frostpaw-Staff-Notify") and request.method == "GET":
+                    return HTMLResponse(lynx_form_html)
+                else:
+                    return await call_next(request)
+
+            response = await call_next(request)
+
+            embed.add_field(name="Status Code", value=f"{response.status_code} {HTTPStatus(response.status_code).phrase}")
+
+            await lynx.app.state.db.execute(
+                "INSERT INTO lynx_logs (user_id, method, url, status_code) VALUES ($1, $2, $3, $4)",
+                int(request.scope["sunbeam_user"]["user"]["id"]),
+                request.method,
+                str(request.url),
+                response.status_code
+            )
+
+            if not response.status_code < 400:
+                return response
+
+            try:
+                print(request.user.user.username)
+            except:
+                request.scope["user"] = lynx.Unknown()
+
+            if request.url.path.startswith("/admin/api/tables/leave_of_absence") and request.method == "POST":
+                response_body = [section async for section in response.body_iterator]
+                response.body_iterator = iterate_in_threadpool(iter(response_body))
+
+            return response
+
+    class NoCacher(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            response = await call_next(request)
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+    return CustomHeaderMiddleware, NoCacher
+
+
+async def _endpoint(request):
+    return JSONResponse(PAYLOAD)
+
+
+def _inner() -> ASGIApp:
+    return Starlette(routes=[Route("/{path:path}", _endpoint, methods=["GET", "POST", "PATCH"])])
+
+
+def old_stack(lynx) -> ASGIApp:
+    CustomHeaderMiddleware, NoCacher = baseline_middlewares(lynx)
+    admin = NoCacher(CustomHeaderMiddleware(_inner()))
+    app = Starlette(routes=[Mount("/admin", admin)])
+    app.add_middleware(CustomHeaderMiddleware)
+    app.add_middleware(NoCacher)
+    return app
+
+
+def new_stack(lynx) -> ASGIApp:
+    app = Starlette(routes=[Mount("/admin", _inner())])
+    app.add_middleware(lynx.LynxMiddleware)
+    return app
+
+
+async def _request(app: ASGIApp, path: str):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"lynx.fateslist.xyz"),
+            (b"cookie", f"sunbeam-session:warriorcats={SESSION}".encode()),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 10000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    status = None
+    cache_control = None
+
+    async def send(message):
+        nonlocal status, cache_control
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            cache_control = dict(message["headers"]).get(b"cache-control")
+
+    await app(scope, receive, send)
+    assert status == 200 and cache_control == b"no-store", (status, cache_control)
+
+
+async def _bench(lynx, factory, requests: int, stage_latency: float) -> list[float]:
+    audit_log = lynx.audit_log
+    lynx.audit_log = lynx.AuditLog(overflow="block")
+    lynx.audit_log.start(FakePostgres(stage_latency))
+    app = factory(lynx)
+
+    try:
+        # The Lynx code prints on every request, keep that out of the output
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(100):
+                await _request(app, "/admin/api/tables/")
+
+            timings = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                await _request(app, "/admin/api/tables/")
+                timings.append(time.perf_counter() - start)
+    finally:
+        await lynx.audit_log.close()
+        lynx.audit_log = audit_log
+    return timings
+
+
+def run(requests: int = 5000, stage_latency: float = 0):
+    lynx = load_lynx(stage_latency)
+
+    results = {}
+    for name, factory in (("old", old_stack), ("new", new_stack)):
+        timings = asyncio.run(_bench(lynx, factory, requests, stage_latency))
+        results[name] = timings
+        print(
+            f"{name}: mean {statistics.fmean(timings) * 1e6:.0f}us, "
+            f"p50 {statistics.median(timings) * 1e6:.0f}us, "
+            f"p99 {statistics.quantiles(timings, n=100)[98] * 1e6:.0f}us"
+        )
+
+    old, new = statistics.fmean(results["old"]), statistics.fmean(results["new"])
+    print(f"\nnew stack takes {new / old * 100:.0f}% of the time of the old one ({(old - new) * 1e6:.0f}us less per request)")
@@ -0,0 +1,204 @@
+"""
+Shared Discord REST client for Lynx
+
+One connection pooled session is used for every request. Rate limits are tracked
+per bucket from the ``X-RateLimit-*`` response headers: requests to the same
+bucket are queued and wait for the bucket to reset once it runs out instead of
+hitting 429s. 429s that still happen (e.g. the global limit) are retried after
+the delay Discord asks for (the Retry-After header for Cloudflare's non JSON 429s)
+and 5xx responses are retried with backoff. Error responses always raise
+DiscordError, non JSON bodies are passed on as text. Identical requests that are
+already in flight (e.g. giving the same owner the same role for each of their
+bots) are coalesced into one.
+
+Fire and forget requests go through ``spawn`` so they're tracked and drained on
+shutdown (``close``) instead of being dropped
+"""
+import asyncio
+import time
+from typing import Any, Coroutine, Optional
+
+import aiohttp
+import orjson
+
+API_BASE = "https://discord.com/api/v10"
+
+
+class Route:
+    """A request to a route. ``template`` is the path with ``{name}`` placeholders for ``params``"""
+    __slots__ = ("method", "path", "key")
+
+    def __init__(self, method: str, template: str, **params):
+        self.method = method
+        self.path = template.format(**params)
+        # Buckets are per major parameter
+        major = params.get("guild_id") or params.get("channel_id") or params.get("webhook_id") or ""
+        self.key = f"{method} {template}:{major}"
+
+
+class Bucket:
+    __slots__ = ("lock", "remaining", "reset_at")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+
+    async def wait(self):
+        if self.remaining == 0:
+            delay = self.reset_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.remaining = None
+
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+
+class DiscordError(Exception):
+    def __init__(self, status: int, data: Any):
+        self.status = status
+        self.data = data
+        super().__init__(f"Discord returned {status}: {data}")
+
+
+class DiscordREST:
+    def __init__(self, token: str, *, max_retries: int = 5, connections: int = 50):
+        self.token = token
+        self.max_retries = max_retries
+        self.connections = connections
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.buckets: dict[str, Bucket] = {}
+        self.route_buckets: dict[str, str] = {}  # route key -> bucket key (from X-RateLimit-Bucket)
+        self.global_reset_at = 0.0
+        self.inflight: dict[tuple, asyncio.Future] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    def start(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections),
+            headers={"Authorization": f"Bot {self.token}"},
+            json_serialize=lambda obj: orjson.dumps(obj).decode(),
+        )
+
+    def _bucket(self, route: Route) -> Bucket:
+        key = self.route_buckets.get(route.key, route.key)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket()
+        return bucket
+
+    async def request(self, route: Route, *, json: Any = None, reason: Optional[str] = None) -> Any:
+        """
+        Makes a request, returning the JSON response (None for 204s). Raises
+        DiscordError on error responses
+        """
+        coalesce_key = (route.method, route.path, orjson.dumps(json) if json is not None else None, reason)
+        if (future := self.inflight.get(coalesce_key)) is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[coalesce_key] = future
+        try:
+            result = await self._request(route, json=json, reason=reason)
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark it retrieved so unawaited coalesced futures don't warn
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.inflight[coalesce_key]
+
+    async def _request(self, route: Route, *, json: Any, reason: Optional[str]) -> Any:
+        headers = {}
+        if reason:
+            headers["X-Audit-Log-Reason"] = reason
+
+        bucket = self._bucket(route)
+        async with bucket.lock:
+            for attempt in range(self.max_retries + 1):
+                await bucket.wait()
+                if (delay := self.global_reset_at - time.monotonic()) > 0:
+                    await asyncio.sleep(delay)
+
+                async with self.session.request(route.method, API_BASE + route.path, json=json, headers=headers) as resp:
+                    bucket.update(resp.headers)
+                    if bucket_hash := resp.headers.get("X-RateLimit-Bucket"):
+                        self._learn_bucket(route, bucket_hash, bucket)
+
+                    if resp.status == 204:
+                        return None
+
+                    data = await self._body(resp)
+                    payload = data if isinstance(data, dict) else {}
+
+                    if resp.status == 429 and attempt < self.max_retries:
+                        # Cloudflare 429s have no JSON body, only the Retry-After header
+                        retry_after = float(payload.get("retry_after") or resp.headers.get("Retry-After") or 1)
+                        is_global = payload.get("global", False) or resp.headers.get("X-RateLimit-Global") == "true"
+                        print(f"[LYNX] Ratelimited on {route.key} (global: {is_global}), retrying in {retry_after}s")
+                        if is_global:
+                            self.global_reset_at = time.monotonic() + retry_after
+                        else:
+                            bucket.remaining = 0
+                            bucket.reset_at = time.monotonic() + retry_after
+                        continue
+
+                    if resp.status in (500, 502, 503, 504) and attempt < self.max_retries:
+                        delay = min(2 ** attempt, 30)
+                        print(f"[LYNX] Discord returned {resp.status} on {route.key}, retrying in {delay}s")
+                        await asyncio.sleep(delay)
+                        continue
+
+                    if resp.status >= 400:
+                        raise DiscordError(resp.status, data)
+                    return data
+
+    @staticmethod
+    async def _body(resp: aiohttp.ClientResponse) -> Any:
+        """The JSON body, or the text for non JSON bodies (e.g. Cloudflare HTML error pages)"""
+        body = await resp.read()
+        if not body:
+            return None
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return body.decode(errors="replace")
+
+    def _learn_bucket(self, route: Route, bucket_hash: str, bucket: Bucket):
+        """Routes sharing a bucket hash (and major parameter) share their limits"""
+        key = bucket_hash + ":" + route.key.rpartition(":")[2]
+        if self.route_buckets.get(route.key) == key:
+            return
+        self.route_buckets[route.key] = key
+        # The first route to learn a bucket hands over its state
+        self.buckets.setdefault(key, bucket)
+
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        """Runs a request in the background, tracked so it's awaited on shutdown"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"[LYNX] Background Discord request failed: {task.exception()}")
+
+    async def close(self, timeout: float = 30):
+        """Waits (up to timeout seconds) for background requests then closes the session"""
+        if self.tasks:
+            _, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+        if self.session:
+            await self.session.close()
@@ -0,0 +1,131 @@
+"""
+Queries for the Lynx request log viewer (/requests)
+
+Logs are paginated by keyset on (request_time, id), newest first, so every page
+is an index range scan no matter how big lynx_logs gets (see
+data/migrations/lynx_logs.py for the indexes). Cursors are opaque
+``<microseconds since epoch>.<id>`` strings
+"""
+import datetime
+from typing import Any, Mapping, Optional
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+COLUMNS = "id, user_id, method, url, status_code, request_time"
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class LogFilters:
+    """Filters parsed from the query string, invalid values raise ValueError"""
+    __slots__ = ("user_id", "method", "status", "since", "until")
+
+    def __init__(self, params: Mapping[str, str]):
+        self.user_id = int(params["user_id"]) if params.get("user_id") else None
+        self.method = params["method"].upper() if params.get("method") else None
+        # A status code, a class (4xx, 5xx) or errors (anything >= 400)
+        self.status = params.get("status") or None
+        if self.status and self.status != "errors" and not (
+            self.status.isdigit() or (len(self.status) == 3 and self.status[0].isdigit() and self.status[1:] == "xx")
+        ):
+            raise ValueError("status must be a status code, a class like 4xx or errors")
+        self.since = _parse_time(params["since"]) if params.get("since") else None
+        self.until = _parse_time(params["until"]) if params.get("until") else None
+
+    def params(self) -> dict[str, str]:
+        """The filters as query params (for links to other pages)"""
+        params = {
+            "user_id": str(self.user_id) if self.user_id else None,
+            "method": self.method,
+            "status": self.status,
+            "since": self.since.isoformat() if self.since else None,
+            "until": self.until.isoformat() if self.until else None,
+        }
+        return {key: value for key, value in params.items() if value}
+
+
+def _parse_time(value: str) -> datetime.datetime:
+    parsed = datetime.datetime.fromisoformat(value)
+    if not parsed.tzinfo:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def encode_cursor(row: Mapping[str, Any]) -> str:
+    micros = (row["request_time"] - _EPOCH) // datetime.timedelta(microseconds=1)
+    return f"{micros}.{row['id']}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    micros, _, row_id = cursor.partition(".")
+    return _EPOCH + datetime.timedelta(microseconds=int(micros)), int(row_id)
+
+
+def build_query(filters: LogFilters, *, cursor: Optional[str] = None, limit: Optional[int] = None) -> tuple[str, list]:
+    """
+    Query for the logs matching ``filters`` older than ``cursor``. With a limit,
+    one more row than asked for is selected to tell if there is a next page
+    """
+    conditions = []
+    args = []
+
+    def arg(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    if filters.user_id:
+        conditions.append(f"user_id = {arg(filters.user_id)}")
+    if filters.method:
+        conditions.append(f"method = {arg(filters.method)}")
+    if filters.status == "errors":
+        # Matches lynx_logs_errors_idx
+        conditions.append("status_code >= 400")
+    elif filters.status and filters.status.endswith("xx"):
+        start = int(filters.status[0]) * 100
+        conditions.append(f"status_code >= {arg(start)} AND status_code < {arg(start + 100)}")
+    elif filters.status:
+        conditions.append(f"status_code = {arg(int(filters.status))}")
+    if filters.since:
+        conditions.append(f"request_time >= {arg(filters.since)}")
+    if filters.until:
+        conditions.append(f"request_time < {arg(filters.until)}")
+    if cursor:
+        request_time, row_id = decode_cursor(cursor)
+        conditions.append(f"(request_time, id) < ({arg(request_time)}, {arg(row_id)})")
+
+    query = f"SELECT {COLUMNS} FROM lynx_logs"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY request_time DESC, id DESC"
+    if limit:
+        query += f" LIMIT {arg(limit + 1)}"
+    return query, args
+
+
+async def fetch_page(postgres, filters: LogFilters, *, cursor: Optional[str] = None, limit: int = PAGE_SIZE) -> tuple[list, Optional[str]]:
+    """Returns a page of logs and the cursor of the next page (if there is one)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query, args = build_query(filters, cursor=cursor, limit=limit)
+    rows = await postgres.fetch(query, *args)
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+async def fetch_overview(postgres, days: int = 14) -> tuple[list, list]:
+    """
+    Per day totals and the busiest users of the last ``days`` days from lynx_logs_daily
+    (days are UTC like in the lynx_logs_daily trigger)
+    """
+    per_day = await postgres.fetch(
+        """SELECT day, SUM(requests) AS requests, SUM(errors) AS errors FROM lynx_logs_daily
+        WHERE day > (now() AT TIME ZONE 'UTC')::date - $1::int GROUP BY day ORDER BY day DESC""",
+        days,
+    )
+    per_user = await postgres.fetch(
+        """SELECT user_id, SUM(requests) AS requests, SUM(errors) AS errors FROM lynx_logs_daily
+        WHERE day > (now() AT TIME ZONE 'UTC')::date - $1::int GROUP BY user_id ORDER BY requests DESC LIMIT 20""",
+        days,
+    )
+    return per_day, per_user
@@ -1,25 +1,37 @@
 from fastapi.responses import PlainTextResponse, StreamingResponse, ORJSONResponse
-from PIL import Image, ImageDraw, ImageFont
 import io, textwrap, aiofiles
 from starlette.concurrency import run_in_threadpool
 from math import floor
-from jinja2 import Environment, BaseLoader, select_autoescape
 from fastapi import APIRouter, HTTPException, Request, Response, BackgroundTasks
 from typing import Optional
 import orjson
-import aiohttp
 from loguru import logger 
 import uuid
+from modules.core import timing
+from modules.core.admission import shed_if_overloaded
+from modules.core.ratelimit import ratelimit
 from modules.core.ipc import redis_ipc_new
 from modules.models import enums
 import os
+import time
+from functools import lru_cache
 from fastapi.responses import HTMLResponse
 
 router = APIRouter(
     include_in_schema = True,
 )
 
-from colour import Color
+widget_queries = {
+    enums.WidgetType.bot: "SELECT guild_count, votes, description FROM bots WHERE bot_id = $1",
+    enums.WidgetType.server: "SELECT guild_count, votes, description FROM servers WHERE guild_id = $1",
+}
+
+server_user_query = "SELECT name_cached AS username, avatar_cached AS avatar FROM servers WHERE guild_id = $1"
+
+# Prepared on every new postgres connection of a worker (see setup_db)
+HOT_QUERIES = (*widget_queries.values(), server_user_query)
+
+# PIL, jinja2, colour and aiohttp are imported on first use to keep imports (and so boots) fast
 
 def human_format(num: int) -> str:
     if abs(num) < 1000:
@@ -65,13 +77,52 @@ widgets_html_template = """
 </a>
 """
 
-env = Environment(
-    loader=BaseLoader,
-    autoescape=select_autoescape(),
-    enable_async=True,
-).from_string(widgets_html_template.replace("\n", "").replace("  ", ""), globals={"human_format": human_format})
+@lru_cache(maxsize=None)
+def widget_template():
+    from jinja2 import Environment, BaseLoader, select_autoescape
+
+    return Environment(
+        loader=BaseLoader,
+        autoescape=select_autoescape(),
+        enable_async=True,
+    ).from_string(widgets_html_template.replace("\n", "").replace("  ", ""), globals={"human_format": human_format})
+
+font_path = "data/static/LexendDeca-Regular.ttf"
+
+@lru_cache(maxsize=64)
+def load_font(size: int):
+    """Fonts are parsed once per size instead of on every render"""
+    from PIL import ImageFont
+
+    return ImageFont.truetype(font_path, size, layout_engine=ImageFont.LAYOUT_RAQM)
+
+async def prewarm():
+    """
+    Warms up everything a first widget request would otherwise pay for (fonts,
+    PIL encoders and the async template) so new workers are fast from the start
+    """
+    from PIL import Image, ImageDraw
+
+    for size in (10, 12, 16, 18):
+        load_font(size)
+
+    img = Image.new("RGBA", (300, 175), "black")
+    ImageDraw.Draw(img).text((25, 150), "Fates List", fill="white", font=load_font(10))
+    for format in (enums.WidgetFormat.png, enums.WidgetFormat.webp):
+        img.save(io.BytesIO(), format=format.name.upper())
+
+    await widget_template().render_async(
+        textcolor="white",
+        bgcolor="black",
+        id=0,
+        type="bot",
+        bot={"guild_count": 0, "votes": 0},
+        user={"username": "", "avatar": ""},
+    )
 
 def is_color_like(c):
+    from colour import Color
+
     try:
         # Converting 'deep sky blue' to 'deepskyblue'
         color = c.replace(" ", "")
@@ -99,7 +150,8 @@ async def _user_fetch(
         return None # This is impossible to actually exist on the discord API or on our cache
 
     # Query redis cache for some important info
-    cache = await redis.get("user-cache:"+user_id) # This is bot in cache
+    with timing.segment("redis"):
+        cache = await redis.get("user-cache:"+user_id) # This is bot in cache
     if cache: # We got a match
         cache = orjson.loads(cache)
         return cache
@@ -114,16 +166,18 @@ async def _user_fetch(
 
     if data["bot"]: # Update cached username in postgres if valid username in asyncio background task
         try:
-            await db.execute("UPDATE bots SET username_cached = $2 WHERE bot_id = $1", int(user_id), data["username"])
+            with timing.segment("db"):
+                await db.execute("UPDATE bots SET username_cached = $2 WHERE bot_id = $1", int(user_id), data["username"])
         except Exception:
             pass # Sometimes this cannot be done
        
     # Add/Update redis
-    await redis.set(
-        "user-cache:"+user_id,
-        value = orjson.dumps(cache),
-        ex=60*60*8
-    ) 
+    with timing.segment("redis"):
+        await redis.set(
+            "user-cache:"+user_id,
+            value = orjson.dumps(cache),
+            ex=60*60*8
+        ) 
 
 @router.get("/{target_id}", operation_id="get_widget")
 async def get_widget(
@@ -152,7 +206,11 @@ async def get_widget(
 
     no_cache - If this is set to true, cache will not be used but will still be updated. If using cd, set this option to true and cache the image yourself
     Note that no_cache is slow and may lead to ratelimits and/or your got being banned if used excessively
+
+    Renders (cache misses) cost more of your ratelimit than cached widgets, see the RateLimit-* headers
     """
+    await ratelimit(request, "widget")
+
     if not bgcolor:
         bgcolor = "black"
     elif not textcolor:
@@ -189,17 +247,14 @@ async def get_widget(
     redis = worker_session.redis
    
     if target_type == enums.WidgetType.bot:
-        col = "bot_id"
-        table = "bots"
         event = enums.APIEvents.bot_view
         _type = "bot"
     else:
-        col = "guild_id"
-        table = "servers"
         event = enums.APIEvents.server_view
         _type = "server"
 
-    bot = await db.fetchrow(f"SELECT guild_count, votes, description FROM {table} WHERE {col} = $1", target_id)
+    with timing.segment("db"):
+        bot = await db.fetchrow(widget_queries[target_type], target_id)
     if not bot:
         raise HTTPException(status_code=404)
     
@@ -209,7 +264,8 @@ async def get_widget(
     if target_type == enums.WidgetType.bot:
         data = {"bot": bot, "user": await _user_fetch(str(target_id), worker_session = request.app.state.worker_session)}
     else:
-        data = {"bot": bot, "user": await db.fetchrow("SELECT name_cached AS username, avatar_cached AS avatar FROM servers WHERE guild_id = $1", target_id)}
+        with timing.segment("db"):
+            data = {"bot": bot, "user": await db.fetchrow(server_user_query, target_id)}
     bot_obj = data["user"]
     
     if not bot_obj:
@@ -219,23 +275,35 @@ async def get_widget(
         return data
 
     if format == enums.WidgetFormat.html:
-        rendered = await env.render_async(**{"textcolor": textcolor, "bgcolor": bgcolor, "id": target_id, "type": target_type.name} | data)
+        with timing.segment("render"):
+            rendered = await widget_template().render_async(**{"textcolor": textcolor, "bgcolor": bgcolor, "id": target_id, "type": target_type.name} | data)
         return HTMLResponse(rendered)
 
     if format in (enums.WidgetFormat.png, enums.WidgetFormat.webp):
         # Check if in cache
-        cache = await redis.get(cache_key)
-        if cache and not no_cache:
+        with timing.segment("redis"):
+            cache = await redis.get(cache_key)
+        # When overloaded, no_cache is ignored as serving from cache is far cheaper than rendering
+        if cache and (not no_cache or worker_session.admission.overloaded()):
             def _stream():
                 with io.BytesIO(cache) as output:
                     yield from output
 
             return StreamingResponse(_stream(), media_type=f"image/{format.name}")
 
+        shed_if_overloaded(request)
+        await ratelimit(request, "widget_render")
+
+        import aiohttp
+        from PIL import Image, ImageDraw
+
+        with timing.segment("http"):
+            async with aiohttp.ClientSession() as sess:
+                async with sess.get(data["user"]["avatar"]) as res:
+                    avatar_img = await res.read()
+
+        render_start = time.perf_counter()
         widget_img = Image.new("RGBA", (300, 175), bgcolor)
-        async with aiohttp.ClientSession() as sess:
-            async with sess.get(data["user"]["avatar"]) as res:
-                avatar_img = await res.read()
 
         static = request.app.state.static
         fates_pil = static["fates_pil"]
@@ -276,14 +344,8 @@ async def get_widget(
             (120, 115) if desc_length != 0 else (120, 50)
         )
     
-        font = os.path.join("data/static/LexendDeca-Regular.ttf")
-
         def get_font(string: str, d):
-            return ImageFont.truetype(
-                font,
-                get_font_size(d.textsize(string)[0]),
-                layout_engine=ImageFont.LAYOUT_RAQM
-            )
+            return load_font(get_font_size(d.textsize(string)[0]))
     
         def get_font_size(width: int):
             if width <= 90:
@@ -307,11 +369,7 @@ async def get_widget(
             (25,150), 
             'Fates List', 
             fill=textcolor,
-            font=ImageFont.truetype(
-                font,
-                10,
-                layout_engine=ImageFont.LAYOUT_RAQM
-            )
+            font=load_font(10)
         )
 
         #Bot name
@@ -324,11 +382,8 @@ async def get_widget(
             5), 
             str(bot_obj['username']), 
             fill=textcolor,
-            font=ImageFont.truetype(
-                font,
-                16,
-                layout_engine=ImageFont.LAYOUT_RAQM)
-            )
+            font=load_font(16)
+        )
     
         bot["description"] = bot["description"].encode("ascii", "ignore").decode()
 
@@ -362,8 +417,10 @@ async def get_widget(
         
         output = io.BytesIO()
         widget_img.save(output, format=format.name.upper())
+        timing.record("render", time.perf_counter() - render_start)
         output.seek(0)
-        await redis.set(cache_key, output.read(), ex=60*3)
+        with timing.segment("redis"):
+            await redis.set(cache_key, output.read(), ex=60*3)
         output.seek(0)
 
         def _stream():    
@@ -0,0 +1,493 @@
+"""
+Generated by ``flamepaw --cmd site.enumcompile`` from modules/models/enums.py, do not edit.
+Use modules/models/enum_lookup.py to look things up in these tables
+"""
+
+FINGERPRINT = 'aca3972dedbb3a5a35525c2822e5c4bea34a5276c0444d910cfab5874a3310b1'
+
+TABLES = {'APIEvents': {'doc': 'May or may not be in numeric order',
+               'int': True,
+               'fields': [],
+               'members': {'bot_vote': {'value': 0, 'doc': 'Vote Bot Event'},
+                           'bot_add': {'value': 1, 'doc': 'Bot Add Event'},
+                           'bot_edit': {'value': 2, 'doc': 'Bot Edit Event'},
+                           'bot_delete': {'value': 3,
+                                          'doc': 'Bot Delete Event'},
+                           'bot_claim': {'value': 4, 'doc': 'Bot Claim Event'},
+                           'bot_approve': {'value': 5,
+                                           'doc': 'Bot Approve Event'},
+                           'bot_deny': {'value': 6, 'doc': 'Bot Deny Event'},
+                           'bot_ban': {'value': 7, 'doc': 'Bot Ban Event'},
+                           'bot_unban': {'value': 8, 'doc': 'Bot Unban Event'},
+                           'bot_requeue': {'value': 9,
+                                           'doc': 'Bot Requeue Event'},
+                           'bot_certify': {'value': 10,
+                                           'doc': 'Bot Certify Event'},
+                           'bot_uncertify': {'value': 11,
+                                             'doc': 'Bot Uncertify Event'},
+                           'bot_transfer': {'value': 12,
+                                            'doc': 'Bot Ownership Transfer '
+                                                   'Event'},
+                           'bot_hide': {'value': 13, 'doc': 'Bot Hide Event'},
+                           'bot_archive': {'value': 14,
+                                           'doc': 'Bot Archive Event'},
+                           'bot_unverify': {'value': 15,
+                                            'doc': 'Bot Unverify Event'},
+                           'bot_view': {'value': 16,
+                                        'doc': 'Bot View Event (Websocket '
+                                               'only)'},
+                           'bot_invite': {'value': 17,
+                                          'doc': 'Bot Invite Event (Websocket '
+                                                 'only)'},
+                           'bot_unclaim': {'value': 18,
+                                           'doc': 'Bot Unclaim Event'},
+                           'bot_root_update': {'value': 19,
+                                               'doc': 'Bot Root State Update '
+                                                      'Event'},
+                           'bot_vote_reset': {'value': 20,
+                                              'doc': 'Bot Votes Reset Event'},
+                           'bot_vote_reset_all': {'value': 21,
+                                                  'doc': 'Bot Votes Reset All '
+                                                         'Event'},
+                           'bot_lock': {'value': 22, 'doc': 'Bot Lock Event'},
+                           'bot_unlock': {'value': 23,
+                                          'doc': 'Bot Unlock Event'},
+                           'review_vote': {'value': 30,
+                                           'doc': 'Review Vote Event'},
+                           'review_add': {'value': 31,
+                                          'doc': 'Bot Review Add Event'},
+                           'review_edit': {'value': 32,
+                                           'doc': 'Bot Review Edit Event'},
+                           'review_delete': {'value': 33,
+                                             'doc': 'Bot Review Delete Event'},
+                           'resource_add': {'value': 40,
+                                            'doc': 'Bot Resource Add Event'},
+                           'resource_delete': {'value': 41,
+                                               'doc': 'Bot Resource Delete '
+                                                      'Event'},
+                           'command_add': {'value': 50,
+                                           'doc': 'Bot Command Add Event'},
+                           'command_delete': {'value': 51,
+                                              'doc': 'Bot Command Delete '
+                                                     'Event'},
+                           'server_view': {'value': 70,
+                                           'doc': 'Server View Event'},
+                           'server_vote': {'value': 71,
+                                           'doc': 'Server Vote Event'},
+                           'server_invite': {'value': 72,
+                                             'doc': 'Server Invite Event'},
+                           'staff_lock': {'value': 80, 'doc': 'Staff Lock'},
+                           'staff_unlock': {'value': 81,
+                                            'doc': 'Staff Unlock'}}},
+ 'BotAdminOp': {'doc': 'Handles bot admin operations',
+                'int': False,
+                'fields': ['__perm__',
+                           '__reason_needed__',
+                           '__recursive__',
+                           '__cooldown__'],
+                'members': {'requeue': {'value': 'REQUEUE',
+                                        'doc': 'Requeue Bot',
+                                        '__perm__': 3,
+                                        '__reason_needed__': True,
+                                        '__recursive__': False,
+                                        '__cooldown__': {'enum': 'CooldownBucket',
+                                                         'name': 'requeue',
+                                                         'value': 12.0}},
+                            'claim': {'value': 'CLAIM',
+                                      'doc': 'Claim Bot',
+                                      '__perm__': 2,
+                                      '__reason_needed__': False,
+                                      '__recursive__': False,
+                                      '__cooldown__': None},
+                            'unclaim': {'value': 'UNCLAIM',
+                                        'doc': 'Unclaim Bot',
+                                        '__perm__': 2,
+                                        '__reason_needed__': False,
+                                        '__recursive__': False,
+                                        '__cooldown__': None},
+                            'ban': {'value': 'BAN',
+                                    'doc': 'Ban Bot',
+                                    '__perm__': 3,
+                                    '__reason_needed__': True,
+                                    '__recursive__': False,
+                                    '__cooldown__': {'enum': 'CooldownBucket',
+                                                     'name': 'ban',
+                                                     'value': 18.0}},
+                            'unban': {'value': 'UNBAN',
+                                      'doc': 'Unban Bot',
+                                      '__perm__': 3,
+                                      '__reason_needed__': True,
+                                      '__recursive__': False,
+                                      '__cooldown__': {'enum': 'CooldownBucket',
+                                                       'name': 'ban',
+                                                       'value': 18.0}},
+                            'certify': {'value': 'CERTIFY',
+                                        'doc': 'Certify Bot',
+                                        '__perm__': 5,
+                                        '__reason_needed__': False,
+                                        '__recursive__': False,
+                                        '__cooldown__': None},
+                            'uncertify': {'value': 'UNCERTTIFY',
+                                          'doc': 'Uncertify Bot',
+                                          '__perm__': 5,
+                                          '__reason_needed__': True,
+                                          '__recursive__': False,
+                                          '__cooldown__': None},
+                            'approve': {'value': 'APPROVE',
+                                        'doc': 'Approve Bot',
+                                        '__perm__': 2,
+                                        '__reason_needed__': True,
+                                        '__recursive__': False,
+                                        '__cooldown__': None},
+                            'deny': {'value': 'DENY',
+                                     'doc': 'Deny Bot',
+                                     '__perm__': 2,
+                                     '__reason_needed__': True,
+                                     '__recursive__': False,
+                                     '__cooldown__': None},
+                            'unverify': {'value': 'UNVERIFY',
+                                         'doc': 'Unverify Bot',
+                                         '__perm__': 3,
+                                         '__reason_needed__': True,
+                                         '__recursive__': False,
+                                         '__cooldown__': {'enum': 'CooldownBucket',
+                                                          'name': 'ban',
+                                                          'value': 18.0}},
+                            'reset_votes': {'value': 'RESETVOTES',
+                                            'doc': 'Reset All Votes',
+                                            '__perm__': [5, 7],
+                                            '__reason_needed__': True,
+                                            '__recursive__': True,
+                                            '__cooldown__': {'enum': 'CooldownBucket',
+                                                             'name': 'reset',
+                                                             'value': 60}},
+                            'staff_lock': {'value': 'STAFFLOCK',
+                                           'doc': 'Staff Lock Bot',
+                                           '__perm__': 4,
+                                           '__reason_needed__': True,
+                                           '__recursive__': False,
+                                           '__cooldown__': None},
+                            'staff_unlock': {'value': 'STAFFUNLOCK',
+                                             'doc': 'Staff Unlock Bot',
+                                             '__perm__': 4,
+                                             '__reason_needed__': True,
+                                             '__recursive__': False,
+                                             '__cooldown__': {'enum': 'CooldownBucket',
+                                                              'name': 'lock',
+                                                              'value': 120}},
+                            'bot_lock': {'value': 'BLOCK',
+                                         'doc': 'Bot Lock',
+                                         '__perm__': 0,
+                                         '__reason_needed__': False,
+                                         '__recursive__': False,
+                                         '__cooldown__': None},
+                            'bot_unlock': {'value': 'BUNLOCK',
+                                           'doc': 'Bot Unlock',
+                                           '__perm__': 4,
+                                           '__reason_needed__': False,
+                                           '__recursive__': False,
+                                           '__cooldown__': {'enum': 'CooldownBucket',
+                                                            'name': 'lock',
+                                                            'value': 120}}}},
+ 'BotFlag': {'doc': None,
+             'int': True,
+             'fields': [],
+             'members': {'unlocked': {'value': 0,
+                                      'doc': 'Bot unlocked for editing'},
+                         'edit_locked': {'value': 1,
+                                         'doc': 'Bot locked for editing'},
+                         'staff_locked': {'value': 2,
+                                          'doc': 'Bot locked by staff'},
+                         'stats_locked': {'value': 3, 'doc': 'Stats locked'},
+                         'vote_locked': {'value': 4, 'doc': 'Vote locked'},
+                         'system': {'value': 5, 'doc': 'System bot'}}},
+ 'BotRequestType': {'doc': None,
+                    'int': True,
+                    'fields': [],
+                    'members': {'appeal': {'value': 0, 'doc': 'Bot'},
+                                'certification': {'value': 1,
+                                                  'doc': 'Certification'}}},
+ 'BotState': {'doc': None,
+              'int': True,
+              'fields': [],
+              'members': {'approved': {'value': 0, 'doc': 'Verified'},
+                          'pending': {'value': 1,
+                                      'doc': 'Pending Verification'},
+                          'denied': {'value': 2, 'doc': 'Denied'},
+                          'hidden': {'value': 3, 'doc': 'Hidden'},
+                          'banned': {'value': 4, 'doc': 'Banned'},
+                          'under_review': {'value': 5, 'doc': 'Under Review'},
+                          'certified': {'value': 6, 'doc': 'Certified'},
+                          'archived': {'value': 7, 'doc': 'Archived'},
+                          'private_viewable': {'value': 8,
+                                               'doc': 'Private, but viewable '
+                                                      'with link (server '
+                                                      'only)'},
+                          'private_staff_only': {'value': 9,
+                                                 'doc': 'Private, only staff '
+                                                        'may join (server '
+                                                        'only)'}}},
+ 'CommandType': {'doc': '\n'
+                        '    0 - Regular (Prefix) Command\n'
+                        '\n'
+                        '    1 - Slash Command (Guild)\n'
+                        '    \n'
+                        '    2 - Slash Command (Global)\n'
+                        '    ',
+                 'int': True,
+                 'fields': [],
+                 'members': {'regular': {'value': 0, 'doc': 'Regular Command'},
+                             'guild_slash': {'value': 1,
+                                             'doc': 'Slash Command (guild)'},
+                             'global_slash': {'value': 2,
+                                              'doc': 'Slash Command '
+                                                     '(global)'}}},
+ 'CooldownBucket': {'doc': None,
+                    'int': False,
+                    'fields': [],
+                    'members': {'requeue': {'value': 12.0,
+                                            'doc': 'An enumeration.'},
+                                'ban': {'value': 18.0,
+                                        'doc': 'An enumeration.'},
+                                'transfer': {'value': 30.0,
+                                             'doc': 'An enumeration.'},
+                                'reset': {'value': 60,
+                                          'doc': 'An enumeration.'},
+                                'lock': {'value': 120,
+                                         'doc': 'An enumeration.'},
+                                'delete': {'value': 210.0,
+                                           'doc': 'An enumeration.'}}},
+ 'LongDescType': {'doc': None,
+                  'int': True,
+                  'fields': [],
+                  'members': {'html': {'value': 0,
+                                       'doc': 'HTML/Raw Description'},
+                              'markdown_pymarkdown': {'value': 1,
+                                                      'doc': 'Markdown using '
+                                                             'Python Markdown'},
+                              'markdown_marked': {'value': 2,
+                                                  'doc': 'Markdown using '
+                                                         'JavaScript Marked'}}},
+ 'PageStyle': {'doc': None,
+               'int': True,
+               'fields': [],
+               'members': {'tabs': {'value': 0, 'doc': 'Tabs'},
+                           'single_scroll': {'value': 1,
+                                             'doc': 'Single Scroll'}}},
+ 'PromotionType': {'doc': None,
+                   'int': True,
+                   'fields': [],
+                   'members': {'announcement': {'value': 0,
+                                                'doc': 'Announcement'},
+                               'promotion': {'value': 1, 'doc': 'Promotion'},
+                               'generic': {'value': 2, 'doc': 'Generic'}}},
+ 'ReviewType': {'doc': None,
+                'int': True,
+                'fields': [],
+                'members': {'bot': {'value': 0, 'doc': 'Bot'},
+                            'server': {'value': 1, 'doc': 'Server'}}},
+ 'SearchType': {'doc': None,
+                'int': False,
+                'fields': [],
+                'members': {'bot': {'value': 'bot', 'doc': 'Bot'},
+                            'server': {'value': 'server', 'doc': 'Server'},
+                            'profile': {'value': 'profile', 'doc': 'Profile'},
+                            'pack': {'value': 'pack', 'doc': 'Bot Pack'}}},
+ 'SiteLang': {'doc': 'Site languages',
+              'int': False,
+              'fields': [],
+              'members': {'en': {'value': 'en', 'doc': 'English'},
+                          'es': {'value': 'es', 'doc': 'Spanish'},
+                          'fr': {'value': 'fr', 'doc': 'France'},
+                          'hi': {'value': 'hi', 'doc': 'Hindi'},
+                          'ru': {'value': 'ru', 'doc': 'Russian'}}},
+ 'Status': {'doc': 'Status object (See '
+                   'https://docs.fateslist.xyz/basics/basic-structures#status '
+                   'for more information)',
+            'int': True,
+            'fields': [],
+            'members': {'unknown': {'value': 0, 'doc': 'Unknown'},
+                        'online': {'value': 1, 'doc': 'Online'},
+                        'offline': {'value': 2, 'doc': 'Offline'},
+                        'idle': {'value': 3, 'doc': 'Idle'},
+                        'dnd': {'value': 4, 'doc': 'Do Not Disturb'}}},
+ 'UserBotAction': {'doc': None,
+                   'int': True,
+                   'fields': [],
+                   'members': {'approve': {'value': 0, 'doc': 'Approve'},
+                               'deny': {'value': 1, 'doc': 'Deny'},
+                               'certify': {'value': 2, 'doc': 'Certify'},
+                               'ban': {'value': 3, 'doc': 'Ban'},
+                               'claim': {'value': 4, 'doc': 'Claim'},
+                               'unclaim': {'value': 5, 'doc': 'Unclaim'},
+                               'transfer_ownership': {'value': 6,
+                                                      'doc': 'Transfer Bot '
+                                                             'Ownership'},
+                               'edit_bot': {'value': 7, 'doc': 'Edit Bot'},
+                               'delete_bot': {'value': 8,
+                                              'doc': 'Delete Bot'}}},
+ 'UserState': {'doc': None,
+               'int': True,
+               'fields': ['__sitelock__'],
+               'members': {'normal': {'value': 0,
+                                      'doc': 'Normal (No Ban)',
+                                      '__sitelock__': False},
+                           'global_ban': {'value': 1,
+                                          'doc': 'Global Ban',
+                                          '__sitelock__': True},
+                           'profile_edit_ban': {'value': 2,
+                                                'doc': 'Profile Edit Ban',
+                                                '__sitelock__': False},
+                           'ddr_ban': {'value': 3,
+                                       'doc': 'Data Deletion Request Ban',
+                                       '__sitelock__': True},
+                           'api_ban': {'value': 4,
+                                       'doc': 'Full API Ban',
+                                       '__sitelock__': False}}},
+ 'Vanity': {'doc': None,
+            'int': True,
+            'fields': [],
+            'members': {'server': {'value': 0, 'doc': 'Server'},
+                        'bot': {'value': 1, 'doc': 'Bot'},
+                        'profile': {'value': 2, 'doc': 'Profile'}}},
+ 'VanityType': {'doc': None,
+                'int': False,
+                'fields': [],
+                'members': {'bot': {'value': 'bot', 'doc': 'Bot'},
+                            'guild': {'value': 'guild', 'doc': 'Server'}}},
+ 'VoteReminderMode': {'doc': None,
+                      'int': True,
+                      'fields': [],
+                      'members': {'disable': {'value': 0,
+                                              'doc': 'Disable vote reminders'},
+                                  'enable': {'value': 1,
+                                             'doc': 'Enable vote reminders'}}},
+ 'WebhookType': {'doc': None,
+                 'int': True,
+                 'fields': [],
+                 'members': {'vote': {'value': 0, 'doc': 'Vote Webhook'},
+                             'discord': {'value': 1,
+                                         'doc': 'Discord Integration'},
+                             'fc': {'value': 2,
+                                    'doc': 'Fates Client (deprecated)'}}},
+ 'WidgetFormat': {'doc': None,
+                  'int': False,
+                  'fields': [],
+                  'members': {'json': {'value': 'json', 'doc': 'JSON Widget'},
+                              'html': {'value': 'html', 'doc': 'HTML Widget'},
+                              'png': {'value': 'png',
+                                      'doc': 'Widget (as png image)'},
+                              'webp': {'value': 'webp',
+                                       'doc': 'Widget (as webp image)'}}},
+ 'WidgetType': {'doc': None,
+                'int': False,
+                'fields': [],
+                'members': {'bot': {'value': 'bot', 'doc': ''},
+                            'server': {'value': 'server', 'doc': ''}}}}
+
+VALUES = {'APIEvents': {0: 'bot_vote',
+               1: 'bot_add',
+               2: 'bot_edit',
+               3: 'bot_delete',
+               4: 'bot_claim',
+               5: 'bot_approve',
+               6: 'bot_deny',
+               7: 'bot_ban',
+               8: 'bot_unban',
+               9: 'bot_requeue',
+               10: 'bot_certify',
+               11: 'bot_uncertify',
+               12: 'bot_transfer',
+               13: 'bot_hide',
+               14: 'bot_archive',
+               15: 'bot_unverify',
+               16: 'bot_view',
+               17: 'bot_invite',
+               18: 'bot_unclaim',
+               19: 'bot_root_update',
+               20: 'bot_vote_reset',
+               21: 'bot_vote_reset_all',
+               22: 'bot_lock',
+               23: 'bot_unlock',
+               30: 'review_vote',
+               31: 'review_add',
+               32: 'review_edit',
+               33: 'review_delete',
+               40: 'resource_add',
+               41: 'resource_delete',
+               50: 'command_add',
+               51: 'command_delete',
+               70: 'server_view',
+               71: 'server_vote',
+               72: 'server_invite',
+               80: 'staff_lock',
+               81: 'staff_unlock'},
+ 'BotAdminOp': {'REQUEUE': 'requeue',
+                'CLAIM': 'claim',
+                'UNCLAIM': 'unclaim',
+                'BAN': 'ban',
+                'UNBAN': 'unban',
+                'CERTIFY': 'certify',
+                'UNCERTTIFY': 'uncertify',
+                'APPROVE': 'approve',
+                'DENY': 'deny',
+                'UNVERIFY': 'unverify',
+                'RESETVOTES': 'reset_votes',
+                'STAFFLOCK': 'staff_lock',
+                'STAFFUNLOCK': 'staff_unlock',
+                'BLOCK': 'bot_lock',
+                'BUNLOCK': 'bot_unlock'},
+ 'BotFlag': {0: 'unlocked',
+             1: 'edit_locked',
+             2: 'staff_locked',
+             3: 'stats_locked',
+             4: 'vote_locked',
+             5: 'system'},
+ 'BotRequestType': {0: 'appeal', 1: 'certification'},
+ 'BotState': {0: 'approved',
+              1: 'pending',
+              2: 'denied',
+              3: 'hidden',
+              4: 'banned',
+              5: 'under_review',
+              6: 'certified',
+              7: 'archived',
+              8: 'private_viewable',
+              9: 'private_staff_only'},
+ 'CommandType': {0: 'regular', 1: 'guild_slash', 2: 'global_slash'},
+ 'CooldownBucket': {12.0: 'requeue',
+                    18.0: 'ban',
+                    30.0: 'transfer',
+                    60: 'reset',
+                    120: 'lock',
+                    210.0: 'delete'},
+ 'LongDescType': {0: 'html', 1: 'markdown_pymarkdown', 2: 'markdown_marked'},
+ 'PageStyle': {0: 'tabs', 1: 'single_scroll'},
+ 'PromotionType': {0: 'announcement', 1: 'promotion', 2: 'generic'},
+ 'ReviewType': {0: 'bot', 1: 'server'},
+ 'SearchType': {'bot': 'bot',
+                'server': 'server',
+                'profile': 'profile',
+                'pack': 'pack'},
+ 'SiteLang': {'en': 'en', 'es': 'es', 'fr': 'fr', 'hi': 'hi', 'ru': 'ru'},
+ 'Status': {0: 'unknown', 1: 'online', 2: 'offline', 3: 'idle', 4: 'dnd'},
+ 'UserBotAction': {0: 'approve',
+                   1: 'deny',
+                   2: 'certify',
+                   3: 'ban',
+                   4: 'claim',
+                   5: 'unclaim',
+                   6: 'transfer_ownership',
+                   7: 'edit_bot',
+                   8: 'delete_bot'},
+ 'UserState': {0: 'normal',
+               1: 'global_ban',
+               2: 'profile_edit_ban',
+               3: 'ddr_ban',
+               4: 'api_ban'},
+ 'Vanity': {0: 'server', 1: 'bot', 2: 'profile'},
+ 'VanityType': {'bot': 'bot', 'guild': 'guild'},
+ 'VoteReminderMode': {0: 'disable', 1: 'enable'},
+ 'WebhookType': {0: 'vote', 1: 'discord', 2: 'fc'},
+ 'WidgetFormat': {'json': 'json', 'html': 'html', 'png': 'png', 'webp': 'webp'},
+ 'WidgetType': {'bot': 'bot', 'server': 'server'}}
@@ -0,0 +1,101 @@
+"""
+Lightweight embed builder
+
+Only used to build the embed dicts sent over SENDMSG, so this avoids importing
+all of discord.py for it. ``to_dict`` gives the same output as
+``discord.Embed.to_dict``
+"""
+import datetime
+from typing import Any, Optional
+
+
+class Embed:
+    __slots__ = (
+        "title",
+        "description",
+        "url",
+        "color",
+        "type",
+        "timestamp",
+        "fields",
+        "footer",
+        "author",
+        "thumbnail",
+        "image",
+    )
+
+    def __init__(
+        self,
+        *,
+        title: Optional[Any] = None,
+        description: Optional[Any] = None,
+        url: Optional[Any] = None,
+        color: Optional[int] = None,
+        colour: Optional[int] = None,
+        type: str = "rich",
+        timestamp: Optional[datetime.datetime] = None,
+    ):
+        self.title = str(title) if title is not None else None
+        self.description = str(description) if description is not None else None
+        self.url = str(url) if url is not None else None
+        self.color = color if color is not None else colour
+        self.type = type
+        self.timestamp = timestamp
+        self.fields: list[dict] = []
+        self.footer: Optional[dict] = None
+        self.author: Optional[dict] = None
+        self.thumbnail: Optional[dict] = None
+        self.image: Optional[dict] = None
+
+    def add_field(self, *, name: Any, value: Any, inline: bool = True) -> "Embed":
+        self.fields.append({"inline": inline, "name": str(name), "value": str(value)})
+        return self
+
+    def set_footer(self, *, text: Any, icon_url: Optional[Any] = None) -> "Embed":
+        self.footer = {"text": str(text)}
+        if icon_url is not None:
+            self.footer["icon_url"] = str(icon_url)
+        return self
+
+    def set_author(self, *, name: Any, url: Optional[Any] = None, icon_url: Optional[Any] = None) -> "Embed":
+        self.author = {"name": str(name)}
+        if url is not None:
+            self.author["url"] = str(url)
+        if icon_url is not None:
+            self.author["icon_url"] = str(icon_url)
+        return self
+
+    def set_thumbnail(self, *, url: Any) -> "Embed":
+        self.thumbnail = {"url": str(url)}
+        return self
+
+    def set_image(self, *, url: Any) -> "Embed":
+        self.image = {"url": str(url)}
+        return self
+
+    def to_dict(self) -> dict:
+        result: dict[str, Any] = {}
+
+        if self.fields:
+            result["fields"] = self.fields
+        for key in ("footer", "author", "thumbnail", "image"):
+            value = getattr(self, key)
+            if value is not None:
+                result[key] = value
+        if self.color:
+            result["color"] = self.color
+        if self.timestamp:
+            timestamp = self.timestamp
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.astimezone()
+            result["timestamp"] = timestamp.astimezone(datetime.timezone.utc).isoformat()
+        if self.type:
+            result["type"] = self.type
+        if self.description:
+            result["description"] = self.description
+        if self.url:
+            result["url"] = self.url
+        if self.title:
+            result["title"] = self.title
+
+        return result
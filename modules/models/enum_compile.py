@@ -0,0 +1,143 @@
+"""
+Compiles the enums in modules/models/enums.py into plain lookup tables (see
+``site.enumcompile``). The generated module (modules/models/_enum_tables.py)
+needs neither aenum nor the enums to be imported and data/res/enums.json holds
+the same tables plus OpenAPI schemas for the enums
+"""
+import hashlib
+import importlib
+import pprint
+from pathlib import Path
+
+ENUMS_PATH = Path("modules/models/enums.py")
+MODULE_PATH = Path("modules/models/_enum_tables.py")
+JSON_PATH = Path("data/res/enums.json")
+
+MODULE_HEADER = '''"""
+Generated by ``flamepaw --cmd site.enumcompile`` from modules/models/enums.py, do not edit.
+Use modules/models/enum_lookup.py to look things up in these tables
+"""
+'''
+
+
+def fingerprint() -> str:
+    return hashlib.sha256(ENUMS_PATH.read_bytes()).hexdigest()
+
+
+def _plain(value):
+    """Turns enum members and tuples into JSON-able values"""
+    aenum = importlib.import_module("aenum")
+
+    if isinstance(value, aenum.Enum):
+        return {"enum": type(value).__name__, "name": value.name, "value": _plain(value.value)}
+    if isinstance(value, tuple):
+        return [_plain(v) for v in value]
+    return value
+
+
+def compile_enums() -> dict:
+    """Introspects all enums into ``{enum_name: {doc, type, fields, members}}``"""
+    enums = importlib.import_module("modules.models.enums")
+    aenum = importlib.import_module("aenum")
+
+    tables = {}
+    for key, v in vars(enums).items():
+        # Ignore internal or dunder keys
+        if key.startswith("_") or key in ("IntEnum", "Enum") or not isinstance(v, aenum.EnumType):
+            continue
+
+        try:
+            fields = [field for field in v._init_ if field not in ("value", "__doc__")]
+        except AttributeError:
+            fields = []
+
+        members = {}
+        for prop in v:
+            members[prop.name] = {
+                "value": _plain(prop.value),
+                "doc": prop.__doc__,
+            } | {field: _plain(getattr(prop, field)) for field in fields}
+
+        tables[key] = {
+            "doc": v.__doc__ if v.__doc__ and v.__doc__ != "An enumeration." else None,
+            "int": issubclass(v, int),
+            "fields": fields,
+            "members": members,
+        }
+
+    return dict(sorted(tables.items()))
+
+
+def value_maps(tables: dict) -> dict:
+    """``{enum_name: {value: member_name}}``"""
+    return {
+        key: {member["value"]: name for name, member in table["members"].items()}
+        for key, table in tables.items()
+    }
+
+
+def openapi_schemas(tables: dict) -> dict:
+    schemas = {}
+    for key, table in tables.items():
+        values = [member["value"] for member in table["members"].values()]
+        if table["int"]:
+            schema_type = "integer"
+        elif all(isinstance(value, str) for value in values):
+            schema_type = "string"
+        else:
+            schema_type = "number"
+
+        schemas[key] = {
+            "title": key,
+            "type": schema_type,
+            "enum": values,
+            "x-enum-varnames": list(table["members"]),
+            "x-enum-descriptions": [member["doc"] for member in table["members"].values()],
+        }
+        if table["doc"]:
+            schemas[key]["description"] = table["doc"]
+    return schemas
+
+
+def render_module(tables: dict) -> str:
+    return (
+        MODULE_HEADER
+        + f"\nFINGERPRINT = {fingerprint()!r}\n"
+        + f"\nTABLES = {pprint.pformat(tables, sort_dicts=False)}\n"
+        + f"\nVALUES = {pprint.pformat(value_maps(tables), sort_dicts=False)}\n"
+    )
+
+
+def render_json(tables: dict) -> bytes:
+    import orjson
+
+    return orjson.dumps(
+        {
+            "fingerprint": fingerprint(),
+            "enums": tables,
+            "openapi": {"components": {"schemas": openapi_schemas(tables)}},
+        },
+        option=orjson.OPT_INDENT_2,
+    )
+
+
+def outputs() -> dict[Path, bytes]:
+    tables = compile_enums()
+    return {
+        MODULE_PATH: render_module(tables).encode(),
+        JSON_PATH: render_json(tables),
+    }
+
+
+def load_tables() -> dict:
+    """
+    Returns the compiled tables, from the generated module if it is up to date
+    and by compiling the enums otherwise
+    """
+    try:
+        generated = importlib.import_module("modules.models._enum_tables")
+    except ImportError:
+        return compile_enums()
+    if generated.FINGERPRINT != fingerprint():
+        return compile_enums()
+    return generated.TABLES
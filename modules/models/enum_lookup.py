@@ -0,0 +1,60 @@
+"""
+Fast lookups for the enums in modules/models/enums.py
+
+Everything here works off the generated tables (modules/models/_enum_tables.py,
+see ``site.enumcompile``) so neither aenum nor the enums are imported.
+``member("BotState", 0)`` resolves the same member as ``enums.BotState(0)`` with
+a plain dict lookup. Use it on hot paths (loops in migrations, admin actions etc.)
+
+tests/test_enum_tables.py keeps the tables in sync with enums.py
+"""
+from typing import Any, NamedTuple
+
+
+class Member(NamedTuple):
+    """An enum member as stored in the tables"""
+    enum: str
+    name: str
+    value: Any
+    doc: str
+
+    def __int__(self) -> int:
+        return int(self.value)
+
+
+def member(enum: Any, value: Any) -> Member:
+    """
+    Same member as ``enum(value)`` (including raising ValueError on invalid values).
+    ``enum`` is the name of the enum (or the enum class itself)
+    """
+    enum_name = enum if isinstance(enum, str) else enum.__name__
+    tables = _tables()
+    try:
+        name = tables.VALUES[enum_name][value]
+    except (KeyError, TypeError):
+        raise ValueError(f"{value!r} is not a valid {enum_name}") from None
+    return Member(enum_name, name, value, tables.TABLES[enum_name]["members"][name]["doc"])
+
+
+def _tables():
+    try:
+        from modules.models import _enum_tables
+    except ImportError as exc:
+        raise RuntimeError("Enum tables have not been generated, run flamepaw --cmd site.enumcompile") from exc
+    return _enum_tables
+
+
+def table(enum_name: str) -> dict:
+    """The compiled table of an enum (doc, fields and members)"""
+    return _tables().TABLES[enum_name]
+
+
+def name_of(enum_name: str, value: Any) -> str:
+    """Member name of a value, raises KeyError on invalid values"""
+    return _tables().VALUES[enum_name][value]
+
+
+def doc_of(enum_name: str, value: Any) -> str:
+    """Member description of a value, raises KeyError on invalid values"""
+    tables = _tables()
+    return tables.TABLES[enum_name]["members"][tables.VALUES[enum_name][value]]["doc"]
@@ -0,0 +1,57 @@
+"""The generated enum tables must match modules/models/enums.py (regenerate with site.enumcompile)"""
+import aenum
+import orjson
+import pytest
+
+from modules.models import _enum_tables, enum_compile, enums
+from modules.models.enum_lookup import member
+
+ENUMS = {
+    key: value for key, value in vars(enums).items()
+    if not key.startswith("_") and key not in ("IntEnum", "Enum") and isinstance(value, aenum.EnumType)
+}
+
+
+def test_fingerprint():
+    assert _enum_tables.FINGERPRINT == enum_compile.fingerprint(), "enums.py changed, run flamepaw --cmd site.enumcompile"
+
+
+def test_outputs_up_to_date():
+    for path, content in enum_compile.outputs().items():
+        assert path.read_bytes() == content, f"{path} is out of date, run flamepaw --cmd site.enumcompile"
+
+
+def test_same_enums():
+    assert set(_enum_tables.TABLES) == set(ENUMS)
+
+
+@pytest.mark.parametrize("enum_name", sorted(ENUMS))
+def test_members(enum_name):
+    enum_cls = ENUMS[enum_name]
+    table = _enum_tables.TABLES[enum_name]
+
+    assert list(table["members"]) == [prop.name for prop in enum_cls]
+    for prop in enum_cls:
+        entry = table["members"][prop.name]
+        assert entry["value"] == enum_compile._plain(prop.value)
+        assert entry["doc"] == prop.__doc__
+        for field in table["fields"]:
+            assert entry[field] == enum_compile._plain(getattr(prop, field))
+
+        assert _enum_tables.VALUES[enum_name][entry["value"]] == prop.name
+
+        resolved = member(enum_name, prop.value)
+        assert (resolved.name, resolved.value, resolved.doc) == (prop.name, prop.value, prop.__doc__)
+
+
+def test_invalid_member():
+    with pytest.raises(ValueError):
+        member("BotState", -1)
+    with pytest.raises(ValueError):
+        member(enums.BotState, [])
+
+
+def test_json_export():
+    exported = orjson.loads(enum_compile.JSON_PATH.read_bytes())
+    assert exported["fingerprint"] == _enum_tables.FINGERPRINT
+    assert exported["enums"] == orjson.loads(orjson.dumps(_enum_tables.TABLES))